@@ -0,0 +1,285 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, request
+from flask_restful import unpack
+from flask_restful.representations.json import output_json
+from werkzeug.wrappers import Response
+
+from replicas import reads_primary
+
+
+class MemoryBackend:
+    """Size-bounded LRU with per-entry expiry, private to this process."""
+
+    def __init__(self, max_entries=2048, max_counters=100000):
+        self.max_entries = max_entries
+        self.max_counters = max_counters
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._counters = {}
+        self._marks = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_counters(self, keys):
+        with self._lock:
+            return [self._counters.get(key, 0) for key in keys]
+
+    def incr(self, keys):
+        with self._lock:
+            if len(self._counters) + len(keys) > self.max_counters:
+                # Resetting the counters is only safe together with the entries
+                self._counters.clear()
+                self._entries.clear()
+            for key in keys:
+                self._counters[key] = self._counters.get(key, 0) + 1
+
+    def mark(self, keys, ttl):
+        with self._lock:
+            now = time.monotonic()
+            for key, expires_at in list(self._marks.items()):
+                if expires_at <= now:
+                    del self._marks[key]
+            self._marks.update((key, now + ttl) for key in keys)
+
+    def any_marked(self, keys):
+        with self._lock:
+            now = time.monotonic()
+            return any(self._marks.get(key, 0) > now for key in keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._counters.clear()
+            self._marks.clear()
+
+
+class RedisBackend:
+    """Storage shared by every worker through Redis (needs the ``redis`` package).
+
+    Redis applies its own eviction policy, so size bounds come from its
+    ``maxmemory`` setting rather than from this class. Every key is stored
+    under ``prefix``, so the database can be shared with other users.
+    """
+
+    def __init__(self, url, prefix='response-cache:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.evictions = 0
+
+    def _keys(self, keys):
+        return [self.prefix + key for key in keys]
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, json.dumps(value), ex=ttl)
+
+    def get_counters(self, keys):
+        return [int(value or 0) for value in self.client.mget(self._keys(keys))]
+
+    def incr(self, keys):
+        pipeline = self.client.pipeline(transaction=False)
+        for key in self._keys(keys):
+            pipeline.incr(key)
+        pipeline.execute()
+
+    def mark(self, keys, ttl):
+        pipeline = self.client.pipeline(transaction=False)
+        for key in self._keys(keys):
+            pipeline.set(key, 1, px=int(ttl * 1000))
+        pipeline.execute()
+
+    def any_marked(self, keys):
+        return any(self.client.mget(self._keys(keys)))
+
+    def clear(self):
+        # Only this cache's keys; other services may share the database
+        batch = []
+        for key in self.client.scan_iter(match=self.prefix + '*', count=1000):
+            batch.append(key)
+            if len(batch) == 1000:
+                self.client.unlink(*batch)
+                batch = []
+        if batch:
+            self.client.unlink(*batch)
+
+
+class ResponseCache:
+    """Cache of rendered GET responses, invalidated by tag.
+
+    Every entry is keyed by its URL plus the current generation of each of
+    its tags. Invalidating a tag bumps its generation, so older entries are
+    never read again and age out of the LRU. With read replicas, a tag
+    also counts as recently invalidated for ``replica_lag`` seconds, while
+    a replica may still return the rows from before the write.
+    """
+
+    def __init__(self, backend, ttl=60, replica_lag=0):
+        self.backend = backend
+        self.ttl = ttl
+        self.replica_lag = replica_lag
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+    def count(self, name, amount=1):
+        """Add to one of the counters; requests run on several threads."""
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def key_for(self, path, tags):
+        generations = self.backend.get_counters([f'gen:{tag}' for tag in tags])
+        versions = ','.join(f'{tag}={generation}' for tag, generation in zip(tags, generations))
+        return f'resp:{path}|{versions}'
+
+    def get(self, key):
+        return self.backend.get(key)
+
+    def set(self, key, entry):
+        self.backend.set(key, entry, self.ttl)
+
+    def invalidate(self, *tags):
+        if tags:
+            self.backend.incr([f'gen:{tag}' for tag in tags])
+            if self.replica_lag:
+                self.backend.mark([f'recent:{tag}' for tag in tags], self.replica_lag)
+            self.count('invalidations', len(tags))
+
+    def recently_invalidated(self, tags):
+        return bool(self.replica_lag and tags) and self.backend.any_marked([f'recent:{tag}' for tag in tags])
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'not_modified': self.not_modified,
+            'invalidations': self.invalidations,
+            'evictions': self.backend.evictions,
+        }
+
+
+def init_app(app):
+    """Configure the response cache from the environment.
+
+    ``RESPONSE_CACHE_URL`` selects shared Redis storage, with keys under
+    ``RESPONSE_CACHE_PREFIX``; when unset each process keeps its own
+    in-memory LRU. Call after replicas.init_app.
+    """
+    app.config.setdefault('RESPONSE_CACHE_ENABLED', os.getenv('RESPONSE_CACHE_ENABLED', 'true').lower() == 'true')
+    url = os.getenv('RESPONSE_CACHE_URL')
+    if url:
+        backend = RedisBackend(url, os.getenv('RESPONSE_CACHE_PREFIX', 'response-cache:'))
+    else:
+        backend = MemoryBackend(int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', 2048)))
+    replica_lag = 0
+    if 'replicas' in app.extensions:
+        replica_lag = max(app.config['REPLICA_STICKY_SECONDS'], app.config['REPLICA_MAX_LAG_SECONDS'] or 0)
+    app.extensions['response_cache'] = ResponseCache(backend, int(os.getenv('RESPONSE_CACHE_TTL', 60)), replica_lag)
+
+
+def invalidate(*tags):
+    """Drop every cached response carrying any of ``tags``; call after the write commits."""
+    current_app.extensions['response_cache'].invalidate(*tags)
+
+
+def variant_path():
+    """The request's path and query string plus its preferred response type.
+
+    Views may render the same URL differently by ``Accept`` (JSON arrays or
+    NDJSON streams), so each type is cached apart.
+    """
+    return f'{request.full_path}|{request.accept_mimetypes.best}'
+
+
+def _render(entry, status=None):
+    response = Response(entry['body'], status=status or entry['status'], headers=entry['headers'])
+    response.set_etag(entry['etag'])
+    response.vary.add('Accept')
+    return response
+
+
+def cached(*tags):
+    """Cache successful responses of a Resource ``get`` method.
+
+    ``tags`` may reference view arguments, e.g. ``'book:{book_id}'``.
+    Responses carry a strong ETag and ``Vary: Accept``, and a matching
+    ``If-None-Match`` receives ``304 Not Modified`` without a body.
+
+    Clients that must read from the primary (see replicas.reads_primary)
+    bypass the cache, and responses are not stored while their tags are
+    recently invalidated, as a replica may have produced them from rows
+    older than the write.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(resource, *args, **kwargs):
+            if not current_app.config.get('RESPONSE_CACHE_ENABLED') or reads_primary():
+                return method(resource, *args, **kwargs)
+
+            cache = current_app.extensions['response_cache']
+            tag_values = [tag.format(**kwargs) for tag in tags]
+            key = cache.key_for(variant_path(), tag_values)
+            entry = cache.get(key)
+            if entry is not None:
+                cache.count('hits')
+            else:
+                cache.count('misses')
+                result = method(resource, *args, **kwargs)
+                if isinstance(result, Response):
+                    response = result
+                else:
+                    response = output_json(*unpack(result))
+                    response.headers['Content-Type'] = 'application/json'
+                if response.status_code != 200 or response.is_streamed:
+                    response.vary.add('Accept')
+                    return response
+                body = response.get_data()
+                entry = {
+                    'body': body.decode('utf-8'),
+                    'status': response.status_code,
+                    'headers': {
+                        name: value for name, value in response.headers.items()
+                        if name not in ('Content-Length', 'ETag')
+                    },
+                    'etag': hashlib.sha256(body).hexdigest(),
+                }
+                if not cache.recently_invalidated(tag_values):
+                    cache.set(key, entry)
+
+            if request.if_none_match.contains(entry['etag']):
+                cache.count('not_modified')
+                return _render({**entry, 'body': ''}, status=304)
+            return _render(entry)
+        return wrapper
+    return decorator
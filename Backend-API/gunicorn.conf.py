@@ -0,0 +1,62 @@
+import itertools
+import multiprocessing
+import os
+
+# Serve the app built in wsgi.py:  gunicorn -c gunicorn.conf.py wsgi:app
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8001')
+
+# Processes give parallelism across cores; threads overlap the time each
+# request spends waiting on the database. Keep DB_POOL_SIZE at or above the
+# thread count so threads do not queue for connections.
+workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+worker_class = 'gthread'
+
+# Import the app once in the master, so
+# workers start quickly and share its memory until they write to it
+preload_app = os.getenv('GUNICORN_PRELOAD', 'true').lower() == 'true'
+
+# Keep client connections open between requests behind a load balancer
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+
+# Recycle each worker after a number of requests, staggered so they do not
+# all restart at once, and let in-flight requests finish on shutdown
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 1000))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+
+# Metrics are kept per worker, and a scrape of the bound port reaches any
+# one of them. With METRICS_PORT_BASE set, the worker in slot N also serves
+# /metrics on METRICS_PORT_BASE + N. A recycled worker's replacement takes
+# over its slot, so Prometheus scrapes a fixed set of ports, one per worker.
+metrics_port_base = os.getenv('METRICS_PORT_BASE')
+
+
+def pre_fork(server, worker):
+    """Give the new worker the lowest metrics slot no live worker holds."""
+    taken = {getattr(other, 'metrics_slot', None) for other in server.WORKERS.values()}
+    worker.metrics_slot = next(slot for slot in itertools.count() if slot not in taken)
+
+
+def post_fork(server, worker):
+    """Give each worker its own database connections and, with
+    METRICS_PORT_BASE set, its own metrics port.
+
+    Sockets opened by the master while preloading would otherwise be shared
+    by every worker, for the primary and for any read replicas alike.
+    ``close=False`` drops them from the worker's pool without closing the
+    master's copies.
+    """
+    from app import db
+    from wsgi import app
+    replicas = app.extensions.get('replicas')
+    with app.app_context():
+        for engine in list(db.engines.values()) + (replicas.engines if replicas else []):
+            engine.dispose(close=False)
+    if metrics_port_base:
+        from metrics import serve
+        serve(app, int(metrics_port_base) + worker.metrics_slot)
@@ -0,0 +1,73 @@
+import os
+import threading
+import time
+import uuid
+
+from sqlalchemy import String
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.types import TypeDecorator
+
+_lock = threading.Lock()
+_last = (0, 0)
+
+
+def uuid7():
+    """Return a new time-ordered UUID (RFC 9562 version 7) as a string.
+
+    The first 48 bits are the Unix time in milliseconds, so ids created
+    later sort later and inserts land at the right-hand edge of the
+    primary key index instead of at random pages. Within one millisecond
+    the 12-bit ``rand_a`` field counts up from a random start, so ids from
+    this process stay in creation order.
+    """
+    global _last
+    with _lock:
+        millis = time.time_ns() // 1_000_000
+        last_millis, counter = _last
+        if millis > last_millis:
+            # Start low enough in the field to leave room for counting up
+            counter = int.from_bytes(os.urandom(2), 'big') & 0x7ff
+        elif counter < 0xfff:
+            millis, counter = last_millis, counter + 1
+        else:
+            # The counter ran out within a millisecond (or the clock went
+            # back): borrow the next millisecond rather than go out of order
+            millis, counter = last_millis + 1, int.from_bytes(os.urandom(2), 'big') & 0x7ff
+        _last = (millis, counter)
+    rand_b = int.from_bytes(os.urandom(8), 'big') & ((1 << 62) - 1)
+    value = (millis << 80) | (0x7 << 76) | (counter << 64) | (0b10 << 62) | rand_b
+    return str(uuid.UUID(int=value))
+
+
+def normalize(value):
+    """The canonical string form of a UUID; raise ValueError if ``value`` is not one."""
+    return str(value if isinstance(value, uuid.UUID) else uuid.UUID(str(value)))
+
+
+class GUID(TypeDecorator):
+    """UUID column: native ``uuid`` on PostgreSQL, 36 characters elsewhere.
+
+    Values are canonical strings in Python either way. A value that is not
+    a UUID can never match a stored id, so it binds as NULL: looking up a
+    malformed id finds nothing, as for a well-formed unknown one, instead
+    of failing the statement on PostgreSQL.
+    """
+
+    impl = String(36)
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == 'postgresql':
+            return dialect.type_descriptor(postgresql.UUID(as_uuid=False))
+        return dialect.type_descriptor(String(36))
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        try:
+            return normalize(value)
+        except ValueError:
+            return None
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else str(value)
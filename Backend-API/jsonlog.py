@@ -0,0 +1,169 @@
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import time
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, WatchedFileHandler
+
+from flask import g, has_request_context, request
+from flask.logging import default_handler
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+
+# Attributes every LogRecord has; anything else was passed in ``extra``
+RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+_listeners = {}
+
+
+class JsonFormatter(logging.Formatter):
+    """Render each record as one JSON object per line, as logstash's json codec expects."""
+
+    def __init__(self, service):
+        super().__init__()
+        self.service = service
+
+    def format(self, record):
+        entry = {
+            '@timestamp': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'service': self.service,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'source': f'{record.pathname}:{record.lineno}',
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamp the current request onto records, in the thread that logs them."""
+
+    def filter(self, record):
+        if has_request_context():
+            record.__dict__.setdefault('request_id', g.get('request_id'))
+            record.__dict__.setdefault('method', request.method)
+            record.__dict__.setdefault('path', request.path)
+            record.__dict__.setdefault('route', request.url_rule.rule if request.url_rule else None)
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Hand records to a background writer; drop them rather than wait if it falls behind."""
+
+    def __init__(self, maxsize):
+        super().__init__(queue.Queue(maxsize))
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Resolve the message and traceback here, but keep the extra fields
+        # for the JSON formatter, unlike the default which flattens them
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _restart_listeners():
+    # A forked worker inherits the queue but not the writer thread, and the
+    # queue's lock may have been held at the fork; give it a fresh pair
+    for handler, listener in _listeners.values():
+        handler.queue = queue.Queue(handler.queue.maxsize)
+        listener.queue = handler.queue
+        listener._thread = None
+        listener.start()
+
+
+def _stop_listeners():
+    for _, listener in _listeners.values():
+        if listener._thread is not None:
+            listener.stop()
+
+
+os.register_at_fork(after_in_child=_restart_listeners)
+atexit.register(_stop_listeners)
+
+
+def json_handler(filename, service, queue_size):
+    """Return the queue handler writing JSON lines to ``filename``, creating it once per file.
+
+    Every worker appends to the same file, so none of them may rotate it:
+    the file is reopened whenever it is moved away, and rotating it is left
+    to logrotate (without ``copytruncate``) or similar.
+    """
+    if filename not in _listeners:
+        os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+        file_handler = WatchedFileHandler(filename)
+        file_handler.setFormatter(JsonFormatter(service))
+        handler = NonBlockingQueueHandler(queue_size)
+        handler.addFilter(RequestContextFilter())
+        listener = QueueListener(handler.queue, file_handler, respect_handler_level=True)
+        listener.start()
+        _listeners[filename] = (handler, listener)
+    return _listeners[filename][0]
+
+
+def _start_request():
+    g.request_id = request.headers.get(REQUEST_ID_HEADER) or uuid.uuid4().hex
+    g.request_started = time.perf_counter()
+
+
+def _log_request(app):
+    def log_request(response):
+        if 'request_started' not in g:
+            return response
+        duration_ms = round((time.perf_counter() - g.request_started) * 1000, 2)
+        response.headers[REQUEST_ID_HEADER] = g.request_id
+        if app.config['ACCESS_LOG_ENABLED']:
+            app.logger.info(
+                f"{request.method} {request.path} {response.status_code} {duration_ms}ms",
+                extra={'event': 'access', 'status': response.status_code, 'duration_ms': duration_ms},
+            )
+        return response
+    return log_request
+
+
+def init_app(app, filename, service):
+    """Log ``app`` as JSON lines to ``filename`` from a background thread.
+
+    Every record carries the request id (taken from ``X-Request-ID`` or
+    generated, and echoed back), method, path and route of the request
+    that logged it. Each request also logs one access line with its status
+    and latency. The file is rotated from outside (see ``json_handler``).
+    With no ``filename`` only the request id and access lines are set up,
+    for other handlers.
+    """
+    app.config.setdefault('LOG_QUEUE_SIZE', int(os.getenv('LOG_QUEUE_SIZE', 10000)))
+    app.config.setdefault('ACCESS_LOG_ENABLED', os.getenv('ACCESS_LOG_ENABLED', 'true').lower() == 'true')
+
+    if filename is not None:
+        handler = json_handler(filename, service, app.config['LOG_QUEUE_SIZE'])
+        handler.setLevel(logging.INFO)
+        if handler not in app.logger.handlers:
+            app.logger.addHandler(handler)
+        app.extensions['json_logging'] = handler
+    app.logger.setLevel(logging.INFO)
+    # Keep the synchronous stderr handler Flask adds for warnings and errors
+    default_handler.setLevel(logging.WARNING)
+
+    app.before_request(_start_request)
+    app.after_request(_log_request(app))
@@ -0,0 +1,325 @@
+import atexit
+import glob
+import gzip
+import logging
+import os
+import queue
+import socket
+import struct
+import threading
+import time
+import zlib
+
+from jsonlog import JsonFormatter, NonBlockingQueueHandler, RequestContextFilter
+
+logger = logging.getLogger(__name__)
+
+# Lumberjack v2, the protocol of Logstash's beats input: a window of JSON
+# frames sent as one zlib-compressed frame, acknowledged by sequence number
+WINDOW_FRAME = b'2W'
+JSON_FRAME = b'2J'
+COMPRESSED_FRAME = b'2C'
+ACK_FRAME = b'2A'
+
+SPILL_SUFFIX = '.ndjson.gz'
+
+
+def encode_batch(lines):
+    """Encode JSON ``lines`` as one compressed, windowed lumberjack batch."""
+    frames = b''.join(
+        JSON_FRAME + struct.pack('>II', seq, len(line)) + line
+        for seq, line in enumerate(lines, start=1)
+    )
+    compressed = zlib.compress(frames)
+    return (WINDOW_FRAME + struct.pack('>I', len(lines))
+            + COMPRESSED_FRAME + struct.pack('>I', len(compressed)) + compressed)
+
+
+def _read_exactly(sock, size):
+    data = b''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError('collector closed the connection')
+        data += chunk
+    return data
+
+
+class LogShipper:
+    """Send log records to a Logstash beats input from a background thread.
+
+    Records wait in a bounded buffer (``NonBlockingQueueHandler``, which
+    drops and counts them when it is full) and are sent in batches of up to
+    ``batch_size``. A batch counts as sent once Logstash acknowledges it;
+    a batch that cannot be sent is spilled to a gzip file in ``spill_dir``
+    and replayed, oldest first, once the collector is reachable again.
+    Files claimed for replay by a process that has since died are put back
+    when the shipper starts.
+    """
+
+    def __init__(self, host, port, service, log_type, batch_size=500, flush_interval=1.0,
+                 buffer_size=10000, spill_dir='logs/spool', spill_max_bytes=100 * 1024 * 1024,
+                 timeout=5.0, retry_interval=5.0):
+        self.host = host
+        self.port = port
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spill_dir = spill_dir
+        self.spill_max_bytes = spill_max_bytes
+        self.timeout = timeout
+        self.retry_interval = retry_interval
+        self.formatter = JsonFormatter(service)
+        self.log_type = log_type
+        self.handler = NonBlockingQueueHandler(buffer_size)
+        self.handler.addFilter(RequestContextFilter())
+        self.sent = 0
+        self.spilled = 0
+        self.dropped_spill = 0
+        self._sock = None
+        self._retry_at = 0.0
+        self._spill_count = 0
+        self._stop = threading.Event()
+        self._thread = None
+        os.makedirs(spill_dir, exist_ok=True)
+
+    @property
+    def dropped(self):
+        return self.handler.dropped + self.dropped_spill
+
+    def encode(self, record):
+        record.type = self.log_type
+        return self.formatter.format(record).encode()
+
+    # Connection
+
+    def _connect(self):
+        if self._sock is None:
+            if time.monotonic() < self._retry_at:
+                raise ConnectionError('collector unavailable')
+            try:
+                self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+            except OSError:
+                self._retry_at = time.monotonic() + self.retry_interval
+                raise
+        return self._sock
+
+    def _disconnect(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+        self._retry_at = time.monotonic() + self.retry_interval
+
+    def send(self, lines):
+        """Send one batch and wait for Logstash to acknowledge all of it."""
+        sock = self._connect()
+        try:
+            sock.sendall(encode_batch(lines))
+            acked = 0
+            while acked < len(lines):
+                frame = _read_exactly(sock, 6)
+                if frame[:2] != ACK_FRAME:
+                    raise ConnectionError(f'unexpected frame {frame[:2]!r} from collector')
+                acked = struct.unpack('>I', frame[2:])[0]
+        except OSError:
+            self._disconnect()
+            raise
+        self.sent += len(lines)
+
+    # Spill files
+
+    def spill_files(self):
+        return sorted(glob.glob(os.path.join(self.spill_dir, '*' + SPILL_SUFFIX)))
+
+    def claimed_files(self):
+        """Spill files being replayed, as ``(path, pid of the process replaying it)``."""
+        claimed = []
+        for path in glob.glob(os.path.join(self.spill_dir, f'*{SPILL_SUFFIX}.*')):
+            unclaimed, _, owner = path.rpartition('.')
+            if owner.isdigit():
+                claimed.append((unclaimed, int(owner)))
+        return claimed
+
+    def spill_size(self):
+        paths = self.spill_files() + [f'{path}.{owner}' for path, owner in self.claimed_files()]
+        size = 0
+        for path in paths:
+            try:
+                size += os.path.getsize(path)
+            except FileNotFoundError:
+                pass
+        return size
+
+    def write_spill(self, path, lines):
+        with gzip.open(path + '.tmp', 'wb') as f:
+            f.write(b'\n'.join(lines) + b'\n')
+        os.replace(path + '.tmp', path)
+
+    def spill(self, lines):
+        """Write a batch that could not be sent to disk, or drop it once the spill is full."""
+        if self.spill_size() >= self.spill_max_bytes:
+            self.dropped_spill += len(lines)
+            return
+        self._spill_count += 1
+        name = f'{time.time():.6f}-{os.getpid()}-{self._spill_count}{SPILL_SUFFIX}'
+        self.write_spill(os.path.join(self.spill_dir, name), lines)
+        self.spilled += len(lines)
+
+    def reclaim_spilled(self):
+        """Put back spill files claimed by processes that exited before replaying them."""
+        for path, owner in self.claimed_files():
+            if owner != os.getpid() and _running(owner):
+                continue
+            try:
+                os.rename(f'{path}.{owner}', path)
+            except FileNotFoundError:
+                # Another worker put it back first
+                continue
+
+    def replay_spilled(self):
+        """Send spilled batches, oldest first, deleting each once acknowledged.
+
+        If sending fails part way through a file, only the lines not yet
+        acknowledged are put back.
+        """
+        for path in self.spill_files():
+            claimed = f'{path}.{os.getpid()}'
+            try:
+                # Another worker sharing the directory may be replaying it
+                os.rename(path, claimed)
+            except FileNotFoundError:
+                continue
+            with gzip.open(claimed, 'rb') as f:
+                lines = f.read().splitlines()
+            sent = 0
+            try:
+                for start in range(0, len(lines), self.batch_size):
+                    self.send(lines[start:start + self.batch_size])
+                    sent = start + self.batch_size
+            except OSError:
+                if sent:
+                    self.write_spill(path, lines[sent:])
+                    os.remove(claimed)
+                else:
+                    os.rename(claimed, path)
+                raise
+            os.remove(claimed)
+
+    # Sender thread
+
+    def take_batch(self):
+        """Wait up to ``flush_interval`` for a record, then take what is buffered up to a batch."""
+        try:
+            records = [self.handler.queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        while len(records) < self.batch_size:
+            try:
+                records.append(self.handler.queue.get_nowait())
+            except queue.Empty:
+                break
+        return [self.encode(record) for record in records]
+
+    def ship(self, lines):
+        """Send ``lines`` after anything spilled earlier, spilling them instead on failure."""
+        try:
+            self.replay_spilled()
+            if lines:
+                self.send(lines)
+        except OSError:
+            if lines:
+                self.spill(lines)
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                self.ship(self.take_batch())
+            except Exception:
+                # Not through app.logger, which would feed this shipper
+                logger.exception('Log shipping iteration failed')
+        self.flush()
+
+    def flush(self):
+        lines = self.take_remaining()
+        self._retry_at = 0.0
+        for start in range(0, len(lines), self.batch_size):
+            self.ship(lines[start:start + self.batch_size])
+        self._disconnect()
+
+    def take_remaining(self):
+        lines = []
+        while True:
+            try:
+                lines.append(self.encode(self.handler.queue.get_nowait()))
+            except queue.Empty:
+                return lines
+
+    def start(self):
+        self.reclaim_spilled()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name='log-shipper', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def restart_after_fork(self):
+        # The child inherits neither the thread nor a usable socket or queue lock
+        self.handler.queue = queue.Queue(self.handler.queue.maxsize)
+        self._sock = None
+        self._thread = None
+        self.start()
+
+
+def _running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Alive, but owned by another user
+        pass
+    return True
+
+
+_shippers = []
+
+
+def _restart_shippers():
+    for shipper in _shippers:
+        if shipper._thread is not None:
+            shipper.restart_after_fork()
+
+
+def _stop_shippers():
+    for shipper in _shippers:
+        shipper.stop(shipper.timeout)
+
+
+os.register_at_fork(after_in_child=_restart_shippers)
+atexit.register(_stop_shippers)
+
+
+def init_app(app, service, log_type):
+    """Ship ``app``'s log records to Logstash when ``LOG_SHIP_HOST`` is set."""
+    host = os.getenv('LOG_SHIP_HOST')
+    if not host:
+        return None
+    if 'log_shipper' in app.extensions:
+        return app.extensions['log_shipper']
+    shipper = LogShipper(
+        host, int(os.getenv('LOG_SHIP_PORT', 5044)), service, log_type,
+        batch_size=int(os.getenv('LOG_SHIP_BATCH_SIZE', 500)),
+        flush_interval=float(os.getenv('LOG_SHIP_FLUSH_INTERVAL', 1.0)),
+        buffer_size=int(os.getenv('LOG_SHIP_BUFFER_SIZE', 10000)),
+        spill_dir=os.getenv('LOG_SHIP_SPILL_DIR', os.path.join('logs', 'spool')),
+        spill_max_bytes=int(os.getenv('LOG_SHIP_SPILL_MAX_BYTES', 100 * 1024 * 1024)),
+    )
+    shipper.handler.setLevel(logging.INFO)
+    app.logger.addHandler(shipper.handler)
+    app.extensions['log_shipper'] = shipper
+    _shippers.append(shipper)
+    return shipper.start()
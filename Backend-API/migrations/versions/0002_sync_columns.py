@@ -0,0 +1,39 @@
+"""sync columns
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 00:20:43.102957
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('external_id', sa.String(length=36), nullable=True))
+        batch_op.create_unique_constraint('uq_user_external_id', ['external_id'])
+
+    # Existing rows count as changed now, so any later sync update wins
+    with op.batch_alter_table('book', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('external_id', sa.String(length=36), nullable=True))
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=sa.func.now()))
+        batch_op.create_unique_constraint('uq_book_external_id', ['external_id'])
+
+
+def downgrade():
+    with op.batch_alter_table('book', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_book_external_id', type_='unique')
+        batch_op.drop_column('updated_at')
+        batch_op.drop_column('external_id')
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_user_external_id', type_='unique')
+        batch_op.drop_column('external_id')
@@ -0,0 +1,40 @@
+"""uuid external ids
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 14:09:12.330461
+
+On PostgreSQL the Frontend API ids kept in external_id become native uuid
+columns, matching the Frontend's own keys. Integer primary keys are
+unchanged: external_id stays the mapping between the two services. The
+upgrade fails if a stored external_id is not a UUID.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+TABLES = ('user', 'book')
+
+
+def upgrade():
+    if op.get_context().dialect.name != 'postgresql':
+        return
+    for table in TABLES:
+        op.alter_column(table, 'external_id', type_=postgresql.UUID(as_uuid=False),
+                        postgresql_using='external_id::uuid')
+
+
+def downgrade():
+    if op.get_context().dialect.name != 'postgresql':
+        return
+    for table in TABLES:
+        op.alter_column(table, 'external_id', type_=sa.String(length=36),
+                        postgresql_using='external_id::text')
@@ -0,0 +1,31 @@
+"""borrower loan order
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 16:42:07.514203
+
+ix_book_borrowed_by also covers borrowed_until and id, so the overdue
+sweep can read each borrower's due loans in index order.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('book', schema=None) as batch_op:
+        batch_op.drop_index('ix_book_borrowed_by')
+        batch_op.create_index('ix_book_borrowed_by', ['borrowed_by', 'borrowed_until', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('book', schema=None) as batch_op:
+        batch_op.drop_index('ix_book_borrowed_by')
+        batch_op.create_index('ix_book_borrowed_by', ['borrowed_by'], unique=False)
@@ -1,4 +1,5 @@
 from app import db
+from ids import GUID
 from datetime import datetime, timedelta
 
 class User(db.Model):
@@ -6,6 +7,8 @@ class User(db.Model):
     email = db.Column(db.String(120), unique=True, nullable=False)
     first_name = db.Column(db.String(50), nullable=False)
     last_name = db.Column(db.String(50), nullable=False)
+    # Frontend API user id, used to resolve borrowers in synced books
+    external_id = db.Column(GUID, unique=True, nullable=True)
     
     # Relationship to Book model
     borrowed_books = db.relationship('Book', backref='borrower', lazy=True)
@@ -22,3 +25,16 @@ class Book(db.Model):
     borrowed_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
     borrowed_until = db.Column(db.Date, nullable=True)
 
+    # Frontend API book id and last change time, used by the sync endpoint
+    external_id = db.Column(GUID, unique=True, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        # Available and unavailable listings in id order
+        db.Index('ix_book_available_id', available, id),
+        # Loans per user and due-date range scans over borrowed books only
+        db.Index('ix_book_borrowed_by', borrowed_by, borrowed_until, id),
+        db.Index('ix_book_borrowed_until', borrowed_until, id,
+                 postgresql_where=borrowed_until.isnot(None), sqlite_where=borrowed_until.isnot(None)),
+    )
+
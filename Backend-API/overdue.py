@@ -0,0 +1,131 @@
+import logging
+import os
+import threading
+from datetime import date, timedelta
+from itertools import islice
+
+from sqlalchemy import tuple_
+
+from app import db
+from models import Book, User
+
+logger = logging.getLogger(__name__)
+
+SWEEP_BATCH_SIZE = 1000
+DEFAULT_REMIND_DAYS = 2
+
+
+def due_query(before):
+    # Loans due before `before`; the borrowed_until condition matches the
+    # partial index ix_book_borrowed_until, so this is an index range scan
+    return Book.query.filter(Book.borrowed_until.isnot(None), Book.borrowed_until < before)
+
+
+def due_loans(before, batch_size=SWEEP_BATCH_SIZE):
+    # Walk the due loans that have a borrower in (borrowed_by, borrowed_until, id)
+    # order, one bounded batch at a time, so each borrower's loans arrive
+    # together; ix_book_borrowed_by covers that order
+    after = None
+    while True:
+        query = (due_query(before).filter(Book.borrowed_by.isnot(None))
+                 .with_entities(Book.id, Book.title, Book.borrowed_by, Book.borrowed_until))
+        if after is not None:
+            query = query.filter(tuple_(Book.borrowed_by, Book.borrowed_until, Book.id) > tuple_(*after))
+        rows = query.order_by(Book.borrowed_by, Book.borrowed_until, Book.id).limit(batch_size).all()
+        if not rows:
+            return
+        yield rows
+        after = (rows[-1].borrowed_by, rows[-1].borrowed_until, rows[-1].id)
+
+
+def loans_by_borrower(before, batch_size=SWEEP_BATCH_SIZE):
+    # Yield (user id, loans) for each borrower as soon as the next borrower's
+    # loans start, so only one borrower's loans are collected at a time
+    user_id, loans = None, []
+    for rows in due_loans(before, batch_size):
+        for row in rows:
+            if row.borrowed_by != user_id and loans:
+                yield user_id, loans
+                loans = []
+            user_id = row.borrowed_by
+            loans.append(row)
+    if loans:
+        yield user_id, loans
+
+
+def log_notification(user, overdue, due_soon):
+    # Stand-in delivery channel: one log line per borrower
+    logger.info(f'Reminder for {user.email}: {len(overdue)} overdue, {len(due_soon)} due soon')
+
+
+def sweep(today=None, remind_days=DEFAULT_REMIND_DAYS, notify=log_notification,
+          batch_size=SWEEP_BATCH_SIZE):
+    # Send each borrower with overdue or soon-due loans a single notification
+    today = today or date.today()
+    loans = users = 0
+    # Due within remind_days means due before the day after that
+    groups = loans_by_borrower(today + timedelta(days=remind_days + 1), batch_size)
+    while True:
+        # Look the borrowers up batch_size at a time
+        batch = dict(islice(groups, batch_size))
+        if not batch:
+            break
+        for user in User.query.filter(User.id.in_(list(batch))):
+            user_loans = batch[user.id]
+            overdue = [loan for loan in user_loans if loan.borrowed_until < today]
+            due_soon = [loan for loan in user_loans if loan.borrowed_until >= today]
+            notify(user, overdue, due_soon)
+        loans += sum(len(user_loans) for user_loans in batch.values())
+        users += len(batch)
+    return {'loans': loans, 'users': users}
+
+
+class OverdueSweeper:
+    # Runs `sweep` every `interval` seconds in a daemon thread
+
+    def __init__(self, app, interval=None, remind_days=None, notify=log_notification):
+        self.app = app
+        self.interval = interval or float(os.getenv('OVERDUE_SWEEP_INTERVAL', 24 * 60 * 60))
+        self.remind_days = remind_days if remind_days is not None else int(
+            os.getenv('OVERDUE_REMIND_DAYS', DEFAULT_REMIND_DAYS))
+        self.notify = notify
+        self._stop = threading.Event()
+        self._thread = None
+
+    def run_once(self):
+        with self.app.app_context():
+            summary = sweep(remind_days=self.remind_days, notify=self.notify)
+            db.session.remove()
+        logger.info(f"Overdue sweep notified {summary['users']} borrowers about {summary['loans']} loans")
+        return summary
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception('Overdue sweep failed')
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name='overdue-sweeper', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+if __name__ == '__main__':
+    # Run as a dedicated process, sweeping every OVERDUE_SWEEP_INTERVAL
+    # seconds: python overdue.py, or a single sweep from cron: python overdue.py --once
+    import sys
+    from app import create_app
+    logging.basicConfig(level=logging.INFO)
+    sweeper = OverdueSweeper(create_app())
+    if '--once' in sys.argv:
+        sweeper.run_once()
+    else:
+        sweeper.run()
@@ -0,0 +1,198 @@
+import json
+import logging
+import os
+import threading
+import time
+
+import requests
+
+from app import db
+from cache import invalidate
+from digest import MAX_PREFIX_LENGTH, child_digests, in_range, row_digest
+from metrics import callback, counter, histogram
+from models import Book
+from sync import chunks, resolve_borrowers, to_row, upsert_books
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FRONTEND_API_URL = 'http://frontend_api:8000'
+# 256 top-level ranges, then 16 children per differing range until a range
+# holds few enough books on both sides to compare them one by one
+ROOT_WIDTH = 2
+LEAF_SIZE = 1000
+DIGEST_BATCH_SIZE = 10000
+REQUEST_TIMEOUT = 60
+
+# Columns hashed by digest.row_digest, in its argument order
+DIGEST_COLUMNS = (Book.external_id, Book.title, Book.author, Book.publisher, Book.category,
+                  Book.available, Book.borrowed_until)
+
+RUNS = counter('reconcile_runs_total', 'Catalogue reconciliation runs by outcome.', ('outcome',))
+RUN_DURATION = histogram('reconcile_duration_seconds', 'Time to reconcile the catalogue with the Frontend API.',
+                         buckets=(0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0))
+RANGES = counter('reconcile_ranges_total', 'Id ranges compared with the Frontend API, by result.', ('result',))
+DRIFT = counter('reconcile_books_drifted_total', 'Books out of step with the Frontend API, by kind.', ('kind',))
+REPAIRED = counter('reconcile_books_repaired_total', 'Books rewritten from the Frontend API copy.')
+
+last_run = {}
+callback('reconcile_last_drift', 'Books out of step with the Frontend API at the last reconciliation.',
+         'gauge', lambda: last_run.get('drift'))
+callback('reconcile_last_success_timestamp_seconds', 'Completion time of the last successful reconciliation.',
+         'gauge', lambda: last_run.get('finished_at'))
+
+
+class FrontendCatalogue:
+    # The Frontend API side of the comparison, over its /books/digest endpoints
+
+    def __init__(self, url=None):
+        self.url = (url or os.getenv('FRONTEND_API_URL', DEFAULT_FRONTEND_API_URL)).rstrip('/')
+        self.session = requests.Session()
+
+    def get(self, path, **params):
+        response = self.session.get(f'{self.url}{path}', params=params, timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        return response.json()
+
+    def children(self, prefix, width):
+        return self.get('/books/digest', prefix=prefix, width=width)['children']
+
+    def books(self, prefix):
+        return self.get('/books/digest/rows', prefix=prefix)['books']
+
+
+def local_rows(prefix):
+    # Books that came from the Frontend API, in the range of ids starting with prefix
+    query = db.session.query(*DIGEST_COLUMNS).filter(Book.external_id.isnot(None))
+    return in_range(query, Book.external_id, prefix)
+
+
+def local_children(prefix, width):
+    return child_digests(local_rows(prefix).yield_per(DIGEST_BATCH_SIZE), prefix, width)
+
+
+def compare_range(catalogue, prefix):
+    # Split one range into the Frontend books missing or different here, and
+    # the ids of books here the Frontend no longer has
+    theirs = {book['id']: book for book in catalogue.books(prefix)}
+    ours = {row[0]: row_digest(*row) for row in local_rows(prefix)}
+    missing, changed = [], []
+    for book_id, book in theirs.items():
+        if book_id not in ours:
+            missing.append(book)
+        elif ours[book_id] != row_digest(book_id, book['title'], book['author'], book['publisher'],
+                                         book['category'], book['available'], book['borrowed_until']):
+            changed.append(book)
+    extra = [book_id for book_id in ours if book_id not in theirs]
+    return missing, changed, extra
+
+
+def repair(books):
+    # Rewrite books from the Frontend copy through the sync upsert, which keeps
+    # any local version that is newer; returns the number of rows written
+    repaired = 0
+    for chunk in chunks(books):
+        repaired += upsert_books(resolve_borrowers([to_row(book) for book in chunk]))
+    db.session.commit()
+    if repaired:
+        invalidate('books')
+    return repaired
+
+
+def reconcile(catalogue, apply=True, leaf_size=LEAF_SIZE):
+    # Walk the id prefix tree from the root, descending only into ranges whose
+    # digests differ, and compare (and optionally repair) the small ones row by row
+    summary = {'ranges_compared': 0, 'ranges_differing': 0, 'requests': 0,
+               'missing': 0, 'changed': 0, 'extra': 0, 'repaired': 0}
+    pending = [('', ROOT_WIDTH)]
+    while pending:
+        prefix, width = pending.pop()
+        theirs = catalogue.children(prefix, width)
+        ours = local_children(prefix, width)
+        summary['requests'] += 1
+        for child in sorted(set(theirs) | set(ours)):
+            summary['ranges_compared'] += 1
+            if theirs.get(child) == ours.get(child):
+                RANGES.inc(1, 'equal')
+                continue
+            RANGES.inc(1, 'differing')
+            summary['ranges_differing'] += 1
+            child_prefix = prefix + child
+            largest = max(side[child]['count'] for side in (theirs, ours) if child in side)
+            if largest > leaf_size and len(child_prefix) < MAX_PREFIX_LENGTH:
+                pending.append((child_prefix, 1))
+                continue
+
+            missing, changed, extra = compare_range(catalogue, child_prefix)
+            summary['requests'] += 1
+            for kind, books in (('missing', missing), ('changed', changed), ('extra', extra)):
+                summary[kind] += len(books)
+                DRIFT.inc(len(books), kind)
+            if apply and (missing or changed):
+                repaired = repair(missing + changed)
+                summary['repaired'] += repaired
+                REPAIRED.inc(repaired)
+    return summary
+
+
+class Reconciler:
+    # Runs `reconcile` every `interval` seconds in a daemon thread
+
+    def __init__(self, app, catalogue=None, interval=None, apply=True):
+        self.app = app
+        self.catalogue = catalogue or FrontendCatalogue()
+        self.interval = interval or float(os.getenv('RECONCILE_INTERVAL', 60 * 60))
+        self.apply = apply
+        self._stop = threading.Event()
+        self._thread = None
+
+    def run_once(self):
+        started = time.perf_counter()
+        try:
+            with self.app.app_context():
+                summary = reconcile(self.catalogue, self.apply)
+                db.session.remove()
+        except Exception:
+            RUNS.inc(1, 'failed')
+            raise
+        RUNS.inc(1, 'completed')
+        RUN_DURATION.observe(time.perf_counter() - started)
+        last_run.update(drift=summary['missing'] + summary['changed'] + summary['extra'],
+                        finished_at=time.time())
+        logger.info(f'Reconciliation: {json.dumps(summary)}')
+        return summary
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception('Reconciliation failed')
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name='reconciler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+if __name__ == '__main__':
+    # Run as a dedicated process, reconciling every RECONCILE_INTERVAL seconds:
+    # python reconcile.py, or one pass from cron: python reconcile.py --once [--dry-run]
+    import sys
+    from app import create_app
+    from metrics import serve
+    logging.basicConfig(level=logging.INFO)
+    app = create_app()
+    reconciler = Reconciler(app, apply='--dry-run' not in sys.argv)
+    if '--once' in sys.argv:
+        print(json.dumps(reconciler.run_once(), indent=2))
+    else:
+        if os.getenv('RECONCILE_METRICS_PORT'):
+            # This process serves no API requests, so expose its metrics separately
+            serve(app, int(os.getenv('RECONCILE_METRICS_PORT')))
+        reconciler.run()
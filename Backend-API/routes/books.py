@@ -1,20 +1,54 @@
+from datetime import date, timedelta
+from flask import request
 from flask_restful import Resource
 from models import Book
 from schemas import BookSchema
+from pagination import paginate
+from streaming import stream_format, stream_response
+from cache import cached
+from replicas import replica_reads
+from singleflight import coalesced
+import fastjson
+from sync import apply_sync
+from overdue import due_query
 from app import db
 
-book_schema = BookSchema(many=True)
+book_schema = BookSchema()
+books_schema = BookSchema(many=True)
+book_rows = fastjson.RowSerializer(books_schema)
+
+def stream_books(query, fmt):
+    query = query.order_by(Book.id)
+    if fastjson.enabled():
+        return stream_response(book_rows.select(query), book_rows.dump, fmt)
+    return stream_response(query, books_schema.dump, fmt)
 
 class BookListResource(Resource):
+    @cached('books')
+    @coalesced('books')
+    @replica_reads
     def get(self):
-        books = Book.query.filter_by(available=True).all()
-        return book_schema.dump(books)
+        query = Book.query.filter_by(available=True)
+        try:
+            fmt = stream_format()
+            if fmt:
+                return stream_books(query, fmt)
+            if fastjson.enabled():
+                rows, headers = paginate(book_rows.select(query), Book.id)
+                return book_rows.response(rows, 200, headers)
+            books, headers = paginate(query, Book.id)
+        except ValueError as err:
+            return {'message': str(err)}, 400
+        return books_schema.dump(books), 200, headers
 
     def post(self):
         # Logic to add a book
         pass
 
 class BookResource(Resource):
+    @cached('books')
+    @coalesced('books')
+    @replica_reads
     def get(self, book_id):
         book = Book.query.get_or_404(book_id)
         return book_schema.dump(book)
@@ -23,8 +57,48 @@ class BookResource(Resource):
         # Logic to remove a book
         pass
 
+class BookSyncResource(Resource):
+    def post(self):
+        # Upsert a JSON array or NDJSON stream of Frontend book changes,
+        # skipping any change older than the stored one
+        summary = apply_sync()
+        if 'message' in summary:
+            # Chunks before the malformed part are committed; report them too
+            return summary, 400
+        return summary, 200
+
 class UnavailableBooksResource(Resource):
+    @cached('books')
+    @replica_reads
     def get(self):
-        unavailable_books = Book.query.filter_by(available=False).all()
-        return book_schema.dump(unavailable_books)
+        query = Book.query.filter_by(available=False)
+        try:
+            fmt = stream_format()
+            if fmt:
+                return stream_books(query, fmt)
+            if fastjson.enabled():
+                rows, headers = paginate(book_rows.select(query), Book.id)
+                return book_rows.response(rows, 200, headers)
+            unavailable_books, headers = paginate(query, Book.id)
+        except ValueError as err:
+            return {'message': str(err)}, 400
+        return books_schema.dump(unavailable_books), 200, headers
 
+
+class OverdueBooksResource(Resource):
+    @cached('books')
+    @replica_reads
+    def get(self):
+        # Overdue loans, most overdue first; ?due_within=N adds loans due in the next N days
+        try:
+            days = int(request.args.get('due_within', 0))
+        except ValueError:
+            return {'message': 'due_within must be an integer'}, 400
+        if days < 0:
+            return {'message': 'due_within must not be negative'}, 400
+        query = due_query(date.today() + timedelta(days=days))
+        try:
+            books, headers = paginate(query, Book.borrowed_until, Book.id)
+        except ValueError as err:
+            return {'message': str(err)}, 400
+        return books_schema.dump(books), 200, headers
@@ -1,17 +1,39 @@
 from flask_restful import Resource
+from sqlalchemy.orm import selectinload
 from models import User
 from schemas import UserSchema
+from pagination import paginate
+from streaming import stream_format, stream_response
+from replicas import replica_reads
 from app import db
 
 user_schema = UserSchema(many=True)
 
 class UserListResource(Resource):
+    @replica_reads
     def get(self):
-        users = User.query.all()
-        return user_schema.dump(users)
+        query = User.query.options(selectinload(User.borrowed_books))
+        try:
+            fmt = stream_format()
+            if fmt:
+                # Borrowed books are fetched with one IN query per streamed chunk
+                return stream_response(query.order_by(User.id), user_schema.dump, fmt)
+            users, headers = paginate(query, User.id)
+        except ValueError as err:
+            return {'message': str(err)}, 400
+        return user_schema.dump(users), 200, headers
 
 class UserBorrowedBooksResource(Resource):
+    @replica_reads
     def get(self):
-        users_with_books = User.query.filter(User.borrowed_books.any()).all()
-        return user_schema.dump(users_with_books)
+        try:
+            # Borrowed books for the whole page are fetched in one extra IN query
+            query = User.query.filter(User.borrowed_books.any()).options(selectinload(User.borrowed_books))
+            fmt = stream_format()
+            if fmt:
+                return stream_response(query.order_by(User.id), user_schema.dump, fmt)
+            users_with_books, headers = paginate(query, User.id)
+        except ValueError as err:
+            return {'message': str(err)}, 400
+        return user_schema.dump(users_with_books), 200, headers
 
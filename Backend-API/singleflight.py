@@ -0,0 +1,125 @@
+import os
+import threading
+from collections import namedtuple
+from functools import wraps
+
+from flask import current_app, request
+from flask_restful import unpack
+from flask_restful.representations.json import output_json
+from werkzeug.wrappers import Response
+
+from cache import variant_path
+from metrics import counter
+from replicas import reads_primary
+
+COALESCED = counter('singleflight_requests_total',
+                    'Requests to coalesced views, by route and whether they ran the view or shared a result.',
+                    ('route', 'outcome'))
+
+Rendered = namedtuple('Rendered', 'status headers body')
+
+
+class Flight:
+    """One in-progress computation and, once ``done`` is set, its outcome."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.failed = False
+
+
+class SingleFlight:
+    """Run at most one call per key at a time in this process.
+
+    Callers that arrive while a call for their key is in progress wait for
+    it and share its result instead of repeating the work.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, call, timeout):
+        """Return ``(result, outcome)``.
+
+        ``outcome`` is ``'leader'`` if ``call`` ran here, ``'shared'`` if an
+        earlier caller's result was reused, or ``'timeout'``/``'fallback'``
+        if this caller ran ``call`` itself after waiting ``timeout`` seconds
+        or after the earlier call failed.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = Flight()
+
+        if leader:
+            try:
+                flight.result = call()
+            except BaseException:
+                flight.failed = True
+                raise
+            finally:
+                with self._lock:
+                    del self._flights[key]
+                flight.done.set()
+            return flight.result, 'leader'
+
+        if not flight.done.wait(timeout):
+            return call(), 'timeout'
+        if flight.failed:
+            return call(), 'fallback'
+        return flight.result, 'shared'
+
+
+def freeze(result):
+    """Render a Resource method's return value once, for every waiting request to copy."""
+    if isinstance(result, Response):
+        response = result
+    else:
+        response = output_json(*unpack(result))
+        response.headers['Content-Type'] = 'application/json'
+    if response.is_streamed:
+        # A stream is read once; it cannot be shared
+        return response
+    return Rendered(response.status_code, list(response.headers.items()), response.get_data())
+
+
+def coalesced(*tags):
+    """Let concurrent identical requests to a Resource ``get`` method share one run of it.
+
+    Requests are identical when they have the same path, query string and
+    preferred response type, agree on whether they must read from the
+    primary (see replicas.reads_primary), and saw the same generation of
+    each response cache tag in ``tags`` (as for cache.cached). A request
+    that starts after a write invalidated one of them therefore never
+    shares a result computed before it. A request waits at most
+    ``SINGLEFLIGHT_TIMEOUT`` seconds before running the method itself.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(resource, *args, **kwargs):
+            if not current_app.config.get('SINGLEFLIGHT_ENABLED'):
+                return method(resource, *args, **kwargs)
+
+            cache = current_app.extensions['response_cache']
+            key = (request.endpoint, cache.key_for(variant_path(), [tag.format(**kwargs) for tag in tags]),
+                   reads_primary())
+            result, outcome = current_app.extensions['singleflight'].do(
+                key, lambda: freeze(method(resource, *args, **kwargs)), current_app.config['SINGLEFLIGHT_TIMEOUT'])
+            if isinstance(result, Response) and outcome == 'shared':
+                # The leader's response was streamed; make this request's own
+                result, outcome = freeze(method(resource, *args, **kwargs)), 'fallback'
+            COALESCED.inc(1, request.endpoint, outcome)
+            if isinstance(result, Response):
+                return result
+            return Response(result.body, status=result.status, headers=result.headers)
+        return wrapper
+    return decorator
+
+
+def init_app(app):
+    """Enable coalescing for the views decorated with ``coalesced`` unless ``SINGLEFLIGHT_ENABLED`` is false."""
+    app.config.setdefault('SINGLEFLIGHT_ENABLED', os.getenv('SINGLEFLIGHT_ENABLED', 'true').lower() == 'true')
+    app.config.setdefault('SINGLEFLIGHT_TIMEOUT', float(os.getenv('SINGLEFLIGHT_TIMEOUT', 5)))
+    app.extensions['singleflight'] = SingleFlight()
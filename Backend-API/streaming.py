@@ -0,0 +1,56 @@
+import json
+
+from flask import Response, request, stream_with_context
+
+STREAM_CHUNK_SIZE = 1000
+NDJSON_MIMETYPE = 'application/x-ndjson'
+STREAM_FORMATS = ('json', 'ndjson')
+
+
+def stream_format():
+    # 'json' or 'ndjson' when the client asked for the whole result streamed,
+    # None for the usual paginated response
+    fmt = request.args.get('stream')
+    if fmt is None:
+        if request.accept_mimetypes.best == NDJSON_MIMETYPE:
+            return 'ndjson'
+        return None
+    if fmt not in STREAM_FORMATS:
+        raise ValueError('stream must be json or ndjson')
+    return fmt
+
+
+def iter_chunks(query, chunk_size):
+    # yield_per fetches through a server-side cursor (stream_results) where the
+    # driver supports one, so only chunk_size rows are held at a time
+    chunk = []
+    for row in query.yield_per(chunk_size):
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def generate(query, dump, fmt, chunk_size):
+    # The body is written one chunk at a time; the first bytes go out before
+    # the rest of the result has been read
+    if fmt == 'ndjson':
+        for chunk in iter_chunks(query, chunk_size):
+            yield ''.join(json.dumps(item) + '\n' for item in dump(chunk))
+        return
+
+    yield '['
+    separator = ''
+    for chunk in iter_chunks(query, chunk_size):
+        yield separator + ', '.join(json.dumps(item) for item in dump(chunk))
+        separator = ', '
+    yield ']\n'
+
+
+def stream_response(query, dump, fmt, chunk_size=None):
+    # dump turns a list of rows into a list of JSON-ready dicts, e.g. a many=True schema's dump
+    mimetype = NDJSON_MIMETYPE if fmt == 'ndjson' else 'application/json'
+    body = generate(query, dump, fmt, chunk_size or STREAM_CHUNK_SIZE)
+    return Response(stream_with_context(body), mimetype=mimetype)
@@ -0,0 +1,212 @@
+import json
+from datetime import date, datetime, timezone
+from itertools import islice
+
+from flask import request
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import db
+from ids import normalize
+from models import Book, User
+from cache import invalidate
+
+CHUNK_SIZE = 1000
+REQUIRED_FIELDS = ('id', 'title', 'author', 'publisher', 'category')
+UPDATED_FIELDS = ('title', 'author', 'publisher', 'category', 'available',
+                  'borrowed_by', 'borrowed_until', 'updated_at')
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/ndjson')
+
+
+def read_records():
+    """Yield book changes from a JSON array body or an NDJSON stream.
+
+    NDJSON bodies are read line by line, so a large sync never has to fit
+    in memory at once. Raises ValueError for a body that is neither.
+    """
+    if request.mimetype in NDJSON_MIMETYPES:
+        for number, line in enumerate(request.stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                raise ValueError(f'Line {number} is not valid JSON')
+        return
+
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = [data]
+    if not isinstance(data, list):
+        raise ValueError('Expected a JSON array or an NDJSON stream of books')
+    yield from data
+
+
+def chunks(iterable, size=CHUNK_SIZE):
+    """Split ``iterable`` into lists of at most ``size`` items."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def parse_datetime(value):
+    """Parse an ISO timestamp into a naive UTC datetime."""
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def to_row(record):
+    """Convert one incoming Frontend change into a ``book`` row; raise ValueError if invalid.
+
+    The Frontend id becomes ``external_id``; ``borrowed_by`` still holds the
+    Frontend user id and, with the ``borrower`` details the Frontend sends
+    along, is resolved by ``resolve_borrowers``.
+    """
+    if not isinstance(record, dict):
+        raise ValueError('Expected an object')
+    missing = [field for field in REQUIRED_FIELDS if not record.get(field)]
+    if missing:
+        raise ValueError(f"Missing fields: {', '.join(missing)}")
+
+    borrowed_until = record.get('borrowed_until')
+    updated_at = record.get('updated_at')
+    borrower = record.get('borrower') if record.get('borrowed_by') else None
+    if borrower is not None and not (isinstance(borrower, dict) and borrower.get('email')):
+        raise ValueError('Invalid value: borrower needs an email')
+    try:
+        return {
+            'external_id': normalize(record['id']),
+            'title': str(record['title']),
+            'author': str(record['author']),
+            'publisher': str(record['publisher']),
+            'category': str(record['category']),
+            'available': bool(record.get('available', True)),
+            'borrowed_by': normalize(record['borrowed_by']) if record.get('borrowed_by') else None,
+            'borrowed_until': date.fromisoformat(borrowed_until) if borrowed_until else None,
+            'updated_at': parse_datetime(updated_at) if updated_at else datetime.utcnow(),
+            'borrower': {
+                'email': str(borrower['email']).lower(),
+                'first_name': str(borrower.get('first_name') or ''),
+                'last_name': str(borrower.get('last_name') or ''),
+            } if borrower else None,
+        }
+    except (TypeError, ValueError) as err:
+        raise ValueError(f'Invalid value: {err}')
+
+
+def users_by_email(emails):
+    """Map each of the lower-case ``emails`` that is enrolled to its user."""
+    return {
+        user.email.lower(): user
+        for user in User.query.filter(db.func.lower(User.email).in_(emails))
+    }
+
+
+def resolve_borrowers(rows):
+    """Replace Frontend user ids in ``borrowed_by`` with local user ids.
+
+    Borrowers are looked up by their Frontend id. One seen for the first
+    time is matched to the user with the same email, or created from its
+    ``borrower`` details, and remembered by Frontend id from then on. A
+    borrower that is unknown and came without details is left unset.
+    Removes the ``borrower`` key from every row.
+    """
+    borrowers = {}
+    for row in rows:
+        borrower = row.pop('borrower', None)
+        if borrower is not None:
+            borrowers[row['borrowed_by']] = borrower
+    external_ids = {row['borrowed_by'] for row in rows if row['borrowed_by']}
+    mapping = {}
+    if external_ids:
+        mapping = dict(
+            db.session.query(User.external_id, User.id)
+            .filter(User.external_id.in_(external_ids))
+            .all()
+        )
+
+    unknown = {external_id: borrower for external_id, borrower in borrowers.items()
+               if external_id not in mapping}
+    if unknown:
+        by_email = users_by_email([borrower['email'] for borrower in unknown.values()])
+        new = {borrower['email']: borrower for borrower in unknown.values()
+               if borrower['email'] not in by_email}
+        if new:
+            # A concurrent sync may enroll the same borrower; skip rather than
+            # fail on the unique email, then read back whichever row was stored
+            dialect = postgresql if db.engine.dialect.name == 'postgresql' else sqlite
+            db.session.execute(
+                dialect.insert(User.__table__).values(list(new.values())).on_conflict_do_nothing())
+            by_email.update(users_by_email(list(new)))
+        for external_id, borrower in unknown.items():
+            user = by_email[borrower['email']]
+            user.external_id = external_id
+            mapping[external_id] = user.id
+        db.session.flush()
+
+    for row in rows:
+        row['borrowed_by'] = mapping.get(row['borrowed_by'])
+    return rows
+
+
+def upsert_books(rows):
+    """Apply ``rows`` with a single INSERT ... ON CONFLICT DO UPDATE.
+
+    A row only overwrites an existing book when its ``updated_at`` is newer,
+    so replayed or out-of-order changes cannot roll a book back. Returns the
+    number of rows inserted or updated.
+    """
+    # A statement may touch each key once; keep the newest change per book
+    newest = {}
+    for row in rows:
+        current = newest.get(row['external_id'])
+        if current is None or row['updated_at'] >= current['updated_at']:
+            newest[row['external_id']] = row
+
+    dialect = postgresql if db.engine.dialect.name == 'postgresql' else sqlite
+    table = Book.__table__
+    stmt = dialect.insert(table).values(list(newest.values()))
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.external_id],
+        set_={name: stmt.excluded[name] for name in UPDATED_FIELDS},
+        where=table.c.updated_at < stmt.excluded.updated_at,
+    )
+    return db.session.execute(stmt).rowcount
+
+
+def apply_sync():
+    """Read, validate and upsert the request body chunk by chunk.
+
+    Returns a summary with the number of records received and applied, and
+    the position and reason of every rejected record. Each chunk is
+    committed on its own, so when the body turns out to be malformed
+    partway through, the chunks before it stay applied and the summary
+    also carries a ``message`` naming the problem.
+    """
+    received = applied = 0
+    errors = []
+    try:
+        for chunk in chunks(read_records()):
+            rows = []
+            for offset, record in enumerate(chunk):
+                try:
+                    rows.append(to_row(record))
+                except ValueError as err:
+                    errors.append({'index': received + offset, 'message': str(err)})
+            received += len(chunk)
+            if rows:
+                applied += upsert_books(resolve_borrowers(rows))
+                db.session.commit()
+                invalidate('books')
+    except ValueError as err:
+        db.session.rollback()
+        return {'received': received, 'applied': applied, 'errors': errors, 'message': str(err)}
+    return {'received': received, 'applied': applied, 'errors': errors}
@@ -11,6 +11,10 @@ def app():
     app.config['TESTING'] = True
     # Use an in-memory SQLite database for testing
     app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    # Tests that exercise the response cache turn it on themselves
+    app.config['RESPONSE_CACHE_ENABLED'] = False
+    # Fail any request that repeats one statement more than N_PLUS_ONE_THRESHOLD times
+    app.config['QUERY_LOG_ENABLED'] = True
 
     with app.app_context():
         db.create_all()
@@ -51,7 +55,8 @@ def init_database(app):
 
         yield db  # Provide the fixture value
 
-        # Clean up after tests
+        # Clean up after tests, leaving empty tables for the rest of the module
         db.session.remove()
         db.drop_all()
+        db.create_all()
 
@@ -1,6 +1,14 @@
 # Backend-API/tests/test_books.py
 
+import json
 import pytest
+import uuid
+from datetime import date, timedelta
+from app import create_app, db
+from models import User, Book
+from overdue import sweep
+from digest import child_digests, hex_digits
+from reconcile import reconcile
 
 def test_list_books_empty(client):
     """Test listing books when none are available."""
@@ -78,3 +86,338 @@ def test_list_unavailable_books(client, init_database):
     assert data[0]['available'] == False
     assert data[0]['borrowed_until'] is not None
 
+
+def test_sync_books_maps_frontend_ids(client, init_database):
+    """Test that synced books are keyed by their Frontend id and borrowers are resolved."""
+    with client.application.app_context():
+        user = User.query.filter_by(email="admin1@example.com").first()
+        user.external_id = '00000000-0000-7000-9000-000000000001'
+        db.session.commit()
+        user_id = user.id
+
+    record = {
+        'id': '00000000-0000-7000-8000-000000000001',
+        'title': 'Synced Book',
+        'author': 'Sync Author',
+        'publisher': 'Sync Publisher',
+        'category': 'Sync',
+        'available': False,
+        'borrowed_by': '00000000-0000-7000-9000-000000000001',
+        'borrowed_until': '2024-05-01',
+        'updated_at': '2024-04-17T10:00:00'
+    }
+    response = client.post('/books/sync', json=[record])
+    assert response.status_code == 200
+    assert response.get_json()['applied'] == 1
+
+    # Replaying the same change is a no-op
+    response = client.post('/books/sync', json=[record])
+    assert response.get_json()['applied'] == 0
+
+    with client.application.app_context():
+        book = Book.query.filter_by(external_id='00000000-0000-7000-8000-000000000001').one()
+        assert book.borrowed_by == user_id
+        assert book.available == False
+
+def test_sync_books_enrolls_borrowers(client, init_database):
+    """Test that borrowers sent along with books are matched by email or created, then known by Frontend id."""
+    def loan(book, user, email, first_name):
+        return {
+            'id': f'00000000-0000-7000-8000-00000000001{book}',
+            'title': f'Loaned Book {book}',
+            'author': 'Sync Author',
+            'publisher': 'Sync Publisher',
+            'category': 'Sync',
+            'available': False,
+            'borrowed_by': f'00000000-0000-7000-9000-00000000001{user}',
+            'borrower': {'email': email, 'first_name': first_name, 'last_name': 'Reader'},
+            'borrowed_until': '2024-05-01',
+            'updated_at': '2024-04-17T10:00:00'
+        }
+
+    response = client.post('/books/sync', json=[
+        loan(1, 1, 'Admin2@example.com', 'Admin'),
+        loan(2, 2, 'new.reader@example.com', 'New'),
+    ])
+    assert response.get_json()['applied'] == 2
+    # Once known, a borrower is resolved by Frontend id alone
+    record = loan(3, 2, 'ignored@example.com', 'Ignored')
+    del record['borrower']
+    assert client.post('/books/sync', json=[record]).get_json()['applied'] == 1
+
+    with client.application.app_context():
+        existing = User.query.filter_by(email='admin2@example.com').one()
+        created = User.query.filter_by(email='new.reader@example.com').one()
+        assert existing.external_id == '00000000-0000-7000-9000-000000000011'
+        assert created.external_id == '00000000-0000-7000-9000-000000000012'
+        borrowers = dict(db.session.query(Book.title, Book.borrowed_by).filter(Book.title.like('Loaned Book %')))
+        assert borrowers == {'Loaned Book 1': existing.id, 'Loaned Book 2': created.id,
+                             'Loaned Book 3': created.id}
+
+def test_sync_ndjson_reports_rows_applied_before_a_bad_line(client, init_database):
+    """Test a malformed NDJSON line after a committed chunk still reports what was applied."""
+    lines = [json.dumps({
+        'id': str(uuid.UUID(int=number, version=4)),
+        'title': f'Streamed Book {number}',
+        'author': 'Stream Author',
+        'publisher': 'Stream Publisher',
+        'category': 'Stream',
+        'updated_at': '2024-04-17T10:00:00'
+    }) for number in range(1001)]
+    lines.append('{not json')
+    response = client.post('/books/sync', data='\n'.join(lines),
+                           content_type='application/x-ndjson')
+    assert response.status_code == 400
+    data = response.get_json()
+    assert data['message'] == 'Line 1002 is not valid JSON'
+    assert (data['received'], data['applied']) == (1000, 1000)
+
+    with client.application.app_context():
+        assert Book.query.filter(Book.title.like('Streamed Book %')).count() == 1000
+
+def test_unavailable_books_cache_invalidated_by_sync(client):
+    """Test cached responses carry an ETag and are refreshed after a sync."""
+    app = client.application
+    app.extensions['response_cache'].backend.clear()
+    app.config['RESPONSE_CACHE_ENABLED'] = True
+    try:
+        first = client.get('/books/unavailable')
+        etag = first.headers['ETag']
+        response = client.get('/books/unavailable', headers={'If-None-Match': etag})
+        assert response.status_code == 304
+
+        client.post('/books/sync', json=[{
+            'id': '00000000-0000-7000-8000-000000000002',
+            'title': 'Cached Book',
+            'author': 'Cache Author',
+            'publisher': 'Cache Publisher',
+            'category': 'Cache',
+            'available': False,
+            'updated_at': '2024-04-17T10:00:00'
+        }])
+
+        response = client.get('/books/unavailable', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert 'Cached Book' in [book['title'] for book in response.get_json()]
+    finally:
+        app.config['RESPONSE_CACHE_ENABLED'] = False
+
+def test_cache_keeps_ndjson_apart_from_json(client):
+    """Test an NDJSON request is never answered with a cached JSON array."""
+    app = client.application
+    app.extensions['response_cache'].backend.clear()
+    app.config['RESPONSE_CACHE_ENABLED'] = True
+    try:
+        first = client.get('/books/unavailable')
+        assert first.mimetype == 'application/json'
+        assert 'Accept' in first.headers['Vary']
+
+        response = client.get('/books/unavailable', headers={'Accept': 'application/x-ndjson'})
+        assert response.mimetype == 'application/x-ndjson'
+        assert 'Accept' in response.headers['Vary']
+    finally:
+        app.config['RESPONSE_CACHE_ENABLED'] = False
+
+def test_cached_book_is_a_single_object(client):
+    """Test a cached single-book read returns the book itself, not a list."""
+    app = client.application
+    with app.app_context():
+        book = Book(title='Single Book', author='One Author', publisher='One Publisher',
+                    category='Single', available=True)
+        db.session.add(book)
+        db.session.commit()
+        book_id = book.id
+    app.extensions['response_cache'].backend.clear()
+    app.config['RESPONSE_CACHE_ENABLED'] = True
+    try:
+        first = client.get(f'/books/{book_id}')
+        second = client.get(f'/books/{book_id}')
+        assert first.status_code == 200
+        assert second.get_json() == first.get_json()
+        assert second.get_json()['title'] == 'Single Book'
+    finally:
+        app.config['RESPONSE_CACHE_ENABLED'] = False
+
+def test_fast_serialization_matches_schema(client, init_database):
+    """Test the column-tuple path returns the same bytes as the schema path."""
+    app = client.application
+    with app.app_context():
+        book = Book.query.first()
+        book.available = False
+        db.session.commit()
+
+    try:
+        for url in ('/books', '/books/unavailable'):
+            app.config['FAST_SERIALIZATION'] = ''
+            expected = client.get(url)
+            assert expected.get_json()
+            app.config['FAST_SERIALIZATION'] = 'json'
+            assert client.get(url).data == expected.data
+    finally:
+        app.config['FAST_SERIALIZATION'] = ''
+
+def test_stream_unavailable_books(client, init_database, monkeypatch):
+    """Test the whole result can be streamed as a JSON array in small chunks."""
+    monkeypatch.setattr('streaming.STREAM_CHUNK_SIZE', 2)
+    with client.application.app_context():
+        db.session.add_all([
+            Book(title=f"Streamed Book {i}", author="Stream Author", publisher="Stream Press",
+                 category="Streams", available=False)
+            for i in range(5)
+        ])
+        db.session.commit()
+
+    response = client.get('/books/unavailable', query_string={'stream': 'json'})
+    assert response.status_code == 200
+    assert response.is_streamed
+    titles = [book['title'] for book in response.get_json()]
+    assert titles == [f"Streamed Book {i}" for i in range(5)]
+
+    response = client.get('/books/unavailable', query_string={'stream': 'xml'})
+    assert response.status_code == 400
+
+def _add_loans(due_offsets):
+    """Create one borrower per entry, each with books due ``offset`` days from today."""
+    today = date.today()
+    for i, offsets in enumerate(due_offsets):
+        user = User(email=f"late{i}@example.com", first_name="Late", last_name=str(i))
+        db.session.add(user)
+        db.session.flush()
+        for j, offset in enumerate(offsets):
+            db.session.add(Book(
+                title=f"Loan {i}-{j}",
+                author="Due Author",
+                publisher="Due Press",
+                category="Loans",
+                available=False,
+                borrowed_by=user.id,
+                borrowed_until=today + timedelta(days=offset)
+            ))
+    db.session.commit()
+
+def test_list_overdue_books(client, init_database):
+    """Test overdue loans are listed most overdue first, page by page."""
+    with client.application.app_context():
+        _add_loans([[-3, -1, 5], [-2, 0]])
+
+    response = client.get('/books/overdue', query_string={'limit': 2})
+    assert response.status_code == 200
+    assert [book['title'] for book in response.get_json()] == ["Loan 0-0", "Loan 1-0"]
+    link = response.headers['Link']
+
+    response = client.get(link[link.index('<') + 1:link.index('>')])
+    assert [book['title'] for book in response.get_json()] == ["Loan 0-1"]
+    assert 'Link' not in response.headers
+
+    response = client.get('/books/overdue', query_string={'due_within': 1})
+    assert len(response.get_json()) == 4
+    assert client.get('/books/overdue', query_string={'due_within': 'soon'}).status_code == 400
+
+def test_sweep_notifies_each_borrower_once(app, init_database):
+    """Test the sweep groups due loans per user across batches."""
+    notifications = []
+
+    def notify(user, overdue, due_soon):
+        notifications.append((user.email, len(overdue), len(due_soon)))
+
+    with app.app_context():
+        _add_loans([[-3, -1, 1, 10], [0], [30]])
+        summary = sweep(remind_days=2, notify=notify, batch_size=2)
+
+    assert summary == {'loans': 4, 'users': 2}
+    assert sorted(notifications) == [("late0@example.com", 2, 1), ("late1@example.com", 0, 1)]
+
+def test_metrics_endpoint(client):
+    """Test per-resource request counts are exposed in the Prometheus format."""
+    client.get('/books/unavailable')
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    text = response.get_data(as_text=True)
+    assert 'http_requests_total{method="GET",endpoint="unavailablebooksresource",status="200"}' in text
+    assert '# TYPE db_query_duration_seconds histogram' in text
+
+class FakeFrontend:
+    """The Frontend API digest endpoints, answered from a list of sync records."""
+
+    def __init__(self, records):
+        self.records = records
+        self.requests = 0
+
+    def in_range(self, prefix):
+        return [r for r in self.records if hex_digits(r['id']).startswith(prefix)]
+
+    def children(self, prefix, width):
+        self.requests += 1
+        rows = [(r['id'], r['title'], r['author'], r['publisher'], r['category'], r['available'],
+                 r['borrowed_until']) for r in self.in_range(prefix)]
+        return child_digests(rows, prefix, width)
+
+    def books(self, prefix):
+        self.requests += 1
+        return self.in_range(prefix)
+
+def _frontend_record(n, **changes):
+    record = {
+        'id': str(uuid.UUID(int=n * 0x0123456789abcdef0123456789abcdef % (1 << 128))),
+        'title': f'Book {n}',
+        'author': 'Reconcile Author',
+        'publisher': 'Reconcile Press',
+        'category': 'Reconcile',
+        'available': True,
+        'borrowed_by': None,
+        'borrowed_until': None,
+        'updated_at': '2024-04-17T10:00:00',
+    }
+    record.update(changes)
+    return record
+
+def test_reconcile_repairs_only_differing_ranges(client, init_database):
+    """Test reconciliation finds and repairs drift without fetching unchanged ranges."""
+    records = [_frontend_record(n) for n in range(1, 41)]
+    assert client.post('/books/sync', json=records[:-1]).get_json()['applied'] == 39
+    extra = _frontend_record(99)
+    client.post('/books/sync', json=[extra])
+
+    # The Backend missed a loan and a new book, and kept one the Frontend no longer has
+    records[5] = _frontend_record(6, available=False, borrowed_until='2024-05-01',
+                                  updated_at='2024-04-18T10:00:00')
+    frontend = FakeFrontend(records)
+
+    with client.application.app_context():
+        summary = reconcile(frontend, leaf_size=4)
+        assert (summary['missing'], summary['changed'], summary['extra'], summary['repaired']) == (1, 1, 1, 2)
+        # Only the three differing ranges were fetched row by row
+        assert summary['requests'] < 10
+        assert Book.query.filter_by(external_id=records[5]['id']).one().available == False
+
+        summary = reconcile(frontend, leaf_size=4)
+        assert (summary['missing'], summary['changed'], summary['extra']) == (0, 0, 1)
+        # Descending to the narrowest ranges finds the same drift
+        summary = reconcile(frontend, apply=False, leaf_size=0)
+    assert (summary['missing'], summary['changed'], summary['extra']) == (0, 0, 1)
+
+def test_reports_read_from_replica(tmp_path, monkeypatch):
+    """Test report endpoints read from a configured replica and fall back to the primary."""
+    monkeypatch.setenv('DATABASE_URI', f"sqlite:///{tmp_path / 'primary.db'}")
+    monkeypatch.setenv('DATABASE_REPLICA_URIS', f"sqlite:///{tmp_path / 'replica.db'}")
+    app = create_app()
+    app.config['RESPONSE_CACHE_ENABLED'] = False
+    pool = app.extensions['replicas']
+    with app.app_context():
+        db.create_all()
+        db.metadata.create_all(pool.engines[0])
+        with pool.engines[0].begin() as conn:
+            conn.execute(Book.__table__.insert(), {'title': 'Replica Loan', 'author': 'A', 'publisher': 'P',
+                                                   'category': 'C', 'available': False})
+        db.session.remove()
+
+    client = app.test_client()
+    assert [book['title'] for book in client.get('/books/unavailable').get_json()] == ['Replica Loan']
+
+    with pool.engines[0].begin() as conn:
+        conn.exec_driver_sql('DROP TABLE book')
+    response = client.get('/books/unavailable')
+    assert response.status_code == 200
+    assert response.get_json() == []
+    assert pool.healthy() == []
+    pool.engines[0].dispose()
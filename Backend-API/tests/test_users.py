@@ -1,5 +1,11 @@
 # Backend-API/tests/test_users.py
 
+import json
+import pytest
+from sqlalchemy import event
+from app import db
+from models import User, Book
+
 def test_list_users_empty(client):
     """Test listing users when none are enrolled."""
     response = client.get('/users')
@@ -38,3 +44,77 @@ def test_list_borrowed_books(client, init_database):
     assert len(data[0]['borrowed_books']) == 1
     assert data[0]['borrowed_books'][0]['title'] == "Advanced Python Programming"
 
+
+def test_list_users_pagination(client, init_database):
+    """Test paging through users with a limit and the next link."""
+    response = client.get('/users', query_string={'limit': 1})
+    assert response.status_code == 200
+    data = response.get_json()
+    assert len(data) == 1
+    assert data[0]['email'] == "admin1@example.com"
+    link = response.headers['Link']
+    next_url = link[link.index('<') + 1:link.index('>')]
+
+    response = client.get(next_url)
+    assert response.status_code == 200
+    data = response.get_json()
+    assert len(data) == 1
+    assert data[0]['email'] == "admin2@example.com"
+    assert 'Link' not in response.headers
+
+def _count_queries(app, client, url):
+    """Return the number of SQL statements issued while serving ``url``."""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        response = client.get(url)
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    assert response.status_code == 200
+    return len(statements)
+
+def _add_borrowers(prefix, count):
+    """Create ``count`` users who each borrowed two books."""
+    for i in range(count):
+        user = User(email=f"{prefix}{i}@example.com", first_name="Reader", last_name=str(i))
+        db.session.add(user)
+        db.session.flush()
+        for j in range(2):
+            db.session.add(Book(
+                title=f"Loaned Book {i}-{j}",
+                author="Loan Author",
+                publisher="Loan Press",
+                category="Loans",
+                available=False,
+                borrowed_by=user.id
+            ))
+    db.session.commit()
+
+@pytest.mark.parametrize("url", ['/users', '/users/borrowed'])
+def test_user_lists_constant_query_count(app, client, init_database, url):
+    """Test that listing users with their books does not issue one query per user."""
+    _add_borrowers('few', 2)
+    few = _count_queries(app, client, url)
+
+    _add_borrowers('many', 6)
+    many = _count_queries(app, client, url)
+
+    assert many == few
+
+def test_stream_users_ndjson(app, client, init_database, monkeypatch):
+    """Test streaming every user with their books as NDJSON, a few rows per chunk."""
+    monkeypatch.setattr('streaming.STREAM_CHUNK_SIZE', 2)
+    _add_borrowers('streamed', 3)
+
+    response = client.get('/users/borrowed', headers={'Accept': 'application/x-ndjson'})
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.mimetype == 'application/x-ndjson'
+    users = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [user['email'] for user in users] == [f"streamed{i}@example.com" for i in range(3)]
+    assert all(len(user['borrowed_books']) == 2 for user in users)
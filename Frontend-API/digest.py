@@ -0,0 +1,104 @@
+# frontend_api/digest.py
+
+import hashlib
+from collections import defaultdict
+from itertools import product
+
+HEX_DIGITS = '0123456789abcdef'
+EMPTY_DIGEST = '0' * 32
+# Positions in the hex digits of a UUID after which its string form has a dash
+DASHES = (8, 12, 16, 20)
+MAX_PREFIX_LENGTH = 32
+
+
+def row_digest(book_id, title, author, publisher, category, available, borrowed_until):
+    """Hash the fields both services store identically for a book.
+
+    ``borrowed_by`` is left out: each service keys users differently, and
+    a loan already shows up in ``available`` and ``borrowed_until``.
+    """
+    if borrowed_until is not None and not isinstance(borrowed_until, str):
+        borrowed_until = borrowed_until.isoformat()
+    # Joined rather than JSON-encoded: this runs once per book on every pass
+    canonical = '\x1f'.join((book_id, title, author, publisher, category,
+                             '1' if available else '0', borrowed_until or ''))
+    return int.from_bytes(hashlib.blake2b(canonical.encode('utf-8'), digest_size=16).digest(), 'big')
+
+
+def hex_digits(book_id):
+    return book_id.replace('-', '').lower()
+
+
+def dashed(prefix):
+    """Spell a prefix of a UUID's hex digits the way it starts the UUID string."""
+    parts = []
+    start = 0
+    for end in DASHES:
+        if len(prefix) <= end:
+            break
+        parts.append(prefix[start:end])
+        start = end
+    parts.append(prefix[start:])
+    return '-'.join(parts)
+
+
+def next_prefix(prefix):
+    """The first prefix of the same length after ``prefix``, or None past the end."""
+    stripped = prefix.rstrip('f')
+    if not stripped:
+        return None
+    last = HEX_DIGITS.index(stripped[-1])
+    return stripped[:-1] + HEX_DIGITS[last + 1] + '0' * (len(prefix) - len(stripped))
+
+
+def lowest_id(prefix):
+    """The smallest UUID whose hex digits start with ``prefix``."""
+    return dashed(prefix.ljust(MAX_PREFIX_LENGTH, '0'))
+
+
+def in_range(query, column, prefix):
+    """Restrict ``query`` to ids starting with the hex digits ``prefix``, as an index range.
+
+    The bounds are whole UUIDs, so they compare the same way against a
+    native ``uuid`` column as against its string form.
+    """
+    if prefix:
+        query = query.filter(column >= lowest_id(prefix))
+        upper = next_prefix(prefix)
+        if upper is not None:
+            query = query.filter(column < lowest_id(upper))
+    return query
+
+
+def child_digests(rows, prefix, width=1):
+    """Digest and count the rows under each child range of ``prefix``.
+
+    Children are the prefixes ``width`` hex digits longer. A range's digest
+    is the XOR of its row digests, so it does not depend on row order and
+    equal ranges hash equally on both sides. Empty children are omitted, as
+    are ids that are not UUIDs, which no range can address.
+    """
+    digests = defaultdict(int)
+    counts = defaultdict(int)
+    start = len(prefix)
+    children = {''.join(digits) for digits in product(HEX_DIGITS, repeat=width)}
+    # Up to the first dash the string and its hex digits line up
+    undashed = start + width > DASHES[0]
+    for row in rows:
+        child = (hex_digits(row[0]) if undashed else row[0])[start:start + width]
+        if child not in children:
+            continue
+        digests[child] ^= row_digest(*row)
+        counts[child] += 1
+    return {
+        child: {'count': counts[child], 'digest': f'{digests[child]:032x}'}
+        for child in sorted(digests)
+    }
+
+
+def parse_prefix(value):
+    """Validate a range prefix from a query string; raise ValueError if it is malformed."""
+    prefix = (value or '').lower()
+    if len(prefix) > MAX_PREFIX_LENGTH or any(digit not in HEX_DIGITS for digit in prefix):
+        raise ValueError('prefix must be up to 32 hex digits')
+    return prefix
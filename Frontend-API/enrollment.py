@@ -0,0 +1,81 @@
+# frontend_api/enrollment.py
+
+from marshmallow import ValidationError
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import db
+from ids import uuid7
+from models import User
+from schemas import UserSchema
+from sync import chunks
+
+# Rows per INSERT statement, and users accepted per request
+ENROLL_CHUNK_SIZE = 1000
+MAX_ENROLLMENT_SIZE = 10000
+
+user_schema = UserSchema()
+
+
+def supports_insert_returning():
+    """Whether the database can return the inserted rows from an INSERT."""
+    dialect = db.engine.dialect
+    return getattr(dialect, 'insert_returning', getattr(dialect, 'full_returning', False))
+
+
+def insert_users(rows):
+    """Insert ``rows``, skipping any that hit a unique constraint.
+
+    Returns the ids of the rows that were inserted. Where the database
+    supports RETURNING this is a single round trip.
+    """
+    dialect = postgresql if db.engine.dialect.name == 'postgresql' else sqlite
+    users = User.__table__
+    stmt = dialect.insert(users).values(rows).on_conflict_do_nothing()
+    if supports_insert_returning():
+        return set(db.session.execute(stmt.returning(users.c.id)).scalars())
+
+    db.session.execute(stmt)
+    # Ids are generated here, so the ones present now are exactly ours
+    ids = [row['id'] for row in rows]
+    return set(db.session.execute(select(users.c.id).where(users.c.id.in_(ids))).scalars())
+
+
+def enroll_users(records):
+    """Validate and insert a batch of users.
+
+    Returns one result per record, in order, with a status of ``created``,
+    ``duplicate`` (the email is already enrolled, or appears earlier in the
+    batch) or ``invalid``.
+    """
+    try:
+        user_schema.load(records, many=True)
+        messages = {}
+    except ValidationError as err:
+        messages = err.messages
+
+    results = []
+    pending = []
+    seen = set()
+    for index, record in enumerate(records):
+        if index in messages:
+            results.append({'index': index, 'status': 'invalid', 'errors': messages[index]})
+            continue
+        email = User.normalize_email(record['email'])
+        result = {'index': index, 'email': email, 'status': 'duplicate'}
+        results.append(result)
+        if email not in seen:
+            seen.add(email)
+            pending.append((result, {
+                'id': uuid7(),
+                'email': email,
+                'first_name': record['first_name'],
+                'last_name': record['last_name'],
+            }))
+
+    for chunk in chunks(pending, ENROLL_CHUNK_SIZE):
+        created = insert_users([row for _, row in chunk])
+        for result, row in chunk:
+            if row['id'] in created:
+                result.update(status='created', id=row['id'])
+    return results
@@ -0,0 +1,105 @@
+# frontend_api/fastjson.py
+
+import json
+import os
+
+from flask import current_app
+from marshmallow import fields
+from sqlalchemy import inspect
+
+try:
+    import orjson
+except ImportError:  # optional; the standard library encoder is used instead
+    orjson = None
+
+# Values the database driver already returns in their JSON-ready form
+PASSTHROUGH_FIELDS = (fields.String, fields.Boolean, fields.Integer, fields.Raw)
+
+
+def init_app(app):
+    """Read the ``FAST_SERIALIZATION`` setting from the environment.
+
+    ``json`` dumps list endpoints from column tuples with the standard
+    library encoder, producing the same bytes as the schema path.
+    ``orjson`` also switches the encoder, which omits the optional
+    whitespace, and falls back to the standard library encoder with a
+    warning when orjson is not installed. Anything else keeps the
+    marshmallow path.
+    """
+    app.config.setdefault('FAST_SERIALIZATION', os.getenv('FAST_SERIALIZATION', '').lower())
+    if app.config['FAST_SERIALIZATION'] == 'orjson' and orjson is None:
+        app.logger.warning('FAST_SERIALIZATION=orjson but orjson is not installed; '
+                           'using the standard library encoder')
+
+
+def enabled():
+    return current_app.config.get('FAST_SERIALIZATION') in ('json', 'orjson')
+
+
+def _converter(field):
+    if isinstance(field, (fields.DateTime, fields.Date)) and field.format in (None, 'iso'):
+        return lambda value: value.isoformat() if value is not None else None
+    if isinstance(field, PASSTHROUGH_FIELDS):
+        return None
+    return lambda value: field._serialize(value, None, None)
+
+
+class RowSerializer:
+    """Dump query rows the way ``schema`` would, without building ORM objects.
+
+    Only the model columns the schema dumps are selected, and each row is
+    turned into a dict with the schema's keys in the schema's order. Fields
+    with no matching column are left out, as marshmallow does for missing
+    attributes.
+    """
+
+    def __init__(self, schema):
+        attrs = inspect(schema.opts.model).column_attrs
+        self.model = schema.opts.model
+        self.keys = []
+        self.columns = []
+        self.converters = []
+        for name, field in schema.dump_fields.items():
+            if isinstance(field, fields.Nested):
+                raise ValueError(f'{name} is nested; only flat schemas can be fast-dumped')
+            attribute = field.attribute or name
+            if attribute not in attrs:
+                continue
+            self.keys.append(field.data_key or name)
+            self.columns.append(getattr(self.model, attribute))
+            self.converters.append(_converter(field))
+
+    def select(self, query):
+        """Restrict ``query`` to the dumped columns; rows come back as tuples."""
+        return query.with_entities(*self.columns)
+
+    def dump(self, rows):
+        keys = self.keys
+        if not any(self.converters):
+            return [dict(zip(keys, row)) for row in rows]
+        converters = [converter or (lambda value: value) for converter in self.converters]
+        return [
+            dict(zip(keys, [convert(value) for convert, value in zip(converters, row)]))
+            for row in rows
+        ]
+
+    def response(self, rows, status=200, headers=None):
+        """Encode ``rows`` straight into a JSON response."""
+        return json_response(self.dump(rows), status, headers)
+
+
+def encode(data):
+    """Encode ``data`` like flask_restful's ``output_json``."""
+    if current_app.config.get('FAST_SERIALIZATION') == 'orjson' and orjson is not None:
+        return orjson.dumps(data) + b'\n'
+    settings = dict(current_app.config.get('RESTFUL_JSON', {}))
+    if current_app.debug:
+        settings.setdefault('indent', 4)
+        settings.setdefault('sort_keys', False)
+    return (json.dumps(data, **settings) + '\n').encode('utf-8')
+
+
+def json_response(data, status=200, headers=None):
+    return current_app.response_class(
+        encode(data), status=status, headers=headers, mimetype='application/json'
+    )
@@ -0,0 +1,154 @@
+# frontend_api/importer.py
+
+import csv
+import io
+import json
+from datetime import datetime
+
+from flask import request
+from marshmallow import ValidationError
+
+from app import db
+from ids import uuid7
+from models import Book
+from notify import MAX_NOTIFIED_BOOKS
+from schemas import BookSchema
+from sync import NDJSON_MIMETYPES, chunks
+
+IMPORT_CHUNK_SIZE = 5000
+# Only the first errors are listed in the summary; all of them are counted
+MAX_REPORTED_ERRORS = 1000
+CSV_MIMETYPES = ('text/csv', 'application/csv')
+COPY_COLUMNS = ('id', 'title', 'author', 'publisher', 'category', 'available', 'updated_at')
+
+book_schema = BookSchema()
+
+
+def read_csv():
+    """Yield ``(record, error)`` pairs from a CSV body with a header row."""
+    lines = io.TextIOWrapper(request.stream, encoding='utf-8-sig', newline='')
+    reader = csv.DictReader(lines)
+    if not reader.fieldnames:
+        raise ValueError('CSV body must start with a header row')
+    for record in reader:
+        if None in record:
+            yield None, f'Line {reader.line_num} has more values than the header'
+            continue
+        # Empty cells mean "not given", as an absent NDJSON key would
+        yield {key: value for key, value in record.items() if value != ''}, None
+
+
+def read_ndjson():
+    """Yield ``(record, error)`` pairs from an NDJSON body."""
+    for number, line in enumerate(request.stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line), None
+        except ValueError:
+            yield None, f'Line {number} is not valid JSON'
+
+
+def read_import():
+    """Pick the reader for the request's content type; raise ValueError for others."""
+    if request.mimetype in CSV_MIMETYPES:
+        return read_csv()
+    if request.mimetype in NDJSON_MIMETYPES:
+        return read_ndjson()
+    raise ValueError('Expected a text/csv or application/x-ndjson body')
+
+
+def validate_chunk(chunk):
+    """Validate one chunk with ``BookSchema``.
+
+    Returns the new ``books`` rows and a list of ``(offset, message)`` for
+    the records that were rejected.
+    """
+    errors = []
+    candidates = []
+    for offset, (record, error) in enumerate(chunk):
+        if error is not None:
+            errors.append((offset, error))
+        else:
+            candidates.append((offset, record))
+
+    try:
+        book_schema.load([record for _, record in candidates], many=True)
+        messages = {}
+    except ValidationError as err:
+        messages = err.messages
+    rows = []
+    now = datetime.utcnow()
+    for position, (offset, record) in enumerate(candidates):
+        if position in messages:
+            errors.append((offset, messages[position]))
+            continue
+        rows.append({
+            'id': uuid7(),
+            'title': record['title'],
+            'author': record['author'],
+            'publisher': record['publisher'],
+            'category': record['category'],
+            'available': True,
+            'updated_at': now,
+        })
+    return rows, errors
+
+
+def copy_books(rows):
+    """Load ``rows`` with ``COPY ... FROM STDIN`` on the session's connection."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([row[name] for name in COPY_COLUMNS])
+    buffer.seek(0)
+    cursor = db.session.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY books ({', '.join(COPY_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buffer
+        )
+    finally:
+        cursor.close()
+
+
+def insert_books(rows):
+    """Load ``rows`` in the current transaction, with COPY where the database has it."""
+    if db.engine.dialect.name == 'postgresql':
+        copy_books(rows)
+    else:
+        db.session.execute(Book.__table__.insert(), rows)
+
+
+def import_books():
+    """Validate and load the request body chunk by chunk.
+
+    Everything is loaded in the caller's transaction, so either every valid
+    record is imported or none is; invalid records are reported by position
+    and skipped. Returns the summary, the lowest and highest imported id
+    (or None), and the ``(id, title, author)`` of the imported books, or
+    None past ``MAX_NOTIFIED_BOOKS`` so that large imports are not held in
+    memory.
+    """
+    received = rejected = imported = 0
+    errors = []
+    id_range = None
+    books = []
+    for chunk in chunks(read_import(), IMPORT_CHUNK_SIZE):
+        rows, chunk_errors = validate_chunk(chunk)
+        if rows:
+            insert_books(rows)
+            imported += len(rows)
+            low, high = min(row['id'] for row in rows), max(row['id'] for row in rows)
+            id_range = (low, high) if id_range is None else (min(id_range[0], low), max(id_range[1], high))
+            if books is not None and imported <= MAX_NOTIFIED_BOOKS:
+                books.extend((row['id'], row['title'], row['author']) for row in rows)
+            else:
+                books = None
+        for offset, message in sorted(chunk_errors, key=lambda error: error[0]):
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append({'index': received + offset, 'message': message})
+        rejected += len(chunk_errors)
+        received += len(chunk)
+    summary = {'received': received, 'imported': imported, 'rejected': rejected, 'errors': errors}
+    return summary, id_range, books
@@ -0,0 +1,304 @@
+# frontend_api/metrics.py
+
+import threading
+import time
+from bisect import bisect_left
+
+from flask import Flask, Response, current_app, g, has_app_context, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app import db
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter, optionally split by labels."""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, *labelvalues):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for labelvalues, value in sorted(values.items()):
+            yield f'{self.name}{_labels(self.labelnames, labelvalues)} {_number(value)}'
+
+
+class Histogram:
+    """Cumulative histogram with fixed upper bounds, optionally split by labels."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        # One bucket is incremented per observation; the exposition sums them
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labelvalues)
+            if state is None:
+                state = self._values[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        with self._lock:
+            values = {key: (list(counts), total, count) for key, (counts, total, count) in self._values.items()}
+        for labelvalues, (counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                labels = _labels(self.labelnames, labelvalues, [('le', _number(bound))])
+                yield f'{self.name}_bucket{labels} {cumulative}'
+            labels = _labels(self.labelnames, labelvalues)
+            yield f'{self.name}_sum{labels} {_number(total)}'
+            yield f'{self.name}_count{labels} {count}'
+
+
+class Callback:
+    """Metric read from a function at scrape time, e.g. counters kept elsewhere."""
+
+    def __init__(self, name, documentation, kind, read):
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self.read = read
+
+    def samples(self):
+        value = self.read()
+        if value is not None:
+            yield f'{self.name} {_number(value)}'
+
+
+class Registry:
+    """The set of metrics exposed on ``/metrics``."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        """Add ``metric``, or return the one already registered under its name."""
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def expose(self):
+        """Render every metric in the Prometheus text format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def counter(name, documentation, labelnames=()):
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def histogram(name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+def callback(name, documentation, kind, read):
+    return REGISTRY.register(Callback(name, documentation, kind, read))
+
+
+REQUESTS = counter('http_requests_total', 'HTTP requests by resource and status.',
+                   ('method', 'endpoint', 'status'))
+REQUEST_LATENCY = histogram('http_request_duration_seconds', 'HTTP request latency by resource.',
+                            ('method', 'endpoint'))
+REQUEST_QUERIES = histogram('http_request_db_queries', 'SQL statements issued per HTTP request.',
+                            ('method', 'endpoint'), COUNT_BUCKETS)
+REQUEST_DB_TIME = histogram('http_request_db_duration_seconds', 'Time spent in SQL per HTTP request.',
+                            ('method', 'endpoint'))
+QUERIES = counter('db_queries_total', 'SQL statements executed.')
+QUERY_LATENCY = histogram('db_query_duration_seconds', 'SQL statement latency.')
+POOL_CHECKOUT = histogram('db_pool_checkout_duration_seconds',
+                          'Time to obtain a connection from the pool, including any wait.')
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_started'].pop()
+    QUERIES.inc()
+    QUERY_LATENCY.observe(elapsed)
+    if has_request_context() and 'metrics_started' in g:
+        g.metrics_queries += 1
+        g.metrics_db_time += elapsed
+
+
+def _handle_error(context):
+    # A failed statement never reaches after_cursor_execute
+    started = context.connection.info.get('query_started') if context.connection is not None else None
+    if started:
+        started.pop()
+
+
+def instrument_pool(engine):
+    """Time every pool checkout of ``engine``, including waits for a free connection.
+
+    The pool has no event before a checkout starts, so its ``connect`` is
+    wrapped. ``dispose()`` replaces the pool, and the new one is wrapped too.
+    """
+    pool = engine.pool
+    if getattr(pool, 'metrics_instrumented', False):
+        return
+    connect = pool.connect
+
+    def timed_connect():
+        started = time.perf_counter()
+        try:
+            return connect()
+        finally:
+            POOL_CHECKOUT.observe(time.perf_counter() - started)
+
+    pool.connect = timed_connect
+    pool.metrics_instrumented = True
+
+
+def _start_request():
+    g.metrics_started = time.perf_counter()
+    g.metrics_queries = 0
+    g.metrics_db_time = 0.0
+
+
+def _finish_request(response):
+    if 'metrics_started' not in g:
+        return response
+    endpoint = request.endpoint or 'none'
+    elapsed = time.perf_counter() - g.metrics_started
+    REQUESTS.inc(1, request.method, endpoint, str(response.status_code))
+    REQUEST_LATENCY.observe(elapsed, request.method, endpoint)
+    REQUEST_QUERIES.observe(g.metrics_queries, request.method, endpoint)
+    REQUEST_DB_TIME.observe(g.metrics_db_time, request.method, endpoint)
+    return response
+
+
+def _pool_in_use():
+    if not has_app_context():
+        return None
+    pools = [engine.pool for engine in db.engines.values()]
+    return sum(pool.checkedout() for pool in pools if hasattr(pool, 'checkedout'))
+
+
+def _cache_stat(key):
+    if not has_app_context():
+        return None
+    cache = current_app.extensions.get('response_cache')
+    return cache.stats()[key] if cache is not None else None
+
+
+def _log_records_dropped():
+    if not has_app_context():
+        return None
+    handler = current_app.extensions.get('json_logging')
+    return handler.dropped if handler is not None else None
+
+
+def _log_shipping_stat(key):
+    if not has_app_context():
+        return None
+    shipper = current_app.extensions.get('log_shipper')
+    return getattr(shipper, key) if shipper is not None else None
+
+
+callback('db_pool_connections_in_use', 'Connections currently checked out of the pool.',
+         'gauge', _pool_in_use)
+for _key in ('hits', 'misses', 'not_modified', 'invalidations', 'evictions'):
+    callback(f'response_cache_{_key}_total', f'Response cache {_key.replace("_", " ")}.',
+             'counter', lambda key=_key: _cache_stat(key))
+callback('log_records_dropped_total', 'Log records dropped because the log writer fell behind.',
+         'counter', _log_records_dropped)
+callback('log_shipping_sent_total', 'Log records acknowledged by Logstash.',
+         'counter', lambda: _log_shipping_stat('sent'))
+callback('log_shipping_spilled_total', 'Log records spilled to disk while Logstash was unreachable.',
+         'counter', lambda: _log_shipping_stat('spilled'))
+callback('log_shipping_dropped_total', 'Log records dropped because the shipping buffer or spill was full.',
+         'counter', lambda: _log_shipping_stat('dropped'))
+
+
+def metrics_view():
+    return Response(REGISTRY.expose(), content_type=CONTENT_TYPE)
+
+
+def init_app(app):
+    """Instrument ``app`` and its database engines and serve ``/metrics``."""
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+
+    with app.app_context():
+        for engine in db.engines.values():
+            instrument_pool(engine)
+            event.listen(engine, 'engine_disposed', instrument_pool)
+
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
+
+
+def serve(app, port):
+    """Serve ``/metrics`` on its own port from a daemon thread.
+
+    For processes without an API, and for each gunicorn worker when
+    ``METRICS_PORT_BASE`` is set (see gunicorn.conf.py).
+    """
+    from werkzeug.serving import make_server
+
+    metrics_app = Flask(__name__)
+    metrics_app.add_url_rule('/metrics', 'metrics', lambda: _expose_within(app))
+    server = make_server('0.0.0.0', port, metrics_app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    return server
+
+
+def _expose_within(app):
+    with app.app_context():
+        return metrics_view()
@@ -0,0 +1,66 @@
+"""full text search
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 01:02:13.448120
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+SQLITE_TRIGGERS = (
+    """CREATE TRIGGER books_fts_insert AFTER INSERT ON books BEGIN
+        INSERT INTO books_fts (rowid, title, author, publisher, category)
+        VALUES (new.rowid, new.title, new.author, new.publisher, new.category);
+    END""",
+    """CREATE TRIGGER books_fts_delete AFTER DELETE ON books BEGIN
+        INSERT INTO books_fts (books_fts, rowid, title, author, publisher, category)
+        VALUES ('delete', old.rowid, old.title, old.author, old.publisher, old.category);
+    END""",
+    """CREATE TRIGGER books_fts_update AFTER UPDATE OF title, author, publisher, category ON books BEGIN
+        INSERT INTO books_fts (books_fts, rowid, title, author, publisher, category)
+        VALUES ('delete', old.rowid, old.title, old.author, old.publisher, old.category);
+        INSERT INTO books_fts (rowid, title, author, publisher, category)
+        VALUES (new.rowid, new.title, new.author, new.publisher, new.category);
+    END""",
+)
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("""
+            ALTER TABLE books ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+                setweight(to_tsvector('simple', title), 'A') ||
+                setweight(to_tsvector('simple', author), 'B') ||
+                setweight(to_tsvector('simple', publisher), 'C') ||
+                setweight(to_tsvector('simple', category), 'D')
+            ) STORED
+        """)
+        op.execute("CREATE INDEX ix_books_search_vector ON books USING GIN (search_vector)")
+    elif op.get_bind().dialect.name == 'sqlite':
+        op.execute("""
+            CREATE VIRTUAL TABLE books_fts USING fts5(
+                title, author, publisher, category, content='books', content_rowid='rowid'
+            )
+        """)
+        for statement in SQLITE_TRIGGERS:
+            op.execute(statement)
+        op.execute("INSERT INTO books_fts (books_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("DROP INDEX ix_books_search_vector")
+        op.execute("ALTER TABLE books DROP COLUMN search_vector")
+    elif op.get_bind().dialect.name == 'sqlite':
+        for trigger in ('books_fts_insert', 'books_fts_delete', 'books_fts_update'):
+            op.execute(f"DROP TRIGGER {trigger}")
+        op.execute("DROP TABLE books_fts")
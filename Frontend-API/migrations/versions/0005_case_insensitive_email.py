@@ -0,0 +1,29 @@
+"""case insensitive email
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 02:10:41.208113
+
+Emails are stored lower-cased from now on. Existing rows are lower-cased
+here; the upgrade fails if two existing accounts differ only by case,
+which has to be resolved by hand first.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("UPDATE users SET email = lower(trim(email)) WHERE email <> lower(trim(email))")
+    op.create_index('ix_users_email_lower', 'users', [sa.text('lower(email)')], unique=True)
+
+
+def downgrade():
+    op.drop_index('ix_users_email_lower', table_name='users')
@@ -0,0 +1,49 @@
+"""uuid primary keys
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 14:02:37.514806
+
+On PostgreSQL user and book ids become native uuid columns: 16 bytes
+instead of 37, with smaller primary key and foreign key indexes. Existing
+ids are version 4 UUIDs stored as text and convert in place, keeping
+their values, so links held by the Backend API stay valid; the upgrade
+fails if any id is not a UUID, which has to be fixed by hand first. New
+ids are time-ordered (version 7), generated by the application.
+
+SQLite has no uuid type and keeps storing ids as text.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+# The constraint from 0001 was created without a name; PostgreSQL's default
+FOREIGN_KEY = 'books_borrowed_by_fkey'
+COLUMNS = (('users', 'id'), ('books', 'id'), ('books', 'borrowed_by'))
+
+
+def upgrade():
+    if op.get_context().dialect.name != 'postgresql':
+        return
+    op.drop_constraint(FOREIGN_KEY, 'books', type_='foreignkey')
+    for table, column in COLUMNS:
+        op.alter_column(table, column, type_=postgresql.UUID(as_uuid=False),
+                        postgresql_using=f'{column}::uuid')
+    op.create_foreign_key(FOREIGN_KEY, 'books', 'users', ['borrowed_by'], ['id'])
+
+
+def downgrade():
+    if op.get_context().dialect.name != 'postgresql':
+        return
+    op.drop_constraint(FOREIGN_KEY, 'books', type_='foreignkey')
+    for table, column in COLUMNS:
+        op.alter_column(table, column, type_=sa.String(), postgresql_using=f'{column}::text')
+    op.create_foreign_key(FOREIGN_KEY, 'books', 'users', ['borrowed_by'], ['id'])
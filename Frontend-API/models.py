@@ -1,45 +1,133 @@
 # models.py
 
 from app import db
-import uuid
+from ids import GUID, uuid7
+from sqlalchemy import DDL, event, func
 from datetime import datetime, timedelta
 
 class User(db.Model):
     __tablename__ = 'users'
     
-    id = db.Column(db.String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = db.Column(GUID, primary_key=True, default=uuid7)
     email = db.Column(db.String, unique=True, nullable=False)
     first_name = db.Column(db.String, nullable=False)
     last_name = db.Column(db.String, nullable=False)
     borrowed_books = db.relationship('Book', backref='borrower', lazy=True)
 
+    __table_args__ = (
+        # Emails are unique regardless of case
+        db.Index('ix_users_email_lower', func.lower(email), unique=True),
+    )
+
     def __repr__(self):
         return f'<User {self.email}>'
 
+    @staticmethod
+    def normalize_email(email):
+        """Canonical form of an email address as stored."""
+        return email.strip().lower()
+
 class Book(db.Model):
     __tablename__ = 'books'
     
-    id = db.Column(db.String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = db.Column(GUID, primary_key=True, default=uuid7)
     title = db.Column(db.String, nullable=False)
     author = db.Column(db.String, nullable=False)
     publisher = db.Column(db.String, nullable=False)
     category = db.Column(db.String, nullable=False)
     available = db.Column(db.Boolean, default=True, nullable=False)
-    borrowed_by = db.Column(db.String, db.ForeignKey('users.id'), nullable=True)
+    borrowed_by = db.Column(GUID, db.ForeignKey('users.id'), nullable=True)
     borrowed_until = db.Column(db.Date, nullable=True)
+    # Last change time; sync updates older than this are ignored
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        # Catalogue browsing: available books in id order, optionally by category
+        db.Index('ix_books_available_id', id, postgresql_where=available, sqlite_where=available),
+        db.Index('ix_books_available_category_id', category, id,
+                 postgresql_where=available, sqlite_where=available),
+        # Loans per user and due-date range scans over borrowed books only
+        db.Index('ix_books_borrowed_by', borrowed_by),
+        db.Index('ix_books_borrowed_until', borrowed_until, id,
+                 postgresql_where=borrowed_until.isnot(None), sqlite_where=borrowed_until.isnot(None)),
+    )
 
     def __repr__(self):
         return f'<Book {self.title} by {self.author}>'
 
+    @staticmethod
+    def borrow_values(user_id, days):
+        """Column values of a book borrowed by a user for a specified number of days."""
+        return {
+            'available': False,
+            'borrowed_by': user_id,
+            'borrowed_until': datetime.utcnow().date() + timedelta(days=days),
+        }
+
+    @staticmethod
+    def return_values():
+        """Column values of a book that is back on the shelf."""
+        return {'available': True, 'borrowed_by': None, 'borrowed_until': None}
+
     def borrow(self, user_id, days):
         """Mark the book as borrowed by a user for a specified number of days."""
-        self.available = False
-        self.borrowed_by = user_id
-        self.borrowed_until = datetime.utcnow().date() + timedelta(days=days)
+        for key, value in self.borrow_values(user_id, days).items():
+            setattr(self, key, value)
 
     def return_book(self):
         """Mark the book as available and clear the borrower details."""
-        self.available = True
-        self.borrowed_by = None
-        self.borrowed_until = None
+        for key, value in self.return_values().items():
+            setattr(self, key, value)
+
 
+# Full-text search support that SQLAlchemy cannot express as columns: a
+# generated, weighted tsvector with a GIN index on PostgreSQL, and an FTS5
+# index kept in step by triggers on SQLite. Migration 0004 creates the same.
+for statement in (
+    """ALTER TABLE books ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', title), 'A') ||
+        setweight(to_tsvector('simple', author), 'B') ||
+        setweight(to_tsvector('simple', publisher), 'C') ||
+        setweight(to_tsvector('simple', category), 'D')
+    ) STORED""",
+    "CREATE INDEX ix_books_search_vector ON books USING GIN (search_vector)",
+):
+    event.listen(Book.__table__, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
+
+for statement in (
+    """CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+        title, author, publisher, category, content='books', content_rowid='rowid'
+    )""",
+    """CREATE TRIGGER books_fts_insert AFTER INSERT ON books BEGIN
+        INSERT INTO books_fts (rowid, title, author, publisher, category)
+        VALUES (new.rowid, new.title, new.author, new.publisher, new.category);
+    END""",
+    """CREATE TRIGGER books_fts_delete AFTER DELETE ON books BEGIN
+        INSERT INTO books_fts (books_fts, rowid, title, author, publisher, category)
+        VALUES ('delete', old.rowid, old.title, old.author, old.publisher, old.category);
+    END""",
+    """CREATE TRIGGER books_fts_update AFTER UPDATE OF title, author, publisher, category ON books BEGIN
+        INSERT INTO books_fts (books_fts, rowid, title, author, publisher, category)
+        VALUES ('delete', old.rowid, old.title, old.author, old.publisher, old.category);
+        INSERT INTO books_fts (rowid, title, author, publisher, category)
+        VALUES (new.rowid, new.title, new.author, new.publisher, new.category);
+    END""",
+):
+    event.listen(Book.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+event.listen(Book.__table__, 'after_drop', DDL('DROP TABLE IF EXISTS books_fts').execute_if(dialect='sqlite'))
+
+class OutboxEvent(db.Model):
+    """Notification for the Backend API, written in the same transaction as the change it describes."""
+    __tablename__ = 'outbox_events'
+
+    id = db.Column(db.Integer, primary_key=True)  # Monotonic, defines delivery order
+    aggregate_id = db.Column(db.String, nullable=False, index=True)
+    event_type = db.Column(db.String, nullable=False)
+    payload = db.Column(db.JSON, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+    last_error = db.Column(db.String, nullable=True)
+
+    def __repr__(self):
+        return f'<OutboxEvent {self.id} {self.event_type} {self.aggregate_id}>'
@@ -0,0 +1,225 @@
+# frontend_api/notify.py
+
+import json
+import logging
+import os
+import select
+import socket
+import threading
+
+from sqlalchemy import event, text
+
+from app import db
+from cache import MemoryBackend
+from metrics import counter
+from replicas import RoutingSession
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'library_changes'
+# PostgreSQL rejects NOTIFY payloads of 8000 bytes or more; payloads are
+# ASCII, since json.dumps escapes anything else
+MAX_PAYLOAD_BYTES = 7900
+# Past this many books one write asks other workers to rebuild rather than
+# sending the books over in dozens of messages
+MAX_NOTIFIED_BOOKS = 1000
+PENDING = 'change_notifications'
+
+SENT = counter('change_notifications_sent_total', 'NOTIFY messages sent for committed writes.')
+RECEIVED = counter('change_notifications_received_total',
+                   'Change notifications from other workers, by how they were applied.', ('kind',))
+RECONNECTS = counter('change_listener_reconnects_total', 'Times the change listener had to reconnect.')
+
+
+def origin():
+    """Identify this worker, so it can skip the notifications it sent itself."""
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def publish(*tags, books=(), touched=(), removed=(), flush=False):
+    """Stage a change notification for the current transaction.
+
+    ``tags`` are response cache tags such as ``'books'``. ``books`` are
+    ``(id, title, author)`` of created or renamed books, ``touched`` the ids
+    of books whose other fields changed, and ``removed`` the ids of deleted
+    books; each also invalidates its ``book:<id>`` tag. ``flush`` asks other
+    workers to rebuild everything instead, for writes too large to list.
+    Nothing is sent unless the transaction commits, and then only on
+    PostgreSQL.
+    """
+    pending = db.session.info.setdefault(PENDING, {
+        'tags': set(), 'books': {}, 'touched': set(), 'removed': set(), 'flush': False,
+    })
+    pending['tags'].update(tags)
+    pending['flush'] = pending['flush'] or flush
+    pending['books'].update((book_id, (title, author)) for book_id, title, author in books)
+    pending['touched'].update(touched)
+    pending['removed'].update(removed)
+
+
+def encoded(message):
+    return json.dumps(message, separators=(',', ':'))
+
+
+def messages(tags, books, touched, removed, flush=False, sender=None):
+    """Pack one write's changes into as few NOTIFY payloads as fit."""
+    sender = sender or origin()
+    everything = [encoded({'o': sender, 't': sorted(tags), 'f': 1})]
+    if flush or len(books) + len(touched) + len(removed) > MAX_NOTIFIED_BOOKS:
+        return everything
+
+    entries = ([('b', [book_id, title, author]) for book_id, (title, author) in books.items()]
+               + [('i', book_id) for book_id in touched] + [('r', book_id) for book_id in removed])
+    payloads = []
+    message = {'o': sender, 't': sorted(tags)}
+    size = len(encoded(message))
+    for key, entry in entries:
+        # A comma and the entry, or a new ',"key":[entry]' list
+        cost = len(encoded(entry)) + (1 if key in message else len(key) + 6)
+        if size + cost > MAX_PAYLOAD_BYTES:
+            payloads.append(encoded(message))
+            message = {'o': sender}
+            size = len(encoded(message))
+            cost = len(encoded(entry)) + len(key) + 6
+            if size + cost > MAX_PAYLOAD_BYTES:
+                return everything
+        message.setdefault(key, []).append(entry)
+        size += cost
+    payloads.append(encoded(message))
+    return payloads
+
+
+@event.listens_for(RoutingSession, 'before_commit')
+def _send_pending(session):
+    pending = session.info.pop(PENDING, None)
+    if not pending or session.get_bind().dialect.name != 'postgresql':
+        return
+    for payload in messages(**pending):
+        session.execute(text('SELECT pg_notify(:channel, :payload)'), {'channel': CHANNEL, 'payload': payload})
+        SENT.inc()
+
+
+@event.listens_for(RoutingSession, 'after_soft_rollback')
+def _discard_pending(session, previous_transaction):
+    session.info.pop(PENDING, None)
+
+
+class ChangeListener:
+    """Apply other workers' change notifications to this worker's caches.
+
+    Runs a daemon thread with its own connection that LISTENs on the
+    channel. Each time it connects, first or after a lost connection, it
+    flushes everything, since notifications sent before LISTEN took effect
+    are gone.
+    """
+
+    def __init__(self, app, poll_interval=5.0, retry_interval=1.0):
+        self.app = app
+        self.poll_interval = poll_interval
+        self.retry_interval = retry_interval
+        self.pid = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def connect(self):
+        engine = db.engines[None]
+        args, kwargs = engine.dialect.create_connect_args(engine.url)
+        connection = engine.dialect.dbapi.connect(*args, **kwargs)
+        connection.autocommit = True
+        connection.cursor().execute(f'LISTEN {CHANNEL}')
+        return connection
+
+    def apply(self, payload):
+        """Apply one notification; return how it was applied."""
+        message = json.loads(payload)
+        if message.get('o') == origin():
+            kind = 'own'
+        elif message.get('f'):
+            self.flush()
+            kind = 'flush'
+        else:
+            removed = message.get('r', [])
+            changed = [book_id for book_id, _, _ in message.get('b', [])] + message.get('i', []) + removed
+            cache = self.app.extensions['response_cache']
+            if isinstance(cache.backend, MemoryBackend):
+                # Redis-backed tag generations are already shared by every worker
+                cache.invalidate(*message.get('t', []), *(f'book:{book_id}' for book_id in changed))
+            index = self.app.extensions['suggest_index']
+            if index.built:
+                index.update(message.get('b', []))
+                for book_id in removed:
+                    index.remove(book_id)
+            kind = 'targeted'
+        RECEIVED.inc(1, kind)
+        return kind
+
+    def flush(self):
+        """Drop this worker's cached responses and suggestion index; both rebuild on use."""
+        cache = self.app.extensions['response_cache']
+        if isinstance(cache.backend, MemoryBackend):
+            cache.backend.clear()
+        self.app.extensions['suggest_index'].built = False
+
+    def listen(self, connection):
+        while not self._stop.is_set():
+            if select.select([connection], [], [], self.poll_interval) == ([], [], []):
+                continue
+            connection.poll()
+            while connection.notifies:
+                notification = connection.notifies.pop(0)
+                try:
+                    self.apply(notification.payload)
+                except (ValueError, TypeError):
+                    logger.warning(f'Ignoring malformed change notification: {notification.payload[:200]}')
+
+    def run(self):
+        connected_before = False
+        while not self._stop.is_set():
+            connection = None
+            try:
+                with self.app.app_context():
+                    connection = self.connect()
+                if connected_before:
+                    RECONNECTS.inc()
+                self.flush()
+                connected_before = True
+                self.listen(connection)
+            except Exception:
+                logger.exception('Change listener lost its connection')
+                self._stop.wait(self.retry_interval)
+            finally:
+                if connection is not None:
+                    connection.close()
+
+    def ensure_started(self):
+        """Start the thread in this process, once; workers forked after a preload start their own."""
+        if self.pid == os.getpid():
+            return
+        with self._lock:
+            if self.pid != os.getpid():
+                self.pid = os.getpid()
+                self._stop = threading.Event()
+                self._thread = threading.Thread(target=self.run, name='change-listener', daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+def init_app(app):
+    """Listen for other workers' writes on PostgreSQL when ``CHANGE_NOTIFY_ENABLED`` is set (the default)."""
+    app.config.setdefault('CHANGE_NOTIFY_ENABLED', os.getenv('CHANGE_NOTIFY_ENABLED', 'true').lower() == 'true')
+    if not app.config['CHANGE_NOTIFY_ENABLED']:
+        return None
+    with app.app_context():
+        if db.engine.dialect.name != 'postgresql':
+            return None
+    listener = ChangeListener(app)
+    app.extensions['change_listener'] = listener
+    # gunicorn workers start it in post_fork; otherwise the first request
+    # does, so only processes that serve get a thread
+    app.before_request(listener.ensure_started)
+    return listener
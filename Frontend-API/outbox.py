@@ -0,0 +1,226 @@
+# frontend_api/outbox.py
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+import requests
+from requests.adapters import HTTPAdapter
+from sqlalchemy import and_, exists
+from sqlalchemy.orm import aliased
+
+from app import db
+from metrics import counter, histogram
+from models import Book, OutboxEvent, User
+from schemas import BookSchema
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BACKEND_API_URL = 'http://backend_api:8001/books/sync'
+# Aggregated events can carry many books; they are sent in requests of this size
+MAX_RECORDS_PER_REQUEST = 1000
+
+books_schema = BookSchema(many=True)
+
+DELIVERY_LATENCY = histogram('outbox_delivery_duration_seconds',
+                             'Time to post one batch to the Backend API.', ('outcome',))
+DELIVERY_LAG = histogram('outbox_event_lag_seconds',
+                         'Time from an event being queued to its delivery.',
+                         buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 3600))
+DELIVERED = counter('outbox_events_delivered_total', 'Outbox events delivered to the Backend API.')
+
+
+def enqueue(event_type, aggregate_id, payload):
+    """Stage an event for the Backend API in the current session.
+
+    The event is only persisted, and therefore only delivered, if the
+    caller's transaction commits.
+    """
+    event = OutboxEvent(event_type=event_type, aggregate_id=str(aggregate_id), payload=payload)
+    db.session.add(event)
+    return event
+
+
+def with_borrowers(records):
+    """Copies of book sync ``records`` with their borrower's email and name added.
+
+    The Backend API keys users differently; it finds or creates a borrower
+    from these details, as ``borrower`` next to ``borrowed_by``.
+    """
+    user_ids = sorted({record['borrowed_by'] for record in records if record.get('borrowed_by')})
+    borrowers = {}
+    for start in range(0, len(user_ids), MAX_RECORDS_PER_REQUEST):
+        users = (db.session.query(User.id, User.email, User.first_name, User.last_name)
+                 .filter(User.id.in_(user_ids[start:start + MAX_RECORDS_PER_REQUEST])))
+        borrowers.update((user.id, {'email': user.email, 'first_name': user.first_name,
+                                    'last_name': user.last_name}) for user in users)
+    return [dict(record, borrower=borrowers.get(record['borrowed_by'])) if record.get('borrowed_by') else record
+            for record in records]
+
+
+def range_page(payload):
+    """The next page of books in a range event's id range, as sync records."""
+    query = Book.query.filter(Book.id <= payload['last_id'])
+    if payload.get('after'):
+        query = query.filter(Book.id > payload['after'])
+    else:
+        query = query.filter(Book.id >= payload['first_id'])
+    return books_schema.dump(query.order_by(Book.id).limit(MAX_RECORDS_PER_REQUEST).all())
+
+
+def make_http_session(pool_size=10):
+    """Create a keep-alive HTTP session shared by all deliveries."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+class OutboxDispatcher:
+    """Deliver outbox events to the Backend API in batches.
+
+    Events are sent oldest first. An event is held back while an earlier
+    event for the same book is waiting for a retry, so the Backend always
+    sees the changes to one book in the order they were committed. Run a
+    single dispatcher per database.
+    """
+
+    def __init__(self, app, url=None, http=None, batch_size=100, poll_interval=1.0,
+                 timeout=5.0, base_backoff=1.0, max_backoff=300.0):
+        self.app = app
+        self.url = url or os.getenv('BACKEND_API_URL', DEFAULT_BACKEND_API_URL)
+        self.http = http or make_http_session()
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._stop = threading.Event()
+        self._thread = None
+
+    def pending_batch(self, now):
+        """Return the next events that are due and not blocked by an earlier retry."""
+        earlier = aliased(OutboxEvent)
+        blocked = exists().where(and_(
+            earlier.aggregate_id == OutboxEvent.aggregate_id,
+            earlier.id < OutboxEvent.id,
+            earlier.next_attempt_at > now,
+        ))
+        return (OutboxEvent.query
+                .filter(OutboxEvent.next_attempt_at <= now, ~blocked)
+                .order_by(OutboxEvent.id)
+                .limit(self.batch_size)
+                .all())
+
+    def backoff(self, attempts):
+        """Delay before the next attempt after ``attempts`` failures."""
+        return timedelta(seconds=min(self.max_backoff, self.base_backoff * 2 ** (attempts - 1)))
+
+    def post(self, records):
+        """Send ``records`` in requests of at most ``MAX_RECORDS_PER_REQUEST``."""
+        for start in range(0, len(records), MAX_RECORDS_PER_REQUEST):
+            response = self.http.post(
+                self.url, json=records[start:start + MAX_RECORDS_PER_REQUEST],
+                timeout=self.timeout
+            )
+            response.raise_for_status()
+
+    def deliver_range(self, event):
+        """Send the books in a range event's id range a page at a time.
+
+        Progress is committed after every page, so a retry resumes after the
+        last page the Backend accepted.
+        """
+        while True:
+            page = range_page(event.payload)
+            self.post(with_borrowers(page))
+            if len(page) < MAX_RECORDS_PER_REQUEST:
+                return
+            event.payload = {**event.payload, 'after': page[-1]['id']}
+            db.session.commit()
+
+    def dispatch_once(self):
+        """Send one batch of due events; return how many were delivered."""
+        with self.app.app_context():
+            now = datetime.utcnow()
+            events = self.pending_batch(now)
+            if not events:
+                return 0
+
+            # An aggregated event's payload is a list of books, or the id
+            # range of a bulk write, which is read back a page at a time
+            records = []
+            ranges = []
+            for event in events:
+                if isinstance(event.payload, list):
+                    records.extend(event.payload)
+                elif 'last_id' in event.payload:
+                    ranges.append(event)
+                else:
+                    records.append(event.payload)
+            records = with_borrowers(records)
+
+            started = time.perf_counter()
+            try:
+                # On failure the whole batch is retried, less the range pages
+                # already sent; the Backend ignores changes it has already applied
+                self.post(records)
+                for event in ranges:
+                    self.deliver_range(event)
+            except requests.exceptions.RequestException as e:
+                DELIVERY_LATENCY.observe(time.perf_counter() - started, 'failure')
+                logger.warning(f"Failed to deliver {len(events)} outbox events: {e}")
+                for event in events:
+                    event.attempts += 1
+                    event.next_attempt_at = now + self.backoff(event.attempts)
+                    event.last_error = str(e)[:500]
+                db.session.commit()
+                return 0
+
+            DELIVERY_LATENCY.observe(time.perf_counter() - started, 'success')
+            delivered_at = datetime.utcnow()
+            for event in events:
+                DELIVERY_LAG.observe((delivered_at - event.created_at).total_seconds())
+
+            OutboxEvent.query.filter(
+                OutboxEvent.id.in_([event.id for event in events])
+            ).delete(synchronize_session=False)
+            db.session.commit()
+            DELIVERED.inc(len(events))
+            return len(events)
+
+    def run(self):
+        """Dispatch until ``stop`` is called, sleeping only when the outbox is drained."""
+        while not self._stop.is_set():
+            try:
+                delivered = self.dispatch_once()
+            except Exception:
+                logger.exception("Outbox dispatcher iteration failed")
+                delivered = 0
+            if delivered < self.batch_size:
+                self._stop.wait(self.poll_interval)
+
+    def start(self):
+        """Run the dispatcher in a daemon thread."""
+        self._thread = threading.Thread(target=self.run, name='outbox-dispatcher', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+if __name__ == '__main__':
+    # Run as a dedicated process: python outbox.py
+    from app import create_app
+    from metrics import serve
+    app = create_app()
+    if os.getenv('OUTBOX_METRICS_PORT'):
+        # This process serves no API requests, so expose its metrics separately
+        serve(app, int(os.getenv('OUTBOX_METRICS_PORT')))
+    OutboxDispatcher(app).run()
@@ -0,0 +1,119 @@
+# frontend_api/pagination.py
+
+import base64
+import binascii
+import json
+from urllib.parse import urlencode
+
+from flask import request
+from sqlalchemy import text, tuple_
+
+from app import db
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(values):
+    """Encode the sort key of the last row of a page into an opaque token."""
+    raw = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """Decode a token produced by ``encode_cursor``; raise ValueError if it is malformed."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (binascii.Error, UnicodeError, ValueError):
+        raise ValueError('Invalid cursor')
+    if not isinstance(values, list):
+        raise ValueError('Invalid cursor')
+    return values
+
+
+def page_args():
+    """Read ``limit`` and ``cursor`` from the query string."""
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE)
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        raise ValueError('limit must be an integer')
+    if limit < 1:
+        raise ValueError('limit must be positive')
+    limit = min(limit, MAX_PAGE_SIZE)
+
+    cursor = request.args.get('cursor')
+    after = decode_cursor(cursor) if cursor else None
+    return limit, after
+
+
+def next_link(cursor):
+    """Build the URL of the next page, preserving the other query arguments."""
+    args = request.args.to_dict()
+    args['cursor'] = cursor
+    return f'{request.base_url}?{urlencode(args)}'
+
+
+def link_header(values):
+    """Build a ``Link`` header pointing at the page after the row keyed by ``values``."""
+    return f'<{next_link(encode_cursor(values))}>; rel="next"'
+
+
+def estimated_count(query):
+    """Return the planner's row estimate for ``query``, or None when unavailable.
+
+    Only PostgreSQL exposes estimates through ``EXPLAIN``; reading them is
+    constant-time, unlike ``COUNT(*)`` which scans every matching row.
+    """
+    if db.engine.dialect.name != 'postgresql':
+        return None
+    statement = query.statement.compile(
+        dialect=db.engine.dialect, compile_kwargs={'literal_binds': True}
+    )
+    plan = db.session.execute(text(f'EXPLAIN (FORMAT JSON) {statement}')).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def paginate(query, *key_columns):
+    """Return one keyset page of ``query`` ordered by ``key_columns``.
+
+    The result is a tuple ``(rows, headers)``. ``headers`` carries a
+    ``Link: <...>; rel="next"`` entry when more rows exist and, when the
+    client asked for ``total=estimate``, an ``X-Total-Count-Estimate``.
+    Raises ValueError for malformed ``limit`` or ``cursor`` arguments.
+    """
+    limit, after = page_args()
+    headers = {}
+
+    if request.args.get('total') == 'estimate':
+        estimate = estimated_count(query)
+        if estimate is not None:
+            headers['X-Total-Count-Estimate'] = str(estimate)
+
+    if after is not None:
+        if len(after) != len(key_columns):
+            raise ValueError('Invalid cursor')
+        if len(key_columns) == 1:
+            query = query.filter(key_columns[0] > after[0])
+        else:
+            query = query.filter(tuple_(*key_columns) > tuple_(*after))
+
+    rows = query.order_by(*key_columns).limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        values = [_json_value(getattr(last, column.key)) for column in key_columns]
+        headers['Link'] = link_header(values)
+    return rows, headers
+
+
+def _json_value(value):
+    """Make a sort key value JSON serialisable."""
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return str(value)
@@ -0,0 +1,105 @@
+# frontend_api/querylog.py
+
+import os
+import re
+import time
+import traceback
+from collections import Counter
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Bind placeholders of an expanded IN list, in any DB-API paramstyle
+PLACEHOLDER = r'(?:\?|%s|%\(\w+\)s|:\w+|\$\d+)'
+PLACEHOLDER_LIST = re.compile(rf'\(\s*{PLACEHOLDER}(?:\s*,\s*{PLACEHOLDER})*\s*\)')
+WHITESPACE = re.compile(r'\s+')
+ROUTES_DIR = os.sep + 'routes' + os.sep
+MAX_LOGGED_PARAMETERS = 500
+
+
+class NPlusOneError(AssertionError):
+    """The same statement ran more often in one request than allowed."""
+
+
+def statement_shape(statement):
+    """Reduce a statement to its shape: IN lists of any length look the same."""
+    return PLACEHOLDER_LIST.sub('(?)', WHITESPACE.sub(' ', statement).strip())
+
+
+def statement_origin():
+    """Describe the innermost frame in ``routes/`` that led to the current statement."""
+    for frame in reversed(traceback.extract_stack()):
+        if ROUTES_DIR in frame.filename:
+            return f"routes/{os.path.basename(frame.filename)}:{frame.lineno} in {frame.name}"
+    return f'{request.endpoint or "unknown"}.{request.method}'
+
+
+def _active():
+    return has_request_context() and 'querylog_shapes' in g
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _active():
+        conn.info.setdefault('querylog_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if not _active() or not conn.info.get('querylog_started'):
+        return
+    elapsed_ms = (time.perf_counter() - conn.info['querylog_started'].pop()) * 1000
+    g.querylog_shapes[statement_shape(statement)] += 1
+    if elapsed_ms >= current_app.config['SLOW_QUERY_THRESHOLD_MS']:
+        current_app.logger.warning(
+            f"Slow query ({elapsed_ms:.1f} ms) from {statement_origin()}: "
+            f"{WHITESPACE.sub(' ', statement)} {repr(parameters)[:MAX_LOGGED_PARAMETERS]}"
+        )
+
+
+def _handle_error(context):
+    started = context.connection.info.get('querylog_started') if context.connection is not None else None
+    if started:
+        started.pop()
+
+
+def _start_request():
+    if current_app.config['QUERY_LOG_ENABLED']:
+        g.querylog_shapes = Counter()
+
+
+def _check_request(response):
+    if 'querylog_shapes' not in g:
+        return response
+    limit = current_app.config['N_PLUS_ONE_THRESHOLD']
+    repeated = [(count, shape) for shape, count in g.querylog_shapes.items() if count > limit]
+    del g.querylog_shapes
+    for count, shape in repeated:
+        message = (f'Possible N+1 in {request.endpoint}.{request.method}: '
+                   f'statement ran {count} times (limit {limit}): {shape}')
+        if current_app.config['QUERY_LOG_RAISE']:
+            raise NPlusOneError(message)
+        current_app.logger.warning(message)
+    return response
+
+
+def init_app(app):
+    """Record the SQL each request issues when ``QUERY_LOG_ENABLED`` is set.
+
+    Statements slower than ``SLOW_QUERY_THRESHOLD_MS`` are logged with
+    their parameters and the route that issued them. A statement shape
+    repeated more than ``N_PLUS_ONE_THRESHOLD`` times in one request is
+    logged, or raises NPlusOneError when ``QUERY_LOG_RAISE`` is set, which
+    is the default under pytest.
+    """
+    app.config.setdefault('QUERY_LOG_ENABLED', os.getenv('QUERY_LOG_ENABLED', 'false').lower() == 'true')
+    app.config.setdefault('SLOW_QUERY_THRESHOLD_MS', float(os.getenv('SLOW_QUERY_THRESHOLD_MS', 200)))
+    app.config.setdefault('N_PLUS_ONE_THRESHOLD', int(os.getenv('N_PLUS_ONE_THRESHOLD', 10)))
+    app.config.setdefault('QUERY_LOG_RAISE', 'PYTEST_CURRENT_TEST' in os.environ)
+
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+
+    app.before_request(_start_request)
+    app.after_request(_check_request)
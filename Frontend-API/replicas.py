@@ -0,0 +1,174 @@
+# frontend_api/replicas.py
+
+import itertools
+import os
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+STICKY_COOKIE = 'primary_reads_until'
+# Seconds a PostgreSQL standby is behind, or 0 when it has replayed all it
+# received (an idle primary sends nothing, so the replay time alone would grow)
+LAG_QUERY = {
+    'postgresql': """
+        SELECT CASE
+            WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+        END
+    """,
+}
+WRITE_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+
+
+class RoutingSession(Session):
+    """Session that sends the reads of a ``replica_reads`` view to its replica.
+
+    Flushes and INSERT, UPDATE or DELETE statements always go to the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and not getattr(clause, 'is_dml', False):
+            replica = g.get('db_replica') if has_request_context() else None
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+class ReplicaPool:
+    """Replica engines used in turn, leaving out any that failed or fell behind.
+
+    An ejected replica gets traffic again after ``eject_seconds``. Each one
+    is probed at most every ``check_interval`` seconds when it is picked,
+    and ejected if the probe fails or it lags more than ``max_lag`` seconds.
+    """
+
+    def __init__(self, engines, eject_seconds=30, check_interval=10, max_lag=None):
+        self.engines = list(engines)
+        self.eject_seconds = eject_seconds
+        self.check_interval = check_interval
+        self.max_lag = max_lag
+        self.names = {engine: f'replica-{index}' for index, engine in enumerate(self.engines)}
+        self._ejected_until = {}
+        self._checked_at = {}
+        self._turn = itertools.count()
+        self._lock = threading.Lock()
+
+        from metrics import counter
+        self.routes = counter('db_read_routes_total', 'Requests to replica-eligible views, by database read.',
+                              ('target',))
+        self.ejections = counter('db_replica_ejections_total', 'Replicas taken out of rotation, by replica.',
+                                 ('replica',))
+
+    def healthy(self):
+        now = time.monotonic()
+        return [engine for engine in self.engines if self._ejected_until.get(engine, 0) <= now]
+
+    def choose(self):
+        """The next healthy replica, or None when every replica is out."""
+        candidates = self.healthy()
+        for _ in candidates:
+            engine = candidates[next(self._turn) % len(candidates)]
+            if self.check(engine):
+                return engine
+        return None
+
+    def check(self, engine):
+        with self._lock:
+            now = time.monotonic()
+            if now - self._checked_at.get(engine, float('-inf')) < self.check_interval:
+                return True
+            # Claimed before probing, so concurrent requests do not all probe
+            self._checked_at[engine] = now
+        try:
+            with engine.connect() as conn:
+                lag = conn.execute(text(LAG_QUERY.get(engine.dialect.name, 'SELECT 0'))).scalar() or 0
+        except OperationalError as err:
+            self.eject(engine, f'unreachable: {err.orig}')
+            return False
+        if self.max_lag is not None and lag > self.max_lag:
+            self.eject(engine, f'{lag:.1f}s behind')
+            return False
+        return True
+
+    def eject(self, engine, reason):
+        with self._lock:
+            self._ejected_until[engine] = time.monotonic() + self.eject_seconds
+            # Probe again as soon as it is back in rotation
+            self._checked_at.pop(engine, None)
+        self.ejections.inc(1, self.names[engine])
+        current_app.logger.warning(f'Ejected {self.names[engine]} for {self.eject_seconds}s: {reason}')
+
+
+def reads_primary():
+    """Whether this client wrote recently enough that replicas may not have its write yet."""
+    try:
+        return float(request.cookies.get(STICKY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def replica_reads(method):
+    """Serve a read-only Resource method from a replica when one is configured.
+
+    Clients that wrote within ``REPLICA_STICKY_SECONDS`` read from the
+    primary, so they see their own changes. If the replica fails the
+    method runs again on the primary and the replica is ejected.
+    """
+    @wraps(method)
+    def wrapper(resource, *args, **kwargs):
+        pool = current_app.extensions.get('replicas')
+        if pool is None:
+            return method(resource, *args, **kwargs)
+        g.db_replica = None if reads_primary() else pool.choose()
+        if g.db_replica is None:
+            pool.routes.inc(1, 'primary')
+            return method(resource, *args, **kwargs)
+        try:
+            result = method(resource, *args, **kwargs)
+        except OperationalError as err:
+            pool.eject(g.db_replica, f'query failed: {err.orig}')
+            current_app.extensions['sqlalchemy'].session.rollback()
+            g.db_replica = None
+            pool.routes.inc(1, 'primary')
+            return method(resource, *args, **kwargs)
+        pool.routes.inc(1, 'replica')
+        return result
+    return wrapper
+
+
+def _mark_writer(response):
+    if request.method in WRITE_METHODS and response.status_code < 400:
+        sticky = current_app.config['REPLICA_STICKY_SECONDS']
+        response.set_cookie(STICKY_COOKIE, f'{time.time() + sticky:.3f}', max_age=int(sticky) + 1,
+                            httponly=True, samesite='Lax')
+    return response
+
+
+def init_app(app):
+    """Create engines for ``DATABASE_REPLICA_URIS``, a comma-separated list.
+
+    Without replicas every query goes to ``SQLALCHEMY_DATABASE_URI`` as
+    before. Replica engines use the primary's ``SQLALCHEMY_ENGINE_OPTIONS``.
+    """
+    uris = os.getenv('DATABASE_REPLICA_URIS', '')
+    app.config.setdefault('SQLALCHEMY_REPLICA_URIS', [uri.strip() for uri in uris.split(',') if uri.strip()])
+    app.config.setdefault('REPLICA_STICKY_SECONDS', float(os.getenv('REPLICA_STICKY_SECONDS', 5)))
+    app.config.setdefault('REPLICA_EJECT_SECONDS', float(os.getenv('REPLICA_EJECT_SECONDS', 30)))
+    app.config.setdefault('REPLICA_CHECK_INTERVAL', float(os.getenv('REPLICA_CHECK_INTERVAL', 10)))
+    max_lag = os.getenv('REPLICA_MAX_LAG_SECONDS')
+    app.config.setdefault('REPLICA_MAX_LAG_SECONDS', float(max_lag) if max_lag else None)
+    if not app.config['SQLALCHEMY_REPLICA_URIS']:
+        return None
+
+    options = app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+    engines = [create_engine(uri, **options) for uri in app.config['SQLALCHEMY_REPLICA_URIS']]
+    pool = ReplicaPool(engines, app.config['REPLICA_EJECT_SECONDS'], app.config['REPLICA_CHECK_INTERVAL'],
+                       app.config['REPLICA_MAX_LAG_SECONDS'])
+    app.extensions['replicas'] = pool
+    app.after_request(_mark_writer)
+    return pool
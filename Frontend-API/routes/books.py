@@ -5,21 +5,51 @@ from flask_restful import Resource
 from models import Book, User
 from app import db
 from schemas import BookSchema
+from pagination import link_header, page_args, paginate
+from cache import cached, invalidate
+from replicas import replica_reads
+from singleflight import coalesced
+import fastjson
+from search import search_books
+from suggest import (DEFAULT_SUGGESTIONS, MAX_SUGGESTIONS, book_changed, book_removed, books_added, get_index,
+                     rebuild_index)
+from outbox import enqueue, with_borrowers
+from notify import publish
+from sync import apply_sync
+from importer import import_books
+from digest import MAX_PREFIX_LENGTH, child_digests, in_range, parse_prefix
 from marshmallow import ValidationError
-from datetime import datetime, timedelta
-import os
-import requests
+from sqlalchemy import exists, select, update
+import uuid
 
 book_schema = BookSchema()
 books_schema = BookSchema(many=True)
+book_rows = fastjson.RowSerializer(book_schema)
+
+# Columns hashed by digest.row_digest, in its argument order
+DIGEST_COLUMNS = (Book.id, Book.title, Book.author, Book.publisher, Book.category,
+                  Book.available, Book.borrowed_until)
+DIGEST_BATCH_SIZE = 10000
+# Books returned for one range; the Backend narrows the range until it fits
+MAX_DIGEST_ROWS = 10000
 
 class BookListResource(Resource):
     """Resource to handle book operations."""
 
+    @cached('books')
+    @coalesced('books')
+    @replica_reads
     def get(self):
-        """List all available books."""
-        books = Book.query.filter_by(available=True).all()
-        return books_schema.dump(books), 200
+        """List available books, one keyset page at a time."""
+        query = Book.query.filter_by(available=True)
+        try:
+            if fastjson.enabled():
+                rows, headers = paginate(book_rows.select(query), Book.id)
+                return book_rows.response(rows, 200, headers)
+            books, headers = paginate(query, Book.id)
+        except ValueError as err:
+            return {"message": str(err)}, 400
+        return books_schema.dump(books), 200, headers
 
     def post(self):
         """Add a new book to the catalogue."""
@@ -36,20 +66,68 @@ class BookListResource(Resource):
         # Create new book
         book = Book(**data)
         db.session.add(book)
+        db.session.flush()  # Assigns the id the notification refers to
+
+        # Queue the Backend API notification in the same transaction
+        enqueue('book.created', book.id, book_schema.dump(book))
+        publish('books', books=[(book.id, book.title, book.author)])
         db.session.commit()
+        book_changed(book.id, book.title, book.author)
+        invalidate('books')
+
+        return book_schema.dump(book), 201
+
+class BookSearchResource(Resource):
+    """Resource for full-text search over the catalogue."""
+
+    def get(self):
+        """Search titles, authors, publishers and categories, best match first."""
+        q = request.args.get('q', '').strip()
+        if not q:
+            return {"message": "Query parameter q is required"}, 400
+
+        available = request.args.get('available')
+        if available is not None:
+            if available.lower() not in ('true', 'false'):
+                return {"message": "available must be true or false"}, 400
+            available = available.lower() == 'true'
 
-        # Notify Backend API about the new book (if needed)
-        backend_api_url = os.getenv('BACKEND_API_URL', 'http://backend_api:8001/books/update')
         try:
-            requests.post(backend_api_url, json=book_schema.dump(book))
-        except requests.exceptions.RequestException as e:
-            app.logger.error(f"Failed to notify Backend API: {e}")
+            limit, after = page_args()
+        except ValueError as err:
+            return {"message": str(err)}, 400
+        if after is not None and len(after) != 2:
+            return {"message": "Invalid cursor"}, 400
 
-        return book_schema.dump(book), 201
+        books, last_key = search_books(
+            q, limit, after, available=available, category=request.args.get('category')
+        )
+        headers = {'Link': link_header(last_key)} if last_key is not None else {}
+        return books_schema.dump(books), 200, headers
+
+class BookSuggestResource(Resource):
+    """Resource for title and author autocomplete."""
+
+    def get(self):
+        """Suggest books whose title or author starts with the given prefix."""
+        prefix = request.args.get('prefix', '').strip()
+        if not prefix:
+            return {"message": "Query parameter prefix is required"}, 400
+        try:
+            limit = int(request.args.get('limit', DEFAULT_SUGGESTIONS))
+        except ValueError:
+            return {"message": "limit must be an integer"}, 400
+        if limit < 1:
+            return {"message": "limit must be positive"}, 400
+
+        return get_index().lookup(prefix, min(limit, MAX_SUGGESTIONS)), 200
 
 class BookResource(Resource):
     """Resource for a single book."""
 
+    @cached('book:{book_id}')
+    @coalesced('book:{book_id}')
+    @replica_reads
     def get(self, book_id):
         """Retrieve a single book by ID."""
         book = Book.query.get_or_404(book_id)
@@ -59,19 +137,43 @@ class BookResource(Resource):
         """Remove a book from the catalogue."""
         book = Book.query.get_or_404(book_id)
         db.session.delete(book)
+        publish('books', removed=[book_id])
         db.session.commit()
+        book_removed(book_id)
+        invalidate('books', f'book:{book_id}')
         return {"message": "Book deleted successfully"}, 204
 
+def supports_update_returning():
+    """Whether the database can return the updated row from an UPDATE."""
+    dialect = db.engine.dialect
+    return getattr(dialect, 'update_returning', getattr(dialect, 'full_returning', False))
+
+def update_book(book_id, values, *conditions):
+    """Apply ``values`` to a book in one conditional UPDATE.
+
+    Returns the updated row as a dict, or None when the book does not exist
+    or ``conditions`` did not hold. The condition is checked by the database,
+    so concurrent requests cannot both succeed.
+    """
+    books = Book.__table__
+    stmt = (update(books)
+            .where(books.c.id == book_id, *conditions)
+            .values(**values))
+    if supports_update_returning():
+        row = db.session.execute(stmt.returning(*books.c)).first()
+        return dict(row._mapping) if row is not None else None
+
+    if db.session.execute(stmt).rowcount != 1:
+        return None
+    row = db.session.execute(select(books).where(books.c.id == book_id)).first()
+    return dict(row._mapping)
+
 class BookBorrowResource(Resource):
     """Resource for borrowing a book."""
 
     def post(self, book_id):
-        """Borrow a book."""
-        book = Book.query.get_or_404(book_id)
-        if not book.available:
-            return {"message": "Book not available for borrowing"}, 400
-
-        json_data = request.get_json()
+        """Borrow a book with a single conditional UPDATE."""
+        json_data = request.get_json(silent=True)
         if not json_data:
             return {"message": "No input data provided"}, 400
 
@@ -80,58 +182,147 @@ class BookBorrowResource(Resource):
 
         if not user_id:
             return {"message": "User ID is required"}, 400
+        if not isinstance(days, int) or isinstance(days, bool) or days < 1:
+            return {"message": "days must be a positive integer"}, 400
 
-        # Validate user exists
-        user = User.query.get(user_id)
-        if not user:
-            return {"message": "User not found"}, 404
+        # Only an available book and an existing user can be borrowed
+        books = Book.__table__
+        user_exists = exists().where(User.__table__.c.id == user_id)
+        book = update_book(book_id, Book.borrow_values(user_id, days),
+                           books.c.available.is_(True), user_exists)
+        if book is None:
+            db.session.rollback()
+            # Work out which condition failed; this only runs on the error path.
+            # The book's availability may have changed again since the UPDATE,
+            # so only a missing user is reported as such
+            Book.query.get_or_404(book_id)
+            if not db.session.query(user_exists).scalar():
+                return {"message": "User not found"}, 404
+            return {"message": "Book not available for borrowing"}, 400
 
-        # Update book status
-        book.available = False
-        book.borrowed_by = user.id
-        book.borrowed_until = datetime.utcnow().date() + timedelta(days=days)
+        # Queue the Backend API notification in the same transaction
+        enqueue('book.borrowed', book_id, book_schema.dump(book))
+        publish('books', touched=[book_id])
         db.session.commit()
+        invalidate('books', f'book:{book_id}')
 
-        # Notify Backend API about the borrowing event (if needed)
-        backend_api_url = os.getenv('BACKEND_API_URL', 'http://backend_api:8001/books/update')
+        return {"message": f"Book borrowed until {book['borrowed_until']}"}, 200
+
+class BookReturnResource(Resource):
+    """Resource for returning a borrowed book."""
+
+    def post(self, book_id):
+        """Return a book with a single conditional UPDATE.
+
+        When ``user_id`` is given, the book is only returned if that user
+        borrowed it.
+        """
+        json_data = request.get_json(silent=True) or {}
+        user_id = json_data.get('user_id')
+
+        books = Book.__table__
+        conditions = [books.c.available.is_(False)]
+        if user_id:
+            conditions.append(books.c.borrowed_by == user_id)
+        book = update_book(book_id, Book.return_values(), *conditions)
+        if book is None:
+            db.session.rollback()
+            if Book.query.get_or_404(book_id).available:
+                return {"message": "Book is not borrowed"}, 400
+            return {"message": "Book is borrowed by another user"}, 400
+
+        # Queue the Backend API notification in the same transaction
+        enqueue('book.returned', book_id, book_schema.dump(book))
+        publish('books', touched=[book_id])
+        db.session.commit()
+        invalidate('books', f'book:{book_id}')
+
+        return {"message": "Book returned"}, 200
+
+class BookImportResource(Resource):
+    """Resource for bulk-loading a catalogue."""
+
+    def post(self):
+        """Import a CSV or NDJSON stream of new books in one transaction.
+
+        Invalid rows are reported and skipped. The Backend API is notified
+        with a single outbox event naming the imported id range, which the
+        dispatcher sends page by page.
+        """
         try:
-            requests.post(backend_api_url, json=book_schema.dump(book))
-        except requests.exceptions.RequestException as e:
-            app.logger.error(f"Failed to notify Backend API: {e}")
+            summary, id_range, books = import_books()
+        except ValueError as err:
+            db.session.rollback()
+            return {"message": str(err)}, 400
 
-        return {"message": f"Book borrowed until {book.borrowed_until}"}, 200
+        if id_range:
+            enqueue('books.imported', uuid.uuid4(), {'first_id': id_range[0], 'last_id': id_range[1]})
+            # Past a thousand or so books other workers rebuild instead
+            publish('books', books=books or (), flush=books is None)
+        db.session.commit()
+
+        if id_range:
+            if books is None:
+                rebuild_index()
+            else:
+                books_added(books)
+            invalidate('books')
+        return summary, 200
 
-class BookUpdateResource(Resource):
-    """Resource to handle book updates from the Backend API."""
+class BookSyncResource(Resource):
+    """Resource to apply batches of book changes from the Backend API."""
 
     def post(self):
-        """Receive updates about books."""
-        json_data = request.get_json()
-        if not json_data:
-            return {"message": "No input data provided"}, 400
+        """Upsert a JSON array or NDJSON stream of books, skipping stale changes."""
+        summary = apply_sync()
+        if 'message' in summary:
+            # Chunks before the malformed part are committed; report them too
+            return summary, 400
+        return summary, 200
 
-        # Validate and deserialize input
+class BookDigestResource(Resource):
+    """Resource for comparing the catalogue with the Backend API range by range."""
+
+    def get(self):
+        """Digest and count the books in each child of an id prefix range."""
         try:
-            data = book_schema.load(json_data)
-        except ValidationError as err:
-            return {"message": err.messages}, 400
+            prefix = parse_prefix(request.args.get('prefix'))
+            width = int(request.args.get('width', 1))
+        except ValueError as err:
+            return {"message": str(err)}, 400
+        if width not in (1, 2) or len(prefix) + width > MAX_PREFIX_LENGTH:
+            return {"message": "width must be 1 or 2 and stay within the id"}, 400
 
-        # Update or add the book in the frontend database
-        book = Book.query.get(data['id'])
-        if book:
-            # Update existing book
-            book.title = data['title']
-            book.author = data['author']
-            book.publisher = data['publisher']
-            book.category = data['category']
-            book.available = data['available']
-            book.borrowed_by = data.get('borrowed_by')
-            book.borrowed_until = data.get('borrowed_until')
-        else:
-            # Add new book
-            new_book = Book(**data)
-            db.session.add(new_book)
+        rows = in_range(db.session.query(*DIGEST_COLUMNS), Book.id, prefix).yield_per(DIGEST_BATCH_SIZE)
+        return {'prefix': prefix, 'children': child_digests(rows, prefix, width)}, 200
 
-        db.session.commit()
-        return {"message": "Book updated successfully"}, 200
+class BookDigestRowsResource(Resource):
+    """Resource for the books of one id prefix range, to repair the Backend API copy."""
+
+    def get(self):
+        """List the books whose id starts with the prefix, in sync format."""
+        try:
+            prefix = parse_prefix(request.args.get('prefix'))
+        except ValueError as err:
+            return {"message": str(err)}, 400
+
+        books = Book.__table__
+        query = in_range(db.session.query(books), Book.id, prefix).order_by(Book.id)
+        rows = query.limit(MAX_DIGEST_ROWS + 1).all()
+        if len(rows) > MAX_DIGEST_ROWS:
+            return {"message": f"More than {MAX_DIGEST_ROWS} books in range; use a longer prefix"}, 400
+        return {'prefix': prefix, 'books': with_borrowers([digest_record(row) for row in rows])}, 200
 
+def digest_record(row):
+    """A book in the format the Backend API sync endpoint accepts."""
+    return {
+        'id': row.id,
+        'title': row.title,
+        'author': row.author,
+        'publisher': row.publisher,
+        'category': row.category,
+        'available': row.available,
+        'borrowed_by': row.borrowed_by,
+        'borrowed_until': row.borrowed_until.isoformat() if row.borrowed_until else None,
+        'updated_at': row.updated_at.isoformat(),
+    }
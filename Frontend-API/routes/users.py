@@ -1,12 +1,20 @@
+from flask import request
 from flask_restful import Resource
 from models import User
 from app import db
 from schemas import UserSchema
+from pagination import paginate
+import fastjson
+from enrollment import MAX_ENROLLMENT_SIZE, enroll_users
+from notify import publish
+from marshmallow import ValidationError
+from sqlalchemy.exc import IntegrityError
 from werkzeug.exceptions import Conflict, BadRequest
 import logging
 
 user_schema = UserSchema()
 users_schema = UserSchema(many=True)
+user_rows = fastjson.RowSerializer(user_schema)
 
 logger = logging.getLogger(__name__)
 
@@ -14,6 +22,7 @@ class UserListResource(Resource):
     """Resource to handle user operations."""
 
     def post(self):
+        """Enroll one user; the case-insensitive unique email index rejects duplicates."""
         json_data = request.get_json()
         if not json_data:
             logger.warning("No input data provided for user creation")
@@ -26,24 +35,53 @@ class UserListResource(Resource):
             logger.warning(f"Validation error during user creation: {err.messages}")
             raise BadRequest(description=err.messages)
         
-        # Check if user already exists
-        if User.query.filter_by(email=data['email']).first():
-            logger.warning(f"Attempt to create duplicate user with email: {data['email']}")
-            raise Conflict(description="User with this email already exists")
-        
         # Create new user
         new_user = User(
-            email=data['email'],
+            email=User.normalize_email(data['email']),
             first_name=data['first_name'],
             last_name=data['last_name']
         )
         db.session.add(new_user)
-        db.session.commit()
+        publish('users')
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            logger.warning(f"Attempt to create duplicate user with email: {new_user.email}")
+            raise Conflict(description="User with this email already exists")
         
         logger.info(f"Created new user: {new_user.email} (ID: {new_user.id})")
         return user_schema.dump(new_user), 201
 
     def get(self):
-        """List all enrolled users."""
-        users = User.query.all()
-        return users_schema.dump(users), 200
+        """List enrolled users, one keyset page at a time."""
+        try:
+            if fastjson.enabled():
+                rows, headers = paginate(user_rows.select(User.query), User.id)
+                return user_rows.response(rows, 200, headers)
+            users, headers = paginate(User.query, User.id)
+        except ValueError as err:
+            return {"message": str(err)}, 400
+        return users_schema.dump(users), 200, headers
+
+class UserBulkResource(Resource):
+    """Resource to enroll many users at once."""
+
+    def post(self):
+        """Enroll a JSON array of users, reporting a status for each one."""
+        json_data = request.get_json(silent=True)
+        if not isinstance(json_data, list) or not json_data:
+            return {"message": "Expected a non-empty JSON array of users"}, 400
+        if len(json_data) > MAX_ENROLLMENT_SIZE:
+            return {"message": f"At most {MAX_ENROLLMENT_SIZE} users per request"}, 400
+
+        results = enroll_users(json_data)
+        publish('users')
+        db.session.commit()
+
+        counts = {'created': 0, 'duplicate': 0, 'invalid': 0}
+        for result in results:
+            counts[result['status']] += 1
+        logger.info(f"Bulk enrollment: {counts['created']} created, {counts['duplicate']} duplicates, "
+                    f"{counts['invalid']} invalid")
+        return {**counts, 'results': results}, 200
@@ -0,0 +1,76 @@
+# frontend_api/search.py
+
+import re
+
+from sqlalchemy import REAL, and_, cast, column, func, literal_column, or_, select, table
+
+from app import db
+from models import Book
+
+# Column weights for SQLite's bm25(), mirroring the A-D weights of the tsvector
+FTS5_WEIGHTS = (10.0, 5.0, 2.0, 1.0)
+
+WORD = re.compile(r'\w+', re.UNICODE)
+
+
+def search_terms(q):
+    """Split a free-text query into words; the last one is matched as a prefix."""
+    return WORD.findall(q.lower())
+
+
+def _postgresql_matches(words):
+    books = Book.__table__
+    tsquery = func.to_tsquery('simple', ' & '.join(words[:-1] + [words[-1] + ':*']))
+    vector = literal_column('books.search_vector')
+    score = func.ts_rank_cd(vector, tsquery).label('score')
+    return select(books, score).where(vector.op('@@')(tsquery))
+
+
+def _sqlite_matches(words):
+    books = Book.__table__
+    fts = table('books_fts', column('rowid'))
+    match = ' '.join(f'"{word}"' for word in words[:-1]) + f' "{words[-1]}"*'
+    # bm25() is lower for better matches; negate it so both backends sort descending
+    score = (-func.bm25(literal_column('books_fts'), *FTS5_WEIGHTS)).label('score')
+    return (select(books, score)
+            .select_from(fts.join(books, literal_column('books.rowid') == fts.c.rowid))
+            .where(literal_column('books_fts').op('MATCH')(match.strip())))
+
+
+def search_books(q, limit, after=None, available=None, category=None):
+    """Return up to ``limit`` books matching ``q``, best match first.
+
+    ``after`` is the ``[score, id]`` of the last row of the previous page.
+    The result is a tuple ``(rows, last_key)``; ``last_key`` is the cursor
+    value for the next page, or None on the last page.
+    """
+    words = search_terms(q)
+    if not words:
+        return [], None
+
+    if db.engine.dialect.name == 'postgresql':
+        matches = _postgresql_matches(words)
+    else:
+        matches = _sqlite_matches(words)
+
+    books = Book.__table__
+    if available is not None:
+        matches = matches.where(books.c.available.is_(available))
+    if category:
+        matches = matches.where(books.c.category == category)
+
+    ranked = matches.subquery('ranked')
+    query = select(ranked).order_by(ranked.c.score.desc(), ranked.c.id).limit(limit + 1)
+    if after is not None:
+        # ts_rank_cd() returns real; compare in the same type so the cursor round-trips
+        last_score = cast(after[0], REAL) if db.engine.dialect.name == 'postgresql' else after[0]
+        query = query.where(or_(
+            ranked.c.score < last_score,
+            and_(ranked.c.score == last_score, ranked.c.id > after[1]),
+        ))
+
+    rows = [dict(row._mapping) for row in db.session.execute(query)]
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, [rows[-1]['score'], rows[-1]['id']]
@@ -0,0 +1,181 @@
+# frontend_api/suggest.py
+
+import re
+import threading
+import unicodedata
+from bisect import bisect_left
+
+from flask import current_app
+
+from app import db
+from models import Book
+
+DEFAULT_SUGGESTIONS = 10
+MAX_SUGGESTIONS = 50
+# Keys are truncated so memory per title is bounded regardless of title length
+MAX_KEY_LENGTH = 64
+# Above this many changed books, one merge pass is cheaper than per-book inserts
+BULK_UPDATE_THRESHOLD = 32
+
+NON_WORD = re.compile(r'[\W_]+', re.UNICODE)
+
+
+def normalize(text):
+    """Fold case and accents and collapse punctuation so 'Café-Society' matches 'cafe soc'."""
+    if not text.isascii():
+        decomposed = unicodedata.normalize('NFKD', text)
+        text = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return NON_WORD.sub(' ', text.casefold()).strip()[:MAX_KEY_LENGTH]
+
+
+class PrefixIndex:
+    """Sorted array of normalized titles and authors for prefix lookups.
+
+    Lookups are a binary search followed by a scan over the matching run,
+    so their cost depends on the number of results, not the catalogue size.
+    Keys and book ids are kept in two parallel lists to avoid a tuple per
+    entry; display strings are stored once per book.
+    """
+
+    def __init__(self):
+        self._keys = []
+        self._ids = []
+        self._books = {}
+        self._lock = threading.RLock()
+        self.built = False
+
+    def __len__(self):
+        return len(self._books)
+
+    def build(self, rows):
+        """Replace the index contents with ``rows`` of ``(id, title, author)``."""
+        books = {}
+        entries = []
+        for book_id, title, author in rows:
+            books[book_id] = (title, author)
+            entries.extend((key, book_id) for key in self._keys_for(title, author))
+        entries.sort()
+        with self._lock:
+            self._keys = [key for key, _ in entries]
+            self._ids = [book_id for _, book_id in entries]
+            self._books = books
+            self.built = True
+
+    def add(self, book_id, title, author):
+        """Index a new book, or re-index one whose title or author changed."""
+        with self._lock:
+            self._remove(book_id)
+            self._books[book_id] = (title, author)
+            for key in self._keys_for(title, author):
+                position = bisect_left(self._keys, key)
+                self._keys.insert(position, key)
+                self._ids.insert(position, book_id)
+
+    def update(self, rows):
+        """Re-index ``rows`` of ``(id, title, author)`` after a bulk write."""
+        rows = list(rows)
+        if len(rows) <= BULK_UPDATE_THRESHOLD:
+            for book_id, title, author in rows:
+                self.add(book_id, title, author)
+            return
+        changed = {book_id for book_id, _, _ in rows}
+        with self._lock:
+            entries = [entry for entry in zip(self._keys, self._ids) if entry[1] not in changed]
+            for book_id, title, author in rows:
+                self._books[book_id] = (title, author)
+                entries.extend((key, book_id) for key in self._keys_for(title, author))
+            entries.sort()
+            self._keys = [key for key, _ in entries]
+            self._ids = [book_id for _, book_id in entries]
+
+    def remove(self, book_id):
+        with self._lock:
+            self._remove(book_id)
+
+    def lookup(self, prefix, limit=DEFAULT_SUGGESTIONS):
+        """Return up to ``limit`` books whose title or author starts with ``prefix``."""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        results = []
+        seen = set()
+        with self._lock:
+            position = bisect_left(self._keys, prefix)
+            while position < len(self._keys) and len(results) < limit:
+                if not self._keys[position].startswith(prefix):
+                    break
+                book_id = self._ids[position]
+                if book_id not in seen:
+                    seen.add(book_id)
+                    title, author = self._books[book_id]
+                    results.append({'id': book_id, 'title': title, 'author': author})
+                position += 1
+        return results
+
+    def _remove(self, book_id):
+        existing = self._books.pop(book_id, None)
+        if existing is None:
+            return
+        for key in self._keys_for(*existing):
+            position = bisect_left(self._keys, key)
+            while position < len(self._keys) and self._keys[position] == key:
+                if self._ids[position] == book_id:
+                    del self._keys[position]
+                    del self._ids[position]
+                    break
+                position += 1
+
+    @staticmethod
+    def _keys_for(title, author):
+        return {key for key in (normalize(title), normalize(author)) if key}
+
+
+def init_app(app):
+    """Attach an empty index to ``app``; it is filled on first use."""
+    app.extensions['suggest_index'] = PrefixIndex()
+    app.extensions['suggest_index_lock'] = threading.Lock()
+
+
+def get_index():
+    """Return the application's index, building it from the Book table if needed."""
+    index = current_app.extensions['suggest_index']
+    if not index.built:
+        with current_app.extensions['suggest_index_lock']:
+            if not index.built:
+                rows = db.session.query(Book.id, Book.title, Book.author).yield_per(10000)
+                index.build(rows)
+    return index
+
+
+def book_changed(book_id, title, author):
+    """Keep the index in step with a created or updated book."""
+    index = current_app.extensions['suggest_index']
+    if index.built:
+        index.add(book_id, title, author)
+
+
+def book_removed(book_id):
+    """Drop a deleted book from the index."""
+    index = current_app.extensions['suggest_index']
+    if index.built:
+        index.remove(book_id)
+
+
+def books_added(rows):
+    """Index books created by a bulk write; ``rows`` are ``(id, title, author)``."""
+    index = current_app.extensions['suggest_index']
+    if index.built:
+        index.update(rows)
+
+
+def rebuild_index():
+    """Have the index rebuilt on next use, after a write too large to apply book by book."""
+    current_app.extensions['suggest_index'].built = False
+
+
+def refresh_books(book_ids):
+    """Re-read ``book_ids`` from the database after a set-based write and re-index them."""
+    index = current_app.extensions['suggest_index']
+    if not index.built or not book_ids:
+        return
+    index.update(db.session.query(Book.id, Book.title, Book.author).filter(Book.id.in_(book_ids)))
@@ -0,0 +1,150 @@
+# frontend_api/sync.py
+
+import json
+from datetime import date, datetime, timezone
+from itertools import islice
+
+from flask import request
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import db
+from ids import normalize
+from models import Book
+from cache import invalidate
+from notify import publish
+from suggest import refresh_books
+
+CHUNK_SIZE = 1000
+REQUIRED_FIELDS = ('id', 'title', 'author', 'publisher', 'category')
+UPDATED_FIELDS = ('title', 'author', 'publisher', 'category', 'available',
+                  'borrowed_by', 'borrowed_until', 'updated_at')
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/ndjson')
+
+
+def read_records():
+    """Yield book changes from a JSON array body or an NDJSON stream.
+
+    NDJSON bodies are read line by line, so a large sync never has to fit
+    in memory at once. Raises ValueError for a body that is neither.
+    """
+    if request.mimetype in NDJSON_MIMETYPES:
+        for number, line in enumerate(request.stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                raise ValueError(f'Line {number} is not valid JSON')
+        return
+
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = [data]
+    if not isinstance(data, list):
+        raise ValueError('Expected a JSON array or an NDJSON stream of books')
+    yield from data
+
+
+def chunks(iterable, size=CHUNK_SIZE):
+    """Split ``iterable`` into lists of at most ``size`` items."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def parse_datetime(value):
+    """Parse an ISO timestamp into a naive UTC datetime."""
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def to_row(record):
+    """Convert one incoming change into a complete ``books`` row; raise ValueError if invalid."""
+    if not isinstance(record, dict):
+        raise ValueError('Expected an object')
+    missing = [field for field in REQUIRED_FIELDS if not record.get(field)]
+    if missing:
+        raise ValueError(f"Missing fields: {', '.join(missing)}")
+
+    borrowed_until = record.get('borrowed_until')
+    updated_at = record.get('updated_at')
+    try:
+        return {
+            'id': normalize(record['id']),
+            'title': str(record['title']),
+            'author': str(record['author']),
+            'publisher': str(record['publisher']),
+            'category': str(record['category']),
+            'available': bool(record.get('available', True)),
+            'borrowed_by': normalize(record['borrowed_by']) if record.get('borrowed_by') else None,
+            'borrowed_until': date.fromisoformat(borrowed_until) if borrowed_until else None,
+            'updated_at': parse_datetime(updated_at) if updated_at else datetime.utcnow(),
+        }
+    except (TypeError, ValueError) as err:
+        raise ValueError(f'Invalid value: {err}')
+
+
+def upsert_books(rows):
+    """Apply ``rows`` with a single INSERT ... ON CONFLICT DO UPDATE.
+
+    A row only overwrites an existing book when its ``updated_at`` is newer,
+    so replayed or out-of-order changes cannot roll a book back. Returns the
+    number of rows inserted or updated.
+    """
+    # A statement may touch each key once; keep the newest change per book
+    newest = {}
+    for row in rows:
+        current = newest.get(row['id'])
+        if current is None or row['updated_at'] >= current['updated_at']:
+            newest[row['id']] = row
+
+    dialect = postgresql if db.engine.dialect.name == 'postgresql' else sqlite
+    table = Book.__table__
+    stmt = dialect.insert(table).values(list(newest.values()))
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.id],
+        set_={name: stmt.excluded[name] for name in UPDATED_FIELDS},
+        where=table.c.updated_at < stmt.excluded.updated_at,
+    )
+    return db.session.execute(stmt).rowcount
+
+
+def apply_sync():
+    """Read, validate and upsert the request body chunk by chunk.
+
+    Returns a summary with the number of records received and applied, and
+    the position and reason of every rejected record. Each chunk is
+    committed on its own, so when the body turns out to be malformed
+    partway through, the chunks before it stay applied and the summary
+    also carries a ``message`` naming the problem.
+    """
+    received = applied = 0
+    errors = []
+    try:
+        for chunk in chunks(read_records()):
+            rows = []
+            for offset, record in enumerate(chunk):
+                try:
+                    rows.append(to_row(record))
+                except ValueError as err:
+                    errors.append({'index': received + offset, 'message': str(err)})
+            received += len(chunk)
+            if rows:
+                applied += upsert_books(rows)
+                publish('books', books=[(row['id'], row['title'], row['author']) for row in rows])
+                db.session.commit()
+                refresh_books([row['id'] for row in rows])
+                invalidate('books', *(f"book:{row['id']}" for row in rows))
+    except ValueError as err:
+        db.session.rollback()
+        return {'received': received, 'applied': applied, 'errors': errors, 'message': str(err)}
+    return {'received': received, 'applied': applied, 'errors': errors}
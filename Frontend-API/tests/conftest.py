@@ -11,6 +11,10 @@ def app():
     app.config['TESTING'] = True
     # Use an in-memory SQLite database for testing purposes
     app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    # Tests that exercise the response cache turn it on themselves
+    app.config['RESPONSE_CACHE_ENABLED'] = False
+    # Fail any request that repeats one statement more than N_PLUS_ONE_THRESHOLD times
+    app.config['QUERY_LOG_ENABLED'] = True
     
     with app.app_context():
         # Create tables for the database schema before yielding the app
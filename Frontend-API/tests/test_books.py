@@ -1,9 +1,15 @@
 # frontend_api/tests/test_books.py
 
+import json
+import threading
 import pytest
 from models import User, Book
 from app import db
+from suggest import PrefixIndex
+from cache import MemoryBackend, ResponseCache
+from models import OutboxEvent
 from datetime import datetime, timedelta
+from digest import child_digests
 
 @pytest.fixture
 def new_user():
@@ -437,3 +443,508 @@ def test_borrow_book_empty_json(client):
     data = response.get_json()
     assert 'message' in data
 
+
+def test_list_books_pagination(client):
+    """Test walking the book list page by page through the next links."""
+    with client.application.app_context():
+        books = [
+            Book(
+                title=f'Paged Book {i}',
+                author='Page Author',
+                publisher='Page Publisher',
+                category='Paging'
+            )
+            for i in range(5)
+        ]
+        db.session.add_all(books)
+        db.session.commit()
+        expected_ids = {book.id for book in books}
+
+    seen_ids = []
+    url = '/books?limit=2'
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200
+        data = response.get_json()
+        assert len(data) <= 2
+        seen_ids.extend(book['id'] for book in data)
+        link = response.headers.get('Link')
+        url = link[link.index('<') + 1:link.index('>')] if link else None
+
+    assert len(seen_ids) == len(set(seen_ids))
+    assert seen_ids == sorted(seen_ids)
+    assert expected_ids <= set(seen_ids)
+
+@pytest.mark.parametrize("query_string", [
+    {'cursor': 'not-a-cursor'},
+    {'limit': 'ten'},
+    {'limit': 0},
+])
+def test_list_books_invalid_page_args(client, query_string):
+    """Test that malformed pagination arguments are rejected."""
+    response = client.get('/books', query_string=query_string)
+    assert response.status_code == 400
+    data = response.get_json()
+    assert 'message' in data
+
+def _sync_id(n):
+    return f'00000000-0000-7000-8000-{n:012d}'
+
+def _sync_record(book_id, title, updated_at):
+    return {
+        'id': book_id,
+        'title': title,
+        'author': 'Sync Author',
+        'publisher': 'Sync Publisher',
+        'category': 'Sync',
+        'available': True,
+        'updated_at': updated_at
+    }
+
+def test_sync_books_upserts_array(client):
+    """Test that a JSON array of changes inserts new books and updates newer ones."""
+    response = client.post('/books/sync', json=[
+        _sync_record(_sync_id(1), 'First Title', '2024-01-01T00:00:00'),
+        _sync_record(_sync_id(2), 'Second Title', '2024-01-01T00:00:00'),
+    ])
+    assert response.status_code == 200
+    assert response.get_json() == {'received': 2, 'applied': 2, 'errors': []}
+
+    response = client.post('/books/sync', json=[
+        _sync_record(_sync_id(1), 'First Title, Revised', '2024-01-02T00:00:00'),
+    ])
+    assert response.get_json()['applied'] == 1
+
+    with client.application.app_context():
+        assert db.session.get(Book, _sync_id(1)).title == 'First Title, Revised'
+
+def test_sync_books_ignores_stale_changes(client):
+    """Test that an older change never overwrites a newer book."""
+    client.post('/books/sync', json=[
+        _sync_record(_sync_id(3), 'Current Title', '2024-03-01T00:00:00'),
+    ])
+    response = client.post('/books/sync', json=[
+        _sync_record(_sync_id(3), 'Outdated Title', '2024-02-01T00:00:00'),
+    ])
+    assert response.status_code == 200
+    assert response.get_json()['applied'] == 0
+
+    with client.application.app_context():
+        assert db.session.get(Book, _sync_id(3)).title == 'Current Title'
+
+def test_sync_books_ndjson_reports_invalid_rows(client):
+    """Test that an NDJSON stream is applied and bad rows are reported, not fatal."""
+    lines = [
+        json.dumps(_sync_record(_sync_id(4), 'Streamed Title', '2024-01-01T00:00:00')),
+        json.dumps({'id': _sync_id(5), 'title': 'No Author'}),
+    ]
+    response = client.post(
+        '/books/sync',
+        data='\n'.join(lines) + '\n',
+        content_type='application/x-ndjson'
+    )
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['received'] == 2
+    assert data['applied'] == 1
+    assert data['errors'][0]['index'] == 1
+
+def test_sync_books_rejects_malformed_ids(client):
+    """Test that a change whose id is not a UUID is reported, not stored."""
+    response = client.post('/books/sync', json=[
+        _sync_record('sync-book-6', 'Unkeyed Title', '2024-01-01T00:00:00'),
+        _sync_record(_sync_id(6), 'Keyed Title', '2024-01-01T00:00:00'),
+    ])
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['applied'] == 1
+    assert data['errors'][0]['index'] == 0
+
+def test_sync_books_invalid_body(client):
+    """Test that a body that is neither a JSON array nor NDJSON is rejected."""
+    response = client.post('/books/sync', data='not json', content_type='text/plain')
+    assert response.status_code == 400
+    assert 'message' in response.get_json()
+
+def _add_user_and_book(app, email):
+    with app.app_context():
+        user = User(email=email, first_name='Loan', last_name='User')
+        book = Book(
+            title='Loanable Book',
+            author='Loan Author',
+            publisher='Loan Publisher',
+            category='Loans'
+        )
+        db.session.add_all([user, book])
+        db.session.commit()
+        return user.id, book.id
+
+def test_borrow_book_only_once(client):
+    """Test that the conditional update lets exactly one of two borrowers win."""
+    user_id, book_id = _add_user_and_book(client.application, 'first.borrower@example.com')
+
+    response = client.post(f'/books/{book_id}/borrow', json={'user_id': user_id, 'days': 7})
+    assert response.status_code == 200
+    assert 'borrowed until' in response.get_json()['message']
+
+    response = client.post(f'/books/{book_id}/borrow', json={'user_id': user_id, 'days': 7})
+    assert response.status_code == 400
+    assert response.get_json()['message'] == 'Book not available for borrowing'
+
+    with client.application.app_context():
+        book = db.session.get(Book, book_id)
+        assert book.available == False
+        assert book.borrowed_by == user_id
+
+def test_borrow_book_unknown_user_leaves_book_available(client):
+    """Test that a borrow by a missing user changes nothing."""
+    _, book_id = _add_user_and_book(client.application, 'unused.borrower@example.com')
+
+    response = client.post(f'/books/{book_id}/borrow', json={'user_id': 'no-such-user', 'days': 7})
+    assert response.status_code == 404
+    assert response.get_json()['message'] == 'User not found'
+
+    with client.application.app_context():
+        assert db.session.get(Book, book_id).available == True
+
+def test_borrow_book_lost_race_is_not_a_missing_user(client, monkeypatch):
+    """Test a borrower who lost a race to a since-returned loan is told the book was not available."""
+    user_id, book_id = _add_user_and_book(client.application, 'late.borrower@example.com')
+    # The UPDATE matched nothing because another borrow won, then the book came back
+    monkeypatch.setattr('routes.books.update_book', lambda *args: None)
+
+    response = client.post(f'/books/{book_id}/borrow', json={'user_id': user_id, 'days': 7})
+    assert response.status_code == 400
+    assert response.get_json()['message'] == 'Book not available for borrowing'
+
+def test_return_book(client):
+    """Test returning a borrowed book makes it available again."""
+    user_id, book_id = _add_user_and_book(client.application, 'returning.borrower@example.com')
+    client.post(f'/books/{book_id}/borrow', json={'user_id': user_id, 'days': 7})
+
+    response = client.post(f'/books/{book_id}/return', json={'user_id': 'someone-else'})
+    assert response.status_code == 400
+    assert response.get_json()['message'] == 'Book is borrowed by another user'
+
+    response = client.post(f'/books/{book_id}/return', json={'user_id': user_id})
+    assert response.status_code == 200
+
+    with client.application.app_context():
+        book = db.session.get(Book, book_id)
+        assert book.available == True
+        assert book.borrowed_by is None
+        assert book.borrowed_until is None
+
+    response = client.post(f'/books/{book_id}/return')
+    assert response.status_code == 400
+    assert response.get_json()['message'] == 'Book is not borrowed'
+
+def test_search_books_ranked(client):
+    """Test full-text search ranks title matches above weaker matches."""
+    with client.application.app_context():
+        db.session.add_all([
+            Book(title='Gardening for Beginners', author='Green Thumb',
+                 publisher='Orchard Press', category='Hobbies'),
+            Book(title='Advanced Composting', author='Gardening Guild',
+                 publisher='Orchard Press', category='Hobbies'),
+            Book(title='Quantum Field Theory', author='Physics Author',
+                 publisher='Science House', category='Physics'),
+        ])
+        db.session.commit()
+
+    response = client.get('/books/search', query_string={'q': 'gardening'})
+    assert response.status_code == 200
+    titles = [book['title'] for book in response.get_json()]
+    assert titles == ['Gardening for Beginners', 'Advanced Composting']
+
+    # The last word is matched as a prefix
+    response = client.get('/books/search', query_string={'q': 'quant'})
+    assert [book['title'] for book in response.get_json()] == ['Quantum Field Theory']
+
+def test_search_books_filters_and_pages(client):
+    """Test search filters on availability and category and pages through results."""
+    with client.application.app_context():
+        db.session.add_all([
+            Book(title=f'Searchable Volume {i}', author='Volume Author',
+                 publisher='Volume Press', category='Volumes' if i % 2 else 'Other',
+                 available=i != 1)
+            for i in range(6)
+        ])
+        db.session.commit()
+
+    response = client.get('/books/search', query_string={
+        'q': 'searchable volume', 'category': 'Volumes', 'available': 'true'
+    })
+    titles = sorted(book['title'] for book in response.get_json())
+    assert titles == ['Searchable Volume 3', 'Searchable Volume 5']
+
+    seen = []
+    url = '/books/search?q=searchable&limit=4'
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200
+        seen.extend(book['id'] for book in response.get_json())
+        link = response.headers.get('Link')
+        url = link[link.index('<') + 1:link.index('>')] if link else None
+    assert len(seen) == 6
+    assert len(set(seen)) == 6
+
+def test_search_books_requires_query(client):
+    """Test searching without a query is rejected."""
+    response = client.get('/books/search')
+    assert response.status_code == 400
+    assert 'message' in response.get_json()
+
+def test_suggest_books_by_prefix(client):
+    """Test autocomplete on normalized title and author prefixes."""
+    with client.application.app_context():
+        db.session.add(Book(title='Café Society', author='Zélie Durand',
+                            publisher='Suggest Press', category='Suggest'))
+        db.session.commit()
+
+    response = client.get('/books/suggest', query_string={'prefix': 'cafe so'})
+    assert response.status_code == 200
+    assert [book['title'] for book in response.get_json()] == ['Café Society']
+
+    response = client.get('/books/suggest', query_string={'prefix': 'ZELIE'})
+    assert [book['author'] for book in response.get_json()] == ['Zélie Durand']
+
+def test_suggest_books_follows_writes(client):
+    """Test the index is updated when books are added, synced and deleted."""
+    # Make sure the index is built before the writes
+    client.get('/books/suggest', query_string={'prefix': 'x'})
+
+    response = client.post('/books', json={
+        'title': 'Xylophone Basics',
+        'author': 'Mallet Player',
+        'publisher': 'Suggest Press',
+        'category': 'Music'
+    })
+    book_id = response.get_json()['id']
+    response = client.get('/books/suggest', query_string={'prefix': 'xylo'})
+    assert [book['id'] for book in response.get_json()] == [book_id]
+
+    client.post('/books/sync', json=[_sync_record(book_id, 'Xylophone Mastery', '2099-01-01T00:00:00')])
+    response = client.get('/books/suggest', query_string={'prefix': 'xylophone m'})
+    assert [book['title'] for book in response.get_json()] == ['Xylophone Mastery']
+
+    client.delete(f'/books/{book_id}')
+    response = client.get('/books/suggest', query_string={'prefix': 'xylo'})
+    assert response.get_json() == []
+
+def test_suggest_books_requires_prefix(client):
+    """Test autocomplete without a prefix is rejected."""
+    response = client.get('/books/suggest')
+    assert response.status_code == 400
+
+def test_prefix_index_bulk_update():
+    """Test that a bulk re-index replaces old keys instead of adding to them."""
+    index = PrefixIndex()
+    index.build([(f'book-{i}', f'Old Title {i}', 'Bulk Author') for i in range(100)])
+    index.update([(f'book-{i}', f'New Title {i}', 'Bulk Author') for i in range(50)])
+
+    assert len(index) == 100
+    assert len(index.lookup('old title', limit=100)) == 50
+    assert len(index.lookup('new title', limit=100)) == 50
+    assert len(index.lookup('bulk', limit=100)) == 100
+
+@pytest.fixture
+def response_cache(app):
+    """Enable the response cache for one test, starting from an empty cache."""
+    cache = app.extensions['response_cache']
+    cache.backend.clear()
+    app.config['RESPONSE_CACHE_ENABLED'] = True
+    yield cache
+    app.config['RESPONSE_CACHE_ENABLED'] = False
+
+def test_cached_book_etag_and_not_modified(client, response_cache):
+    """Test repeated reads are served from the cache and honour If-None-Match."""
+    _, book_id = _add_user_and_book(client.application, 'etag.reader@example.com')
+    hits, misses = response_cache.hits, response_cache.misses
+
+    first = client.get(f'/books/{book_id}')
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+
+    second = client.get(f'/books/{book_id}')
+    assert second.get_json()['id'] == book_id
+    assert second.get_json() == first.get_json()
+    assert second.headers['ETag'] == etag
+    assert (response_cache.hits - hits, response_cache.misses - misses) == (1, 1)
+
+    response = client.get(f'/books/{book_id}', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+
+def test_cache_invalidated_by_writes(client, response_cache):
+    """Test borrowing a book refreshes both the book and the book list."""
+    user_id, book_id = _add_user_and_book(client.application, 'cache.borrower@example.com')
+    listed = client.get('/books', query_string={'limit': 500})
+    assert book_id in [book['id'] for book in listed.get_json()]
+    etag = client.get(f'/books/{book_id}').headers['ETag']
+
+    client.post(f'/books/{book_id}/borrow', json={'user_id': user_id, 'days': 7})
+
+    response = client.get(f'/books/{book_id}', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()['available'] == False
+    listed = client.get('/books', query_string={'limit': 500})
+    assert book_id not in [book['id'] for book in listed.get_json()]
+
+def test_cache_does_not_store_errors(client, response_cache):
+    """Test a 404 is not cached, so a book created afterwards is found."""
+    response = client.get('/books/not-yet-created')
+    assert response.status_code == 404
+    assert 'ETag' not in response.headers
+
+def test_memory_backend_evicts_least_recently_used():
+    """Test the in-process backend stays within its size bound."""
+    backend = MemoryBackend(max_entries=2)
+    backend.set('a', 1, ttl=60)
+    backend.set('b', 2, ttl=60)
+    backend.get('a')
+    backend.set('c', 3, ttl=60)
+
+    assert backend.get('b') is None
+    assert (backend.get('a'), backend.get('c')) == (1, 3)
+    assert backend.evictions == 1
+
+    backend.set('d', 4, ttl=0)
+    assert backend.get('d') is None
+
+def test_cache_counters_are_thread_safe():
+    """Test counters bumped from many request threads add up exactly."""
+    cache = ResponseCache(MemoryBackend())
+
+    def bump():
+        for _ in range(2000):
+            cache.count('hits')
+
+    threads = [threading.Thread(target=bump) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert cache.stats()['hits'] == 16000
+
+@pytest.mark.parametrize("url", ['/books?limit=3', '/users?limit=3'])
+def test_fast_serialization_matches_schema(client, url):
+    """Test the column-tuple path returns the same bytes and links as the schema path."""
+    app = client.application
+    with app.app_context():
+        user = User(email=f"fast.path.{url.split('?')[0].strip('/')}@example.com", first_name='Fast', last_name='Path')
+        book = Book(
+            title='Fast Book',
+            author='Fast Author',
+            publisher='Fast Publisher',
+            category='Fast'
+        )
+        db.session.add_all([user, book])
+        db.session.flush()
+        db.session.add_all([
+            Book(title=f'Fast Book {i}', author='Fast Author', publisher='Fast Publisher',
+                 category='Fast', available=True, borrowed_until=datetime(2030, 1, i + 1).date())
+            for i in range(4)
+        ])
+        db.session.commit()
+
+    try:
+        expected = client.get(url)
+        app.config['FAST_SERIALIZATION'] = 'json'
+        response = client.get(url)
+        assert response.data == expected.data
+        assert response.headers.get('Link') == expected.headers.get('Link')
+
+        app.config['FAST_SERIALIZATION'] = 'orjson'
+        assert client.get(url).get_json() == expected.get_json()
+    finally:
+        app.config['FAST_SERIALIZATION'] = ''
+
+def test_orjson_setting_warns_when_not_installed(monkeypatch, caplog):
+    """Test asking for orjson without it installed is logged, not silently ignored."""
+    import fastjson
+    from flask import Flask
+    monkeypatch.setattr(fastjson, 'orjson', None)
+    monkeypatch.setenv('FAST_SERIALIZATION', 'orjson')
+    fastjson.init_app(Flask(__name__))
+    assert 'orjson is not installed' in caplog.text
+
+def test_import_books_csv(client):
+    """Test a CSV import loads the valid rows and reports the rest by position."""
+    body = (
+        "title,author,publisher,category\n"
+        "Imported One,Import Author,Import Press,Imports\n"
+        "Missing Author,,Import Press,Imports\n"
+        "Imported Two,Import Author,Import Press,Imports,extra\n"
+        "Imported Three,Import Author,Import Press,Imports\n"
+    )
+    with client.application.app_context():
+        OutboxEvent.query.delete()
+        db.session.commit()
+
+    response = client.post('/books/import', data=body, content_type='text/csv')
+    assert response.status_code == 200
+    summary = response.get_json()
+    assert (summary['received'], summary['imported'], summary['rejected']) == (4, 2, 2)
+    assert [error['index'] for error in summary['errors']] == [1, 2]
+    assert 'author' in summary['errors'][0]['message']
+
+    with client.application.app_context():
+        titles = {book.title for book in Book.query.filter_by(category='Imports')}
+        assert titles == {'Imported One', 'Imported Three'}
+        event = OutboxEvent.query.one()
+        assert event.event_type == 'books.imported'
+        in_range = Book.query.filter(Book.id.between(event.payload['first_id'], event.payload['last_id']))
+        assert {book.title for book in in_range} == {'Imported One', 'Imported Three'}
+
+def test_import_books_ndjson(client):
+    """Test an NDJSON import skips unparseable lines and invalid records."""
+    lines = [
+        json.dumps({'title': 'Streamed Import', 'author': 'Line Author',
+                    'publisher': 'Line Press', 'category': 'Lines'}),
+        '{not json',
+        json.dumps({'title': 'No Category', 'author': 'Line Author', 'publisher': 'Line Press'}),
+    ]
+    response = client.post('/books/import', data='\n'.join(lines),
+                           content_type='application/x-ndjson')
+    assert response.status_code == 200
+    summary = response.get_json()
+    assert summary['imported'] == 1
+    assert [error['index'] for error in summary['errors']] == [1, 2]
+    assert summary['errors'][0]['message'] == 'Line 2 is not valid JSON'
+
+    response = client.get('/books/search', query_string={'q': 'streamed import'})
+    assert [book['title'] for book in response.get_json()] == ['Streamed Import']
+
+def test_import_books_requires_csv_or_ndjson(client):
+    """Test other content types are rejected."""
+    response = client.post('/books/import', json=[{'title': 'Array'}])
+    assert response.status_code == 400
+
+def test_digest_ranges_match_their_books(client):
+    """Test each range digest can be rebuilt from the books listed for that range."""
+    client.post('/books/import', data='\n'.join(
+        json.dumps({'title': f'Digest {n}', 'author': 'Digest Author',
+                    'publisher': 'Digest Press', 'category': 'Digests'})
+        for n in range(20)
+    ), content_type='application/x-ndjson')
+
+    root = client.get('/books/digest', query_string={'width': 2}).get_json()
+    with client.application.app_context():
+        # Books synced in by earlier tests with made-up ids are not in any range
+        uuids = [book.id for book in Book.query if len(book.id) == 36]
+    assert sum(child['count'] for child in root['children'].values()) == len(uuids) >= 20
+
+    prefix, expected = next(iter(root['children'].items()))
+    books = client.get('/books/digest/rows', query_string={'prefix': prefix}).get_json()['books']
+    assert len(books) == expected['count']
+    rows = [(b['id'], b['title'], b['author'], b['publisher'], b['category'], b['available'],
+             b['borrowed_until']) for b in books]
+    assert child_digests(rows, '', 2)[prefix] == expected
+
+    # Narrower ranges partition the wider one
+    narrower = client.get('/books/digest', query_string={'prefix': prefix}).get_json()['children']
+    assert sum(child['count'] for child in narrower.values()) == expected['count']
+
+    assert client.get('/books/digest', query_string={'prefix': 'xyz'}).status_code == 400
+    assert client.get('/books/digest', query_string={'width': 3}).status_code == 400
@@ -0,0 +1,42 @@
+# frontend_api/tests/test_ids.py
+
+import time
+import uuid
+from app import db
+from ids import uuid7
+from models import Book
+
+def test_uuid7_is_version_7_and_time_ordered():
+    """Test new ids carry version 7, the current time, and sort in creation order."""
+    before = time.time_ns() // 1_000_000
+    ids = [uuid7() for _ in range(10000)]
+    after = time.time_ns() // 1_000_000
+
+    assert ids == sorted(ids)
+    assert len(set(ids)) == len(ids)
+    first = uuid.UUID(ids[0])
+    assert first.version == 7
+    assert first.variant == uuid.RFC_4122
+    assert before <= first.int >> 80 <= after
+
+def test_book_ids_default_to_uuid7(client):
+    """Test a new book gets a time-ordered id in canonical form."""
+    with client.application.app_context():
+        book = Book(title='Ordered', author='Clock', publisher='Epoch', category='Time')
+        db.session.add(book)
+        db.session.commit()
+        assert uuid.UUID(book.id).version == 7
+        assert book.id == str(uuid.UUID(book.id))
+
+def test_lookup_normalizes_id_case(client):
+    """Test an id in upper case finds the same book, and a malformed one finds none."""
+    with client.application.app_context():
+        book = Book(title='Cased', author='Upper', publisher='Lower', category='Case')
+        db.session.add(book)
+        db.session.commit()
+        book_id = book.id
+
+    response = client.get(f'/books/{book_id.upper()}')
+    assert response.status_code == 200
+    assert response.get_json()['id'] == book_id
+    assert client.get('/books/not-a-uuid').status_code == 404
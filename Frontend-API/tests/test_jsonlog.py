@@ -0,0 +1,95 @@
+# frontend_api/tests/test_jsonlog.py
+
+import json
+import logging
+import os
+import pytest
+from jsonlog import JsonFormatter, NonBlockingQueueHandler, json_handler, _listeners
+
+@pytest.fixture
+def log_file(app, tmp_path):
+    """Send the app's log to a temporary file; yields a function returning its records."""
+    filename = str(tmp_path / 'frontend_api.log')
+    handler = json_handler(filename, 'frontend_api', 100)
+    app.logger.addHandler(handler)
+
+    def records():
+        # Stopping the listener drains the queue into the file
+        _listeners.pop(filename)[1].stop()
+        with open(filename) as f:
+            return [json.loads(line) for line in f]
+
+    yield records
+    app.logger.removeHandler(handler)
+    if filename in _listeners:
+        _listeners.pop(filename)[1].stop()
+
+def test_access_log_is_json_with_request_fields(client, log_file):
+    """Test each request logs one JSON access line with its id, route, status and latency."""
+    response = client.get('/books/not-a-book', headers={'X-Request-ID': 'req-123'})
+    assert response.headers['X-Request-ID'] == 'req-123'
+
+    access = [record for record in log_file() if record.get('event') == 'access']
+    assert len(access) == 1
+    record = access[0]
+    assert record['service'] == 'frontend_api'
+    assert record['request_id'] == 'req-123'
+    assert record['method'] == 'GET'
+    assert record['route'] == '/books/<string:book_id>'
+    assert record['status'] == 404
+    assert record['duration_ms'] >= 0
+
+def test_request_id_is_generated_when_missing(client):
+    """Test a request without an id gets one, echoed in the response."""
+    first = client.get('/books').headers['X-Request-ID']
+    second = client.get('/books').headers['X-Request-ID']
+    assert first and second and first != second
+
+def test_full_queue_drops_instead_of_blocking():
+    """Test records are dropped and counted once the writer falls behind."""
+    handler = NonBlockingQueueHandler(maxsize=2)
+    logger = logging.getLogger('test_jsonlog.full')
+    logger.propagate = False
+    logger.addHandler(handler)
+    for i in range(5):
+        logger.warning('record %d', i)
+    assert handler.queue.qsize() == 2
+    assert handler.dropped == 3
+
+def test_formatter_keeps_exceptions_and_extra_fields():
+    """Test tracebacks and extra fields survive the trip through the queue."""
+    handler = NonBlockingQueueHandler(maxsize=10)
+    logger = logging.getLogger('test_jsonlog.exception')
+    logger.propagate = False
+    logger.addHandler(handler)
+    try:
+        raise ValueError('boom')
+    except ValueError:
+        logger.exception('Failed on %s', 'book-1', extra={'book_id': 'book-1'})
+
+    record = json.loads(JsonFormatter('frontend_api').format(handler.queue.get_nowait()))
+    assert record['level'] == 'ERROR'
+    assert record['message'] == 'Failed on book-1'
+    assert record['book_id'] == 'book-1'
+    assert 'ValueError: boom' in record['exception']
+
+def test_log_file_is_reopened_after_outside_rotation(tmp_path):
+    """Test records go to a fresh file once logrotate has moved the old one away."""
+    filename = str(tmp_path / 'rotated.log')
+    handler = json_handler(filename, 'frontend_api', 100)
+    logger = logging.getLogger('test_jsonlog.rotated')
+    logger.propagate = False
+    logger.addHandler(handler)
+    try:
+        logger.warning('before')
+        _listeners[filename][1].stop()
+        os.rename(filename, filename + '.1')
+        _listeners[filename][1].start()
+        logger.warning('after')
+    finally:
+        _listeners.pop(filename)[1].stop()
+
+    with open(filename + '.1') as f:
+        assert [json.loads(line)['message'] for line in f] == ['before']
+    with open(filename) as f:
+        assert [json.loads(line)['message'] for line in f] == ['after']
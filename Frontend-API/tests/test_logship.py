@@ -0,0 +1,175 @@
+# frontend_api/tests/test_logship.py
+
+import gzip
+import json
+import logging
+import os
+import socket
+import struct
+import subprocess
+import sys
+import threading
+import zlib
+import pytest
+from logship import LogShipper
+
+class Collector:
+    """A stand-in for Logstash's beats input that records and acknowledges each batch."""
+
+    def __init__(self, port=0):
+        self.server = socket.create_server(('127.0.0.1', port))
+        self.port = self.server.getsockname()[1]
+        self.events = []
+        self.batches = 0
+        threading.Thread(target=self.serve, daemon=True).start()
+
+    def read(self, conn, size):
+        data = b''
+        while len(data) < size:
+            chunk = conn.recv(size - len(data))
+            if not chunk:
+                raise EOFError
+            data += chunk
+        return data
+
+    def serve(self):
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                return
+            with conn:
+                try:
+                    while True:
+                        assert self.read(conn, 2) == b'2W'
+                        count = struct.unpack('>I', self.read(conn, 4))[0]
+                        assert self.read(conn, 2) == b'2C'
+                        frames = zlib.decompress(self.read(conn, struct.unpack('>I', self.read(conn, 4))[0]))
+                        while frames:
+                            assert frames[:2] == b'2J'
+                            seq, size = struct.unpack('>II', frames[2:10])
+                            self.events.append(json.loads(frames[10:10 + size]))
+                            frames = frames[10 + size:]
+                        assert seq == count
+                        self.batches += 1
+                        conn.sendall(b'2A' + struct.pack('>I', seq))
+                except EOFError:
+                    pass
+
+    def close(self):
+        self.server.close()
+
+@pytest.fixture
+def collector():
+    collector = Collector()
+    yield collector
+    collector.close()
+
+def unused_port():
+    with socket.create_server(('127.0.0.1', 0)) as server:
+        return server.getsockname()[1]
+
+def make_shipper(port, tmp_path, **kwargs):
+    shipper = LogShipper('127.0.0.1', port, 'frontend_api', 'frontend_log', flush_interval=0.01,
+                         spill_dir=str(tmp_path / 'spool'), retry_interval=0, **kwargs)
+    logger = logging.getLogger(f'test_logship.{id(shipper)}')
+    logger.propagate = False
+    logger.addHandler(shipper.handler)
+    return shipper, logger
+
+def test_batches_are_compressed_and_acknowledged(collector, tmp_path):
+    """Test buffered records are sent as one batch and counted once acknowledged."""
+    shipper, logger = make_shipper(collector.port, tmp_path, batch_size=10)
+    for i in range(25):
+        logger.warning('record %d', i, extra={'book_id': i})
+
+    while shipper.handler.queue.qsize():
+        shipper.ship(shipper.take_batch())
+    shipper.flush()
+
+    assert collector.batches == 3
+    assert shipper.sent == 25
+    assert [event['message'] for event in collector.events] == [f'record {i}' for i in range(25)]
+    assert collector.events[0]['type'] == 'frontend_log'
+    assert collector.events[0]['book_id'] == 0
+
+def test_spills_while_collector_is_down_and_replays_in_order(tmp_path):
+    """Test batches are spilled to disk while the collector is down and sent first once it is back."""
+    port = unused_port()
+    shipper, logger = make_shipper(port, tmp_path)
+    logger.warning('first')
+    shipper.ship(shipper.take_batch())
+    logger.warning('second')
+    shipper.ship(shipper.take_batch())
+    assert shipper.spilled == 2
+    assert len(shipper.spill_files()) == 2
+
+    collector = Collector(port)
+    try:
+        logger.warning('third')
+        shipper.ship(shipper.take_batch())
+        shipper.flush()
+    finally:
+        collector.close()
+
+    assert [event['message'] for event in collector.events] == ['first', 'second', 'third']
+    assert shipper.spill_files() == []
+    assert shipper.sent == 3
+
+def test_full_buffer_and_spill_drop_and_count(tmp_path):
+    """Test records are dropped and counted when the buffer or the spill directory is full."""
+    shipper, logger = make_shipper(unused_port(), tmp_path, buffer_size=3, spill_max_bytes=1)
+    for i in range(5):
+        logger.warning('record %d', i)
+    assert shipper.handler.dropped == 2
+
+    shipper.ship(shipper.take_batch())
+    assert shipper.spilled == 3
+    logger.warning('one more')
+    shipper.ship(shipper.take_batch())
+    assert shipper.dropped_spill == 1
+    assert shipper.dropped == 3
+
+def test_background_thread_ships_until_stopped(collector, tmp_path):
+    """Test the sender thread delivers what was logged before it is stopped."""
+    shipper, logger = make_shipper(collector.port, tmp_path)
+    shipper.start()
+    for i in range(100):
+        logger.warning('record %d', i)
+    shipper.stop(timeout=5)
+    assert shipper.sent == 100
+    assert len(collector.events) == 100
+
+def test_replay_puts_back_only_unacknowledged_lines(tmp_path, monkeypatch):
+    """Test a replay that fails part way through a file keeps just the lines not yet sent."""
+    shipper, _ = make_shipper(unused_port(), tmp_path, batch_size=2)
+    shipper.spill([b'{"n": %d}' % i for i in range(5)])
+    sent = []
+    def send(lines):
+        if sent:
+            raise ConnectionError('collector went away')
+        sent.append(lines)
+    monkeypatch.setattr(shipper, 'send', send)
+
+    with pytest.raises(ConnectionError):
+        shipper.replay_spilled()
+    assert sent == [[b'{"n": 0}', b'{"n": 1}']]
+    [path] = shipper.spill_files()
+    with gzip.open(path, 'rb') as f:
+        assert f.read().splitlines() == [b'{"n": 2}', b'{"n": 3}', b'{"n": 4}']
+
+def test_files_claimed_by_an_exited_process_are_reclaimed(collector, tmp_path):
+    """Test a spill file left claimed by a process that died mid-replay is counted and replayed."""
+    shipper, _ = make_shipper(collector.port, tmp_path)
+    shipper.spill([b'{"message": "orphaned"}'])
+    [path] = shipper.spill_files()
+    exited = subprocess.Popen([sys.executable, '-c', ''])
+    exited.wait()
+    os.rename(path, f'{path}.{exited.pid}')
+    assert shipper.spill_files() == []
+    assert shipper.spill_size() > 0
+
+    shipper.start()
+    shipper.stop(timeout=5)
+    assert [event['message'] for event in collector.events] == ['orphaned']
+    assert shipper.spill_size() == 0
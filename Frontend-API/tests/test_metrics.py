@@ -0,0 +1,43 @@
+# frontend_api/tests/test_metrics.py
+
+from metrics import Histogram, REGISTRY
+
+def _sample(text, prefix):
+    """Return the value of the first exposition line starting with ``prefix``."""
+    for line in text.splitlines():
+        if line.startswith(prefix):
+            return float(line.rsplit(' ', 1)[1])
+    return None
+
+def test_metrics_endpoint_reports_requests_and_queries(client):
+    """Test requests, SQL statements and pool checkouts show up on /metrics."""
+    before = _sample(REGISTRY.expose(), 'db_queries_total') or 0
+    client.get('/books')
+    client.get('/books', query_string={'limit': 'x'})
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain; version=0.0.4')
+    text = response.get_data(as_text=True)
+
+    assert _sample(text, 'http_requests_total{method="GET",endpoint="booklistresource",status="200"}') >= 1
+    assert _sample(text, 'http_requests_total{method="GET",endpoint="booklistresource",status="400"}') >= 1
+    assert _sample(text, 'http_request_duration_seconds_count{method="GET",endpoint="booklistresource"}') >= 2
+    assert _sample(text, 'http_request_db_queries_count{method="GET",endpoint="booklistresource"}') >= 2
+    assert _sample(text, 'db_queries_total') > before
+    assert _sample(text, 'db_pool_checkout_duration_seconds_count') >= 1
+    assert '# TYPE response_cache_hits_total counter' in text
+
+def test_histogram_buckets_are_cumulative():
+    """Test each bucket counts every observation at or below its bound."""
+    histogram = Histogram('test_latency_seconds', 'Test latency.', ('route',), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, 'a"b')
+
+    assert list(histogram.samples()) == [
+        'test_latency_seconds_bucket{route="a\\"b",le="0.1"} 2',
+        'test_latency_seconds_bucket{route="a\\"b",le="1.0"} 3',
+        'test_latency_seconds_bucket{route="a\\"b",le="+Inf"} 4',
+        'test_latency_seconds_sum{route="a\\"b"} 3.65',
+        'test_latency_seconds_count{route="a\\"b"} 4',
+    ]
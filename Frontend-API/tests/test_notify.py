@@ -0,0 +1,77 @@
+# frontend_api/tests/test_notify.py
+
+import json
+from app import db
+from models import Book
+from notify import MAX_PAYLOAD_BYTES, MAX_NOTIFIED_BOOKS, PENDING, ChangeListener, messages, origin, publish
+
+def test_messages_split_to_fit_notify_payloads():
+    """Test a large write is spread over payloads PostgreSQL accepts, losing nothing."""
+    books = {f'{n:08d}-0000-7000-8000-000000000000': ('Title ' * 10, 'Author') for n in range(300)}
+    payloads = messages({'books'}, books, {'touched-id'}, {'removed-id'}, sender='host:1')
+
+    assert len(payloads) > 1
+    assert all(len(payload) <= MAX_PAYLOAD_BYTES for payload in payloads)
+    decoded = [json.loads(payload) for payload in payloads]
+    assert decoded[0]['t'] == ['books']
+    assert sum(len(message.get('b', [])) for message in decoded) == 300
+    assert decoded[-1]['i'] == ['touched-id'] and decoded[-1]['r'] == ['removed-id']
+
+def test_messages_fall_back_to_a_flush():
+    """Test very large writes ask other workers to rebuild instead."""
+    books = {str(n): ('Title', 'Author') for n in range(MAX_NOTIFIED_BOOKS + 1)}
+    assert [json.loads(payload) for payload in messages({'books'}, books, set(), set(), sender='h:1')] == [
+        {'o': 'h:1', 't': ['books'], 'f': 1}
+    ]
+    # Writes that do not list their books, such as large imports, ask for it directly
+    assert [json.loads(payload) for payload in messages({'books'}, {}, set(), set(), flush=True, sender='h:1')] == [
+        {'o': 'h:1', 't': ['books'], 'f': 1}
+    ]
+
+def test_listener_applies_other_workers_changes(app):
+    """Test a notification invalidates cached responses and updates the suggestion index."""
+    listener = ChangeListener(app)
+    cache = app.extensions['response_cache']
+    index = app.extensions['suggest_index']
+    index.build([('b-1', 'Old Title', 'Some Author'), ('b-2', 'Gone Title', 'Some Author')])
+    key = cache.key_for('/books/b-1', ['book:b-1'])
+
+    payload = json.dumps({'o': 'elsewhere:1', 't': ['books'], 'b': [['b-1', 'New Title', 'Some Author']],
+                          'r': ['b-2']})
+    assert listener.apply(payload) == 'targeted'
+    assert cache.key_for('/books/b-1', ['book:b-1']) != key
+    assert [book['title'] for book in index.lookup('new')] == ['New Title']
+    assert index.lookup('gone') == []
+
+    assert listener.apply(json.dumps({'o': origin(), 'f': 1})) == 'own'
+    assert index.built
+    assert listener.apply(json.dumps({'o': 'elsewhere:1', 'f': 1})) == 'flush'
+    assert not index.built
+
+def test_publish_is_discarded_with_the_transaction(app):
+    """Test staged notifications go with a commit and are dropped by a rollback."""
+    with app.app_context():
+        db.session.query(Book).count()
+        publish('books', touched=['b-1'])
+        assert db.session.info[PENDING]['touched'] == {'b-1'}
+        db.session.rollback()
+        assert PENDING not in db.session.info
+
+        publish('users')
+        db.session.commit()
+        assert PENDING not in db.session.info
+
+def test_listener_flushes_on_first_connect(app, monkeypatch):
+    """Test changes sent before the listener first connected cannot leave stale entries."""
+    class Connection:
+        def close(self):
+            pass
+
+    listener = ChangeListener(app)
+    index = app.extensions['suggest_index']
+    index.build([('b-1', 'Some Title', 'Some Author')])
+    monkeypatch.setattr(listener, 'connect', Connection)
+    monkeypatch.setattr(listener, 'listen', lambda connection: listener._stop.set())
+
+    listener.run()
+    assert not index.built
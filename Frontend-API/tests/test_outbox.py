@@ -0,0 +1,167 @@
+# frontend_api/tests/test_outbox.py
+
+import pytest
+import requests
+from datetime import datetime, timedelta
+from models import Book, OutboxEvent, User
+from app import db
+from outbox import OutboxDispatcher, enqueue
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"{self.status_code} Error")
+
+class FakeHTTP:
+    """Stands in for the pooled session and records every delivered batch."""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.batches = []
+
+    def post(self, url, json=None, timeout=None):
+        if self.fail:
+            raise requests.exceptions.ConnectionError("Backend unreachable")
+        self.batches.append(json)
+        return FakeResponse(200)
+
+@pytest.fixture(autouse=True)
+def empty_outbox(app):
+    """Start every test with an empty outbox."""
+    with app.app_context():
+        OutboxEvent.query.delete()
+        db.session.commit()
+
+def test_add_book_queues_event(client):
+    """Test that adding a book writes an outbox event instead of calling the Backend."""
+    response = client.post('/books', json={
+        'title': 'Outbox Patterns',
+        'author': 'Queue Author',
+        'publisher': 'Queue Press',
+        'category': 'Architecture'
+    })
+    assert response.status_code == 201
+    book_id = response.get_json()['id']
+
+    with client.application.app_context():
+        events = OutboxEvent.query.all()
+        assert len(events) == 1
+        assert events[0].event_type == 'book.created'
+        assert events[0].aggregate_id == book_id
+        assert events[0].payload['title'] == 'Outbox Patterns'
+
+def test_dispatch_delivers_batch_in_order(app):
+    """Test that due events are sent as one ordered batch and then removed."""
+    with app.app_context():
+        for i in range(3):
+            enqueue('book.created', f'book-{i}', {'id': f'book-{i}'})
+        db.session.commit()
+
+    http = FakeHTTP()
+    dispatcher = OutboxDispatcher(app, url='http://backend.test/books/sync', http=http)
+    assert dispatcher.dispatch_once() == 3
+    assert http.batches == [[{'id': 'book-0'}, {'id': 'book-1'}, {'id': 'book-2'}]]
+
+    with app.app_context():
+        assert OutboxEvent.query.count() == 0
+
+def test_dispatch_failure_backs_off(app):
+    """Test that a failed delivery keeps the events and schedules a retry."""
+    with app.app_context():
+        enqueue('book.borrowed', 'book-1', {'id': 'book-1'})
+        db.session.commit()
+
+    dispatcher = OutboxDispatcher(app, url='http://backend.test/books/sync', http=FakeHTTP(fail=True))
+    assert dispatcher.dispatch_once() == 0
+
+    with app.app_context():
+        event = OutboxEvent.query.one()
+        assert event.attempts == 1
+        assert event.next_attempt_at > datetime.utcnow()
+        assert 'unreachable' in event.last_error
+
+def test_dispatch_holds_later_events_for_same_book(app):
+    """Test that an event waits while an earlier event for the same book is backing off."""
+    with app.app_context():
+        waiting = enqueue('book.created', 'book-1', {'id': 'book-1', 'step': 1})
+        waiting.next_attempt_at = datetime.utcnow() + timedelta(minutes=5)
+        enqueue('book.borrowed', 'book-1', {'id': 'book-1', 'step': 2})
+        enqueue('book.created', 'book-2', {'id': 'book-2', 'step': 1})
+        db.session.commit()
+
+    http = FakeHTTP()
+    dispatcher = OutboxDispatcher(app, url='http://backend.test/books/sync', http=http)
+    assert dispatcher.dispatch_once() == 1
+    assert http.batches == [[{'id': 'book-2', 'step': 1}]]
+
+def test_dispatch_splits_aggregated_events(app, monkeypatch):
+    """Test that an event carrying many books is sent in bounded requests."""
+    monkeypatch.setattr('outbox.MAX_RECORDS_PER_REQUEST', 2)
+    with app.app_context():
+        enqueue('book.created', 'book-0', {'id': 'book-0'})
+        enqueue('books.imported', 'import-1', [{'id': f'book-{i}'} for i in range(1, 4)])
+        db.session.commit()
+
+    http = FakeHTTP()
+    dispatcher = OutboxDispatcher(app, url='http://backend.test/books/sync', http=http)
+    assert dispatcher.dispatch_once() == 2
+    assert http.batches == [
+        [{'id': 'book-0'}, {'id': 'book-1'}],
+        [{'id': 'book-2'}, {'id': 'book-3'}],
+    ]
+
+def test_dispatch_sends_borrower_details(app):
+    """Test that a borrowed book goes out with its borrower's email and name."""
+    with app.app_context():
+        user = User(email='outbox.borrower@example.com', first_name='Out', last_name='Box')
+        db.session.add(user)
+        db.session.commit()
+        enqueue('book.borrowed', 'book-1', {'id': 'book-1', 'borrowed_by': user.id})
+        enqueue('book.returned', 'book-2', {'id': 'book-2', 'borrowed_by': None})
+        db.session.commit()
+        user_id = user.id
+
+    http = FakeHTTP()
+    dispatcher = OutboxDispatcher(app, url='http://backend.test/books/sync', http=http)
+    assert dispatcher.dispatch_once() == 2
+    assert http.batches == [[
+        {'id': 'book-1', 'borrowed_by': user_id,
+         'borrower': {'email': 'outbox.borrower@example.com', 'first_name': 'Out', 'last_name': 'Box'}},
+        {'id': 'book-2', 'borrowed_by': None},
+    ]]
+
+def test_dispatch_pages_through_range_events(app, monkeypatch):
+    """Test that an id range event is sent a page at a time and a retry resumes after the last sent page."""
+    monkeypatch.setattr('outbox.MAX_RECORDS_PER_REQUEST', 2)
+    with app.app_context():
+        books = [Book(id=f'00000000-0000-7000-8000-00000000010{i}', title=f'Ranged {i}', author='A',
+                      publisher='P', category='C') for i in range(5)]
+        db.session.add_all(books)
+        enqueue('books.imported', 'import-1', {'first_id': books[0].id, 'last_id': books[4].id})
+        db.session.commit()
+
+    http = FakeHTTP()
+    original = http.post
+    def post(url, json=None, timeout=None):
+        if len(http.batches) == 2:
+            raise requests.exceptions.ConnectionError("Backend unreachable")
+        return original(url, json=json, timeout=timeout)
+    http.post = post
+
+    dispatcher = OutboxDispatcher(app, url='http://backend.test/books/sync', http=http)
+    assert dispatcher.dispatch_once() == 0
+    with app.app_context():
+        event = OutboxEvent.query.one()
+        event.next_attempt_at = datetime.utcnow()
+        db.session.commit()
+
+    http.post = original
+    assert dispatcher.dispatch_once() == 1
+    assert [[record['title'] for record in batch] for batch in http.batches] == [
+        ['Ranged 0', 'Ranged 1'], ['Ranged 2', 'Ranged 3'], ['Ranged 4'],
+    ]
+    with app.app_context():
+        assert OutboxEvent.query.count() == 0
@@ -0,0 +1,65 @@
+# frontend_api/tests/test_querylog.py
+
+import logging
+import pytest
+from app import create_app, db
+from models import Book
+from querylog import NPlusOneError, statement_shape
+
+@pytest.fixture
+def loop_app():
+    """A fresh app with a deliberately N+1 route, since routes cannot be added once serving."""
+    app = create_app()
+    app.config['TESTING'] = True
+    app.config['QUERY_LOG_ENABLED'] = True
+    app.config['N_PLUS_ONE_THRESHOLD'] = 3
+
+    @app.route('/loop')
+    def loop():
+        ids = [book_id for (book_id,) in db.session.query(Book.id)]
+        titles = [db.session.get(Book, book_id).title for book_id in ids]
+        return {'titles': titles}
+
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([
+            Book(title=f'Loop Book {i}', author='Loop Author', publisher='Loop Press', category='Loops')
+            for i in range(5)
+        ])
+        db.session.commit()
+        db.session.remove()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+def test_repeated_statement_fails_under_pytest(loop_app):
+    """Test a statement repeated past the threshold raises in tests."""
+    with pytest.raises(NPlusOneError, match='ran 5 times'):
+        loop_app.test_client().get('/loop')
+
+def test_repeated_statement_is_logged_when_not_raising(loop_app, caplog):
+    """Test the detector only warns when raising is off."""
+    loop_app.config['QUERY_LOG_RAISE'] = False
+    with caplog.at_level(logging.WARNING):
+        response = loop_app.test_client().get('/loop')
+    assert response.status_code == 200
+    assert 'Possible N+1 in loop.GET' in caplog.text
+
+def test_slow_queries_are_logged_with_origin(client, caplog):
+    """Test statements over the threshold are logged with the route that issued them."""
+    client.application.config['SLOW_QUERY_THRESHOLD_MS'] = 0
+    try:
+        with caplog.at_level(logging.WARNING):
+            client.get('/books/00000000-0000-7000-8000-00000000dead')
+    finally:
+        client.application.config['SLOW_QUERY_THRESHOLD_MS'] = 200
+    assert 'Slow query' in caplog.text
+    assert 'routes/books.py' in caplog.text
+    assert "'00000000-0000-7000-8000-00000000dead'" in caplog.text
+
+def test_statement_shape_ignores_in_list_length():
+    """Test IN lists of different lengths count as one statement shape."""
+    assert statement_shape('SELECT * FROM books WHERE id IN (?, ?, ?)') == \
+        statement_shape('SELECT *  FROM books\n WHERE id IN (?)')
+    assert statement_shape('SELECT * FROM books WHERE id IN (%(id_1)s, %(id_2)s)') == \
+        'SELECT * FROM books WHERE id IN (?)'
@@ -0,0 +1,84 @@
+# frontend_api/tests/test_replicas.py
+
+import pytest
+from app import create_app, db
+from models import Book
+
+NEW_BOOK = {'title': 'Fresh Ink', 'author': 'Primary Author', 'publisher': 'Primary Press', 'category': 'New'}
+
+@pytest.fixture
+def replica_app(tmp_path, monkeypatch):
+    """An app on a primary and one replica, two SQLite files with different books."""
+    monkeypatch.setenv('DATABASE_URI', f"sqlite:///{tmp_path / 'primary.db'}")
+    monkeypatch.setenv('DATABASE_REPLICA_URIS', f"sqlite:///{tmp_path / 'replica.db'}")
+    app = create_app()
+    app.config['TESTING'] = True
+    app.config['RESPONSE_CACHE_ENABLED'] = False
+    replica = app.extensions['replicas'].engines[0]
+    with app.app_context():
+        db.create_all()
+        db.metadata.create_all(replica)
+        db.session.add(Book(title='Primary Only', author='A', publisher='P', category='C'))
+        db.session.commit()
+        with replica.begin() as conn:
+            conn.execute(Book.__table__.insert(), {'id': '00000000-0000-7000-8000-000000000001',
+                                                   'title': 'Replica Only', 'author': 'A', 'publisher': 'P',
+                                                   'category': 'C', 'available': True})
+        db.session.remove()
+    yield app
+    replica.dispose()
+
+def titles(response):
+    return [book['title'] for book in response.get_json()]
+
+def test_reads_are_served_by_the_replica(replica_app):
+    """Test catalogue pages come from the replica and writes from the primary."""
+    client = replica_app.test_client()
+    assert titles(client.get('/books')) == ['Replica Only']
+
+    response = client.post('/books', json=NEW_BOOK)
+    assert response.status_code == 201
+    with replica_app.app_context():
+        assert db.session.get(Book, response.get_json()['id']) is not None
+
+def test_writer_reads_its_own_writes(replica_app):
+    """Test a client that just wrote reads from the primary while others still use the replica."""
+    writer = replica_app.test_client()
+    book_id = writer.post('/books', json=NEW_BOOK).get_json()['id']
+
+    assert writer.get(f'/books/{book_id}').status_code == 200
+    assert 'Fresh Ink' in titles(writer.get('/books'))
+    assert replica_app.test_client().get(f'/books/{book_id}').status_code == 404
+
+    replica_app.config['REPLICA_STICKY_SECONDS'] = 0
+    writer.post('/books', json=dict(NEW_BOOK, title='Second Ink'))
+    assert titles(writer.get('/books')) == ['Replica Only']
+
+def test_failing_replica_is_ejected(replica_app, caplog):
+    """Test a replica error falls back to the primary and takes the replica out of rotation."""
+    pool = replica_app.extensions['replicas']
+    with pool.engines[0].begin() as conn:
+        conn.exec_driver_sql('DROP TABLE books')
+
+    response = replica_app.test_client().get('/books')
+    assert response.status_code == 200
+    assert titles(response) == ['Primary Only']
+    assert pool.healthy() == []
+    assert 'Ejected replica-0' in caplog.text
+    assert titles(replica_app.test_client().get('/books')) == ['Primary Only']
+
+def test_cache_keeps_reads_your_writes(replica_app):
+    """Test a writer bypasses cached pages and lagging replica reads are not cached after a write."""
+    replica_app.config['RESPONSE_CACHE_ENABLED'] = True
+    cache = replica_app.extensions['response_cache']
+    writer, reader = replica_app.test_client(), replica_app.test_client()
+    assert titles(reader.get('/books')) == ['Replica Only']
+    assert titles(reader.get('/books')) == ['Replica Only']
+    assert cache.hits == 1
+
+    writer.post('/books', json=NEW_BOOK)
+    # The replica has not caught up; its answer must not be cached for the writer
+    assert titles(reader.get('/books')) == ['Replica Only']
+    assert 'Fresh Ink' in titles(writer.get('/books'))
+    assert titles(reader.get('/books')) == ['Replica Only']
+    assert cache.hits == 1
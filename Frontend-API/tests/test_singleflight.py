@@ -0,0 +1,116 @@
+# frontend_api/tests/test_singleflight.py
+
+import threading
+import time
+import pytest
+from flask_restful import Api, Resource
+from app import create_app
+from cache import cached, invalidate
+from singleflight import SingleFlight, coalesced
+
+def run_together(count, target):
+    """Run ``target`` in ``count`` threads released at the same moment; return their results."""
+    barrier = threading.Barrier(count)
+    results = [None] * count
+
+    def worker(position):
+        barrier.wait()
+        results[position] = target()
+
+    threads = [threading.Thread(target=worker, args=(position,)) for position in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+def test_concurrent_calls_share_one_result():
+    """Test callers arriving during a call wait for it instead of repeating it."""
+    flights = SingleFlight()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.2)
+        return 'result'
+
+    results = run_together(8, lambda: flights.do('key', slow, timeout=5))
+    assert len(calls) == 1
+    assert sorted(outcome for _, outcome in results) == ['leader'] + ['shared'] * 7
+    assert {result for result, _ in results} == {'result'}
+
+def test_waiting_is_bounded():
+    """Test a caller gives up waiting after the timeout and runs the call itself."""
+    flights = SingleFlight()
+    release = threading.Event()
+    leader = threading.Thread(target=flights.do, args=('key', lambda: release.wait(5), 5))
+    leader.start()
+    time.sleep(0.05)
+    try:
+        assert flights.do('key', lambda: 'own', timeout=0.05) == ('own', 'timeout')
+    finally:
+        release.set()
+        leader.join()
+
+def test_failed_call_is_not_shared():
+    """Test waiting callers run the call themselves when the shared one fails."""
+    flights = SingleFlight()
+
+    def failing():
+        time.sleep(0.1)
+        raise RuntimeError('boom')
+
+    leader = threading.Thread(target=lambda: pytest.raises(RuntimeError, flights.do, 'key', failing, 5))
+    leader.start()
+    time.sleep(0.02)
+    assert flights.do('key', lambda: 'own', timeout=5) == ('own', 'fallback')
+    leader.join()
+
+@pytest.fixture
+def slow_app():
+    """A fresh app with a slow cached and coalesced route that counts its runs."""
+    app = create_app()
+    app.config['TESTING'] = True
+    app.config['RESPONSE_CACHE_ENABLED'] = False
+    calls = []
+    started = threading.Event()
+
+    class SlowResource(Resource):
+        @cached('slow')
+        @coalesced('slow')
+        def get(self):
+            calls.append(1)
+            started.set()
+            time.sleep(0.2)
+            return {'runs': len(calls)}, 200, {'X-Slow': 'yes'}
+
+    Api(app).add_resource(SlowResource, '/slow')
+    app.calls = calls
+    app.started = started
+    return app
+
+def test_identical_requests_are_coalesced(slow_app):
+    """Test concurrent identical requests get one computed response each."""
+    responses = run_together(6, lambda: slow_app.test_client().get('/slow?page=1'))
+    assert len(slow_app.calls) == 1
+    assert {response.status_code for response in responses} == {200}
+    assert all(response.get_json() == {'runs': 1} for response in responses)
+    assert all(response.headers['X-Slow'] == 'yes' for response in responses)
+
+    slow_app.test_client().get('/slow?page=2')
+    assert len(slow_app.calls) == 2
+
+def test_read_after_invalidation_does_not_share_older_flight(slow_app):
+    """Test a read that starts after a write neither shares nor caches a result computed before it."""
+    slow_app.config['RESPONSE_CACHE_ENABLED'] = True
+    early = threading.Thread(target=lambda: slow_app.test_client().get('/slow'))
+    early.start()
+    slow_app.started.wait(5)
+    with slow_app.app_context():
+        invalidate('slow')
+
+    late = slow_app.test_client().get('/slow')
+    early.join()
+    assert late.get_json() == {'runs': 2}
+    assert slow_app.test_client().get('/slow').get_json() == {'runs': 2}
+    assert len(slow_app.calls) == 2
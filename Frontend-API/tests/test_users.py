@@ -44,7 +44,7 @@ def test_create_user_duplicate_email(client, new_user):
         'first_name': 'Another',
         'last_name': 'User'
     })
-    assert response.status_code == 400
+    assert response.status_code == 409
     data = response.get_json()
     assert data['message'] == 'User with this email already exists'
 
@@ -162,3 +162,38 @@ def test_create_user_invalid_email_domain(client):
     data = response.get_json()
     assert 'email' in data['message'].lower()
 
+
+def test_bulk_enroll_users(client):
+    """Test a batch reports created, duplicate and invalid rows in order."""
+    client.post('/users/bulk', json=[
+        {'email': 'Enrolled.Before@Example.com', 'first_name': 'Early', 'last_name': 'Bird'}
+    ])
+
+    response = client.post('/users/bulk', json=[
+        {'email': 'first.pupil@example.com', 'first_name': 'First', 'last_name': 'Pupil'},
+        {'email': 'enrolled.before@example.com', 'first_name': 'Again', 'last_name': 'Bird'},
+        {'email': 'FIRST.PUPIL@example.com', 'first_name': 'Twice', 'last_name': 'Pupil'},
+        {'email': 'not-an-email', 'first_name': 'Bad', 'last_name': 'Address'},
+    ])
+    assert response.status_code == 200
+    data = response.get_json()
+    assert [result['status'] for result in data['results']] == ['created', 'duplicate', 'duplicate', 'invalid']
+    assert (data['created'], data['duplicate'], data['invalid']) == (1, 2, 1)
+    assert 'email' in data['results'][3]['errors']
+
+    with client.application.app_context():
+        user = db.session.get(User, data['results'][0]['id'])
+        assert user.email == 'first.pupil@example.com'
+        assert User.query.filter_by(email='enrolled.before@example.com').count() == 1
+
+def test_bulk_enroll_requires_array(client):
+    """Test anything but a non-empty JSON array is rejected."""
+    assert client.post('/users/bulk', json={'email': 'one@example.com'}).status_code == 400
+    assert client.post('/users/bulk', json=[]).status_code == 400
+
+def test_create_user_duplicate_email_ignores_case(client):
+    """Test the unique index catches a duplicate that differs only by case."""
+    payload = {'email': 'Case.Check@example.com', 'first_name': 'Case', 'last_name': 'Check'}
+    assert client.post('/users', json=payload).status_code == 201
+    response = client.post('/users', json={**payload, 'email': 'case.check@EXAMPLE.com'})
+    assert response.status_code == 409
@@ -0,0 +1,11 @@
+# frontend_api/wsgi.py
+
+from app import create_app
+from suggest import get_index
+
+# WSGI entry point for production servers: gunicorn -c gunicorn.conf.py wsgi:app
+app = create_app()
+
+# Build the suggestion index now rather than on the first request
+with app.app_context():
+    get_index()
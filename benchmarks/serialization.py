@@ -0,0 +1,99 @@
+"""Compare the marshmallow and column-tuple serialization paths of GET /books.
+
+Runs the Frontend API in-process against a throwaway SQLite database, so it
+needs no running services:
+
+    python benchmarks/serialization.py --rows 1000 100000
+
+For each row count the whole list is fetched in one page (the page size
+limit is lifted for the run) and the view is timed end to end: query,
+serialization and JSON encoding. The schema and `json` paths are checked
+to produce identical bytes before timing.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+FRONTEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Frontend-API')
+
+
+def load_app(database_uri):
+    os.environ['DATABASE_URI'] = database_uri
+    os.environ.setdefault('RESPONSE_CACHE_ENABLED', 'false')
+    sys.path.insert(0, FRONTEND)
+    os.chdir(tempfile.mkdtemp())  # keep the app's log directory out of the tree
+
+    import pagination
+    from app import create_app, db
+    pagination.MAX_PAGE_SIZE = sys.maxsize
+    app = create_app()
+    app.logger.disabled = True
+    with app.app_context():
+        db.create_all()
+    return app, db
+
+
+def seed(app, db, rows):
+    from models import Book
+    books = Book.__table__
+    with app.app_context():
+        db.session.execute(books.delete())
+        db.session.execute(books.insert(), [
+            {
+                'id': f'{n:08d}-0000-4000-8000-000000000000',
+                'title': f'Title {n}',
+                'author': f'Author {n % 5000}',
+                'publisher': f'Publisher {n % 500}',
+                'category': f'category-{n % 40}',
+                'available': True,
+            }
+            for n in range(rows)
+        ])
+        db.session.commit()
+
+
+def timed(client, url, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = client.get(url)
+        samples.append(time.perf_counter() - started)
+        assert response.status_code == 200
+    return statistics.median(samples), response.data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 100000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), 'serialization.db')
+    app, db = load_app(f'sqlite:///{path}')
+    client = app.test_client()
+
+    import fastjson
+    modes = ['', 'json'] + (['orjson'] if fastjson.orjson is not None else [])
+    print(f"{'rows':>8} {'path':>8} {'median ms':>10} {'rows/s':>12} {'speedup':>8}")
+    for rows in args.rows:
+        seed(app, db, rows)
+        url = f'/books?limit={rows}'
+        results = {}
+        for mode in modes:
+            app.config['FAST_SERIALIZATION'] = mode
+            results[mode] = timed(client, url, args.repeat)
+        assert results['json'][1] == results[''][1], 'fast path output differs from schema output'
+
+        baseline = results[''][0]
+        for mode in modes:
+            elapsed = results[mode][0]
+            print(f'{rows:>8} {mode or "schema":>8} {elapsed * 1000:>10.1f} '
+                  f'{rows / elapsed:>12,.0f} {baseline / elapsed:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
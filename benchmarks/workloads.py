@@ -0,0 +1,127 @@
+"""Scripted request mixes for benchmarks/run.py.
+
+A workload turns a random generator into an endless stream of requests
+against a library built by datagen.py with the same scale and seed. Each
+request carries the endpoint label it is reported under.
+"""
+
+import base64
+import json
+from collections import namedtuple
+from datetime import datetime, timezone
+
+import datagen
+
+Request = namedtuple('Request', 'endpoint method path body content_type')
+
+PAGE_SIZE = 20
+SYNC_BATCH_SIZE = 500
+# Sync bursts revise books drawn from the start of the catalogue
+SYNC_POOL_SIZE = 20_000
+
+
+def get(endpoint, path):
+    return Request(endpoint, 'GET', path, None, None)
+
+
+def post_json(endpoint, path, data):
+    return Request(endpoint, 'POST', path, json.dumps(data).encode(), 'application/json')
+
+
+def cursor_for(book_id):
+    # The keyset cursor of pagination.encode_cursor for a page ending at book_id
+    raw = json.dumps([book_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+class Workload:
+    """Base class; ``requests`` yields the next request for one client forever."""
+
+    name = None
+    description = None
+
+    def __init__(self, books, seed=0):
+        self.books = books
+        self.users = datagen.user_count(books)
+        self.seed = seed
+
+    def random_book(self, rng):
+        return datagen.book_id(rng.randrange(self.books))
+
+    def random_user(self, rng):
+        return datagen.user_id(rng.randrange(self.users))
+
+    def requests(self, rng):
+        raise NotImplementedError
+
+
+class Browse(Workload):
+    name = 'browse'
+    description = 'catalogue pages from random positions and single books'
+
+    def requests(self, rng):
+        while True:
+            if rng.random() < 0.75:
+                yield get('GET /books', f'/books?limit={PAGE_SIZE}&cursor={cursor_for(self.random_book(rng))}')
+            else:
+                yield get('GET /books/<id>', f'/books/{self.random_book(rng)}')
+
+
+class Search(Workload):
+    name = 'search'
+    description = 'full-text search, optionally by category, and autocomplete'
+
+    def requests(self, rng):
+        while True:
+            word = rng.choice(datagen.WORDS)
+            roll = rng.random()
+            if roll < 0.4:
+                query = word if rng.random() < 0.5 else f'{word}+{rng.choice(datagen.WORDS)}'
+                yield get('GET /books/search', f'/books/search?q={query}&limit={PAGE_SIZE}')
+            elif roll < 0.6:
+                category = rng.choice(datagen.CATEGORIES)
+                yield get('GET /books/search?category',
+                          f'/books/search?q={word}&category={category}&limit={PAGE_SIZE}')
+            else:
+                yield get('GET /books/suggest', f'/books/suggest?prefix={word[:rng.randint(2, 4)]}')
+
+
+class BorrowStorm(Workload):
+    name = 'borrow-storm'
+    description = 'every client borrows and returns the same hot title'
+
+    def hot_book(self):
+        # An available book, found by replaying the generator; the first few always include one
+        for row in datagen.generate_books(self.books, self.seed, limit=1000):
+            if row['available']:
+                return row['id']
+        raise ValueError('no available book to borrow')
+
+    def requests(self, rng):
+        book_id = self.hot_book()
+        while True:
+            user_id = self.random_user(rng)
+            yield post_json('POST /books/<id>/borrow', f'/books/{book_id}/borrow', {'user_id': user_id, 'days': 7})
+            # Returns race too; without a user_id any of them can bring the book back,
+            # so a storm never leaves it stuck on loan for the next run
+            yield post_json('POST /books/<id>/return', f'/books/{book_id}/return', {})
+
+
+class SyncBurst(Workload):
+    name = 'sync-burst'
+    description = f'NDJSON batches of {SYNC_BATCH_SIZE} changed books on POST /books/sync'
+
+    def requests(self, rng):
+        # Changes keep each book's loan state, so later runs see the same library
+        pool = list(datagen.generate_books(self.books, self.seed, limit=SYNC_POOL_SIZE))
+        while True:
+            updated_at = datetime.now(timezone.utc).isoformat()
+            lines = []
+            for row in rng.choices(pool, k=SYNC_BATCH_SIZE):
+                change = dict(row, title=f"{row['title']} (Revised)", updated_at=updated_at)
+                lines.append(json.dumps(change, default=str))
+            body = ('\n'.join(lines) + '\n').encode()
+            yield Request('POST /books/sync', 'POST', '/books/sync', body, 'application/x-ndjson')
+
+
+WORKLOADS = {workload.name: workload for workload in (Browse, Search, BorrowStorm, SyncBurst)}